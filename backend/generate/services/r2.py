@@ -1,57 +1,30 @@
-import os
 import uuid
-import boto3
-from botocore.config import Config
 
-R2_ENDPOINT_URL = os.environ.get("R2_ENDPOINT_URL")
-R2_ACCESS_KEY_ID = os.environ.get("R2_ACCESS_KEY_ID")
-R2_SECRET_ACCESS_KEY = os.environ.get("R2_SECRET_ACCESS_KEY")
-R2_OUTPUT_BUCKET = os.environ.get("R2_OUTPUT_BUCKET", "")
+from infra import image_cache, r2
 
-
-def _client():
-    return boto3.client(
-        "s3",
-        endpoint_url=R2_ENDPOINT_URL,
-        aws_access_key_id=R2_ACCESS_KEY_ID,
-        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        config=Config(signature_version="s3v4"),
-        region_name="auto",
-    )
+R2_OUTPUT_BUCKET = r2.R2_BUCKET
 
 
 def download_image(r2_path: str) -> bytes:
     """Download a generated image from R2.
     Accepts r2://bucket/key format or a bare key (uses R2_OUTPUT_BUCKET).
+    Served from the shared image cache when the node already fetched it.
     """
-    if r2_path.startswith("r2://"):
-        parts = r2_path[5:].split("/", 1)
-        bucket = parts[0]
-        key = parts[1]
-    else:
-        bucket = R2_OUTPUT_BUCKET
-        key = r2_path
-
-    response = _client().get_object(Bucket=bucket, Key=key)
-    return response["Body"].read()
+    if not r2_path.startswith("r2://"):
+        r2_path = f"r2://{R2_OUTPUT_BUCKET}/{r2_path}"
+    return image_cache.fetch(r2_path)
 
 
 def upload_image(file_bytes: bytes, original_filename: str) -> str:
     """Upload an image to R2 and return its r2:// path."""
     ext = original_filename.rsplit(".", 1)[-1].lower() if "." in original_filename else "png"
     key = f"mask-inputs/{uuid.uuid4()}.{ext}"
-    _client().put_object(
-        Bucket=R2_OUTPUT_BUCKET,
-        Key=key,
-        Body=file_bytes,
-        ContentType=f"image/{ext}",
-    )
-    return f"r2://{R2_OUTPUT_BUCKET}/{key}"
+    return r2.upload(file_bytes, key, content_type=f"image/{ext}")
 
 
 def _list_images(prefix: str, limit: int = 50) -> list:
     """List images in R2 under a prefix, sorted newest first. Returns [{r2_path, preview_url}]."""
-    client = _client()
+    client = r2.client()
     resp = client.list_objects_v2(Bucket=R2_OUTPUT_BUCKET, Prefix=prefix)
     objects = resp.get("Contents", [])
     objects.sort(key=lambda o: o["LastModified"], reverse=True)
@@ -1,56 +1,55 @@
+import csv
+import io
+import json
 import os
+import threading
 import uuid
 from dotenv import load_dotenv
 load_dotenv()
 
-import boto3
-from botocore.config import Config
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
 from orchestration.state import create_pipeline, get_pipeline, list_pipelines, get_queue_counts
-from orchestration import orchestrator
+from orchestration import batch, orchestrator, stream
+from orchestration.engine import engine
+from infra import gemini, gemini_files, image_cache, preview_cache, r2, review_cache, review_images, runpod_poller
+from nodes.image_gen import agent as image_gen_agent
 
 app = Flask(__name__)
 CORS(app)
 
-# ── R2 helpers ────────────────────────────────────────────────────────────────
-R2_ENDPOINT_URL      = os.environ.get("R2_ENDPOINT_URL")
-R2_ACCESS_KEY_ID     = os.environ.get("R2_ACCESS_KEY_ID")
-R2_SECRET_ACCESS_KEY = os.environ.get("R2_SECRET_ACCESS_KEY")
-R2_BUCKET            = os.environ.get("R2_OUTPUT_BUCKET", "")
-
-
-def _r2():
-    return boto3.client(
-        "s3",
-        endpoint_url=R2_ENDPOINT_URL,
-        aws_access_key_id=R2_ACCESS_KEY_ID,
-        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        config=Config(signature_version="s3v4"),
-        region_name="auto",
-    )
+DEFAULT_FAN_OUT  = int(os.environ.get("IMAGE_GEN_FAN_OUT", "1"))
+BATCH_MAX_ROWS   = int(os.environ.get("PIPELINE_BATCH_MAX_ROWS", "5000"))
+STREAM_MAX_LIMIT = 200   # pipelines in the list stream's snapshot
+
+if not 1 <= DEFAULT_FAN_OUT <= image_gen_agent.MAX_FAN_OUT:
+    raise ValueError(f"IMAGE_GEN_FAN_OUT must be between 1 and {image_gen_agent.MAX_FAN_OUT}, not {DEFAULT_FAN_OUT}")
+
+
+def _on_startup():
+    # Pick up pipelines interrupted by the previous process (sqlite backend)
+    orchestrator.resume_in_flight()
+    # Template previews are the character reference in every template-mode review
+    threading.Thread(target=preview_cache.prewarm, name="preview-prewarm", daemon=True).start()
+
 
+# `python app.py` runs under the werkzeug reloader, whose watcher process imports
+# this module too; only the child it spawns (WERKZEUG_RUN_MAIN=true) serves
+# requests. Resuming in both would submit every in-flight job twice.
+if __name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    _on_startup()
 
+
+# ── R2 helpers ────────────────────────────────────────────────────────────────
 def _upload_product(file_bytes: bytes, original_filename: str) -> tuple[str, str]:
     """Upload to R2 products/ prefix. Returns (r2_path, preview_url)."""
     ext = original_filename.rsplit(".", 1)[-1].lower() if "." in original_filename else "png"
     key = f"products/{uuid.uuid4()}.{ext}"
-    client = _r2()
-    client.put_object(
-        Bucket=R2_BUCKET,
-        Key=key,
-        Body=file_bytes,
-        ContentType=f"image/{ext}",
-    )
-    r2_path = f"r2://{R2_BUCKET}/{key}"
-    preview_url = client.generate_presigned_url(
-        "get_object",
-        Params={"Bucket": R2_BUCKET, "Key": key},
-        ExpiresIn=3600,
-    )
-    return r2_path, preview_url
+    r2_path = r2.upload(file_bytes, key, content_type=f"image/{ext}")
+    image_cache.put(r2_path, file_bytes)  # masking/inpainting will read it back
+    return r2_path, r2.presign(r2_path)
 
 
 # ── Routes ────────────────────────────────────────────────────────────────────
@@ -69,44 +68,130 @@ def upload_product():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/pipeline/submit", methods=["POST"])
-def submit():
-    body = request.json or {}
-    subject    = body.get("subject", "").strip()
-    mode       = body.get("mode", "").strip()
-    product_r2 = body.get("product_r2", "").strip()
+def _flag(value, default: bool) -> bool:
+    """JSON booleans as-is; CSV/form strings like "false"/"0"/"no" parsed."""
+    if value is None or value == "":
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+def _parse_submission(body: dict) -> tuple[dict | None, str | None]:
+    """Validate one pipeline request. Returns (create_pipeline kwargs, None) or (None, error)."""
+    subject    = (body.get("subject") or "").strip()
+    mode       = (body.get("mode") or "").strip()
+    product_r2 = (body.get("product_r2") or "").strip()
     lora_name         = (body.get("lora_name") or "").strip() or None
     keyword           = (body.get("keyword") or "").strip() or None
     template_name     = (body.get("template_name") or "").strip() or None
     preview_image_url = (body.get("preview_image_url") or "").strip() or None
-    run_masking    = bool(body.get("run_masking", True))
-    run_inpainting = bool(body.get("run_inpainting", True))
+    run_masking    = _flag(body.get("run_masking"), True)
+    run_inpainting = _flag(body.get("run_inpainting"), True)
+    fan_out        = body.get("fan_out")
+    if fan_out is None or fan_out == "":
+        fan_out = DEFAULT_FAN_OUT
+    if isinstance(fan_out, str) and fan_out.strip().isdigit():
+        fan_out = int(fan_out)
 
     if not subject:
-        return jsonify({"error": "subject is required"}), 400
+        return None, "subject is required"
     if mode not in ("template", "no_template"):
-        return jsonify({"error": "mode must be 'template' or 'no_template'"}), 400
+        return None, "mode must be 'template' or 'no_template'"
     if not product_r2:
-        return jsonify({"error": "product_r2 is required"}), 400
+        return None, "product_r2 is required"
     if mode == "template" and not lora_name:
-        return jsonify({"error": "lora_name is required for template mode"}), 400
-
-    pipeline_id = create_pipeline(
-        subject=subject,
-        mode=mode,
-        product_r2=product_r2,
-        lora_name=lora_name,
-        keyword=keyword,
-        template_name=template_name,
-        preview_image_url=preview_image_url,
-        run_masking=run_masking,
-        run_inpainting=run_inpainting,
-    )
+        return None, "lora_name is required for template mode"
+    # bool is an int subclass: reject `true` rather than reading it as 1
+    if isinstance(fan_out, bool) or not isinstance(fan_out, int) or not 1 <= fan_out <= image_gen_agent.MAX_FAN_OUT:
+        return None, f"fan_out must be an integer between 1 and {image_gen_agent.MAX_FAN_OUT}"
+
+    return {
+        "subject": subject,
+        "mode": mode,
+        "product_r2": product_r2,
+        "lora_name": lora_name,
+        "keyword": keyword,
+        "template_name": template_name,
+        "preview_image_url": preview_image_url,
+        "run_masking": run_masking,
+        "run_inpainting": run_inpainting,
+        "fan_out": fan_out,
+    }, None
+
+
+@app.route("/api/pipeline/submit", methods=["POST"])
+def submit():
+    fields, error = _parse_submission(request.json or {})
+    if error:
+        return jsonify({"error": error}), 400
+
+    pipeline_id = create_pipeline(**fields)
     orchestrator.start(pipeline_id)
-    print(f"[Pipeline] Started {pipeline_id} subject='{subject}' mode={mode}")
+    print(f"[Pipeline] Started {pipeline_id} subject='{fields['subject']}' mode={fields['mode']}")
     return jsonify({"pipeline_id": pipeline_id, "status": "running"}), 202
 
 
+def _read_batch_rows() -> tuple[list, dict]:
+    """Rows + shared defaults from a JSON body, or from an uploaded CSV/JSONL file plus form fields."""
+    if "file" in request.files:
+        f = request.files["file"]
+        text = f.read().decode("utf-8-sig")
+        if (f.filename or "").lower().endswith((".jsonl", ".ndjson")):
+            rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            rows = list(csv.DictReader(io.StringIO(text)))
+        return rows, request.form.to_dict()
+    body = request.json or {}
+    return body.get("rows") or [], body.get("defaults") or {}
+
+
+@app.route("/api/pipeline/batch", methods=["POST"])
+def submit_batch():
+    """
+    Queue many pipelines at once. Rows take the same fields as /submit; "defaults"
+    (JSON) or form fields (file upload) fill in anything a row leaves empty.
+    """
+    try:
+        rows, defaults = _read_batch_rows()
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"could not parse batch: {e}"}), 400
+    if not rows:
+        return jsonify({"error": "rows are required"}), 400
+    if len(rows) > BATCH_MAX_ROWS:
+        return jsonify({"error": f"at most {BATCH_MAX_ROWS} rows per batch"}), 400
+
+    parsed, errors = [], []
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({"row": i, "error": "row must be an object"})
+            continue
+        merged = {**defaults, **{k: v for k, v in row.items() if v not in (None, "")}}
+        fields, error = _parse_submission(merged)
+        if error:
+            errors.append({"row": i, "error": error})
+        else:
+            parsed.append(fields)
+    if errors:
+        return jsonify({"error": "invalid rows", "rows": errors[:100]}), 400
+
+    b = batch.submit_batch(parsed)
+    return jsonify({"batch_id": b.batch_id, "total": b.total, "pipeline_ids": b.pipeline_ids}), 202
+
+
+@app.route("/api/pipeline/batch/<batch_id>", methods=["GET"])
+def batch_status(batch_id):
+    b = batch.get_batch(batch_id)
+    if not b:
+        return jsonify({"error": "Batch not found"}), 404
+    return jsonify(b.progress())
+
+
+@app.route("/api/pipeline/batches", methods=["GET"])
+def list_batches():
+    return jsonify({"batches": batch.list_batches()})
+
+
 @app.route("/api/pipeline/status/<pipeline_id>", methods=["GET"])
 def status(pipeline_id):
     p = get_pipeline(pipeline_id)
@@ -125,6 +210,47 @@ def queues():
     return jsonify(get_queue_counts())
 
 
+def _event_stream(events) -> Response:
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/pipeline/stream/<pipeline_id>", methods=["GET"])
+def stream_one(pipeline_id):
+    """SSE: snapshot of one pipeline, then field-level diffs until it finishes."""
+    return _event_stream(stream.pipeline_events(pipeline_id))
+
+
+@app.route("/api/pipeline/stream", methods=["GET"])
+def stream_all():
+    """SSE: list + queue counts snapshot, then diffs for every pipeline."""
+    limit = max(1, min(request.args.get("limit", 50, type=int), STREAM_MAX_LIMIT))
+    return _event_stream(stream.list_events(limit))
+
+
+@app.route("/api/pipeline/engine", methods=["GET"])
+def engine_stats():
+    """Concurrency caps and current occupancy of the async pipeline engine."""
+    return jsonify(engine.stats())
+
+
+@app.route("/api/pipeline/metrics", methods=["GET"])
+def metrics():
+    """Process-wide counters: RunPod polling, the R2 image / template preview caches, the Gemini gateway and review inputs / cache."""
+    return jsonify({
+        "runpod": runpod_poller.stats(),
+        "image_cache": image_cache.stats(),
+        "preview_cache": preview_cache.stats(),
+        "gemini": gemini.stats(),
+        "review_cache": review_cache.stats(),
+        "gemini_files": gemini_files.stats(),
+        "review_images": review_images.stats(),
+    })
+
+
 @app.route("/api/pipeline/preview", methods=["GET"])
 def preview():
     """Generate a presigned URL for any r2:// path."""
@@ -132,14 +258,7 @@ def preview():
     if not r2_path.startswith("r2://"):
         return jsonify({"error": "invalid r2_path"}), 400
     try:
-        parts = r2_path[5:].split("/", 1)
-        bucket, key = parts[0], parts[1]
-        url = _r2().generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": key},
-            ExpiresIn=3600,
-        )
-        return jsonify({"preview_url": url})
+        return jsonify({"preview_url": r2.presign(r2_path)})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -0,0 +1,380 @@
+"""
+Shared Gemini gateway.
+
+Every Gemini call in the process goes through one client and one scheduler
+instead of a genai.Client per module calling blindly into the quota. The
+gateway runs on its own background event loop (like the RunPod poller):
+
+- rate: a token bucket per model, GEMINI_RPM requests per minute (override per
+  model with GEMINI_MODEL_RPM="model=rpm,..."), bursting up to BURST_SECONDS
+  worth of tokens; a 429 empties the model's bucket so the callers queued
+  behind it wait instead of piling on
+- concurrency: at most GEMINI_MAX_CONCURRENT requests in flight across models
+- retries: 429, 5xx and transport errors are retried up to GEMINI_MAX_ATTEMPTS
+  times with jittered exponential backoff, or after the RetryInfo delay when
+  Gemini sends one
+- coalescing: identical generate() calls (same model, config and contents)
+  in flight at the same time share one request
+- metrics per model (queue depth, in flight, retries, 429s, queue wait and
+  latency histograms) are reported by stats() under /api/pipeline/metrics
+
+generate() is the async API and can be awaited from any event loop;
+generate_sync() is the same call for worker threads (reviews, prompt
+helpers). The ADK agents get their model from adk_model(), whose calls take a
+slot from the same buckets and concurrency limit; their retries are done by
+the genai client's HttpRetryOptions with the same attempts and backoff.
+Other client calls (Files API uploads) hold slot_sync() / slot() around the
+request, under the FILES bucket for uploads.
+
+Limits are per process: with several pipeline processes, divide the quota.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+from google import genai
+from google.adk.models import Gemini
+from google.genai import errors, types
+
+GEMINI_API_KEY  = os.environ.get("GEMINI_API_KEY", "")
+DEFAULT_RPM     = float(os.environ.get("GEMINI_RPM", "1000"))
+MODEL_RPM       = {
+    model.strip(): float(rpm)
+    for model, _, rpm in (item.partition("=") for item in os.environ.get("GEMINI_MODEL_RPM", "").split(","))
+    if model.strip() and rpm.strip()
+}
+MAX_CONCURRENT  = int(os.environ.get("GEMINI_MAX_CONCURRENT", "32"))
+MAX_ATTEMPTS    = int(os.environ.get("GEMINI_MAX_ATTEMPTS", "5"))
+BURST_SECONDS   = 1.0    # bucket capacity, in seconds of the model's rate
+BACKOFF_BASE    = 1.0    # seconds before the first retry, doubled after each
+BACKOFF_MAX     = 30.0
+RETRY_STATUSES  = (429, 500, 502, 503, 504)
+FILES           = "files"   # bucket for Files API requests (GEMINI_MODEL_RPM="files=..." to limit them separately)
+
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Bucket:
+    """Token bucket with reservations: a request takes a token now and waits until it would have existed."""
+
+    def __init__(self, rpm: float):
+        self.rate = rpm / 60
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token; returns how long to wait before using it."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def drain(self):
+        self.tokens = min(self.tokens, 0.0)
+
+
+class _ModelStats:
+    def __init__(self):
+        self.requests = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+        self.failures = 0
+        self.queued = 0
+        self.in_flight = 0
+        self.wait_sum = 0.0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def observe_latency(self, seconds: float):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.latency_counts[i] += 1
+                break
+        else:
+            self.latency_counts[-1] += 1
+        self.latency_sum += seconds
+        self.latency_count += 1
+
+    def snapshot(self) -> dict:
+        buckets, running = {}, 0
+        for bound, count in zip(LATENCY_BUCKETS, self.latency_counts):
+            running += count
+            buckets[str(bound)] = running
+        buckets["+Inf"] = running + self.latency_counts[-1]
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "server_errors": self.server_errors,
+            "failures": self.failures,
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "avg_queue_wait_s": round(self.wait_sum / self.requests, 3) if self.requests else None,
+            "latency_s": {"buckets": buckets, "count": self.latency_count, "sum": round(self.latency_sum, 3)},
+        }
+
+
+class GeminiGateway:
+    def __init__(self, api_key: str = GEMINI_API_KEY, max_concurrent: int = MAX_CONCURRENT):
+        self.client = genai.Client(api_key=api_key)
+        self.max_concurrent = max_concurrent
+        self._buckets: dict[str, _Bucket] = {}
+        self._stats: dict[str, _ModelStats] = {}
+        self._stats_lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Task] = {}
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._start_lock = threading.Lock()
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            ready = threading.Event()
+            threading.Thread(target=self._run_loop, args=(ready,), name="gemini-gateway", daemon=True).start()
+            ready.wait()
+
+    def _run_loop(self, ready: threading.Event):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._loop = loop
+        ready.set()
+        loop.run_forever()
+
+    def _submit(self, coro) -> Future:
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    async def generate(self, model: str, contents, config: types.GenerateContentConfig | None = None):
+        """generate_content through the gateway. Awaitable from any event loop."""
+        return await asyncio.wrap_future(self._submit(self._generate(model, contents, config)))
+
+    def generate_sync(self, model: str, contents, config: types.GenerateContentConfig | None = None):
+        """Blocking generate() for worker threads."""
+        return self._submit(self._generate(model, contents, config)).result()
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        """Hold a rate token and a concurrency slot for `model` while the body runs (any event loop)."""
+        acquired = self._submit(self._acquire(model))
+        try:
+            await asyncio.wrap_future(acquired)
+        except asyncio.CancelledError:
+            # The slot may have been granted just as the caller was cancelled
+            acquired.add_done_callback(
+                lambda f: f.cancelled() or f.exception() or self._loop.call_soon_threadsafe(
+                    self._release, model, time.monotonic(), False
+                )
+            )
+            raise
+        start = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self._loop.call_soon_threadsafe(self._release, model, start, ok)
+
+    @contextmanager
+    def slot_sync(self, model: str):
+        """slot() for worker threads: blocks until a rate token and a concurrency slot are free."""
+        self._submit(self._acquire(model)).result()
+        start = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self._loop.call_soon_threadsafe(self._release, model, start, ok)
+
+    def adk_model(self, model: str) -> Gemini:
+        """ADK model for Agent(model=...) whose calls go through this gateway's limits."""
+        return _GatewayGemini(
+            model=model,
+            retry_options=types.HttpRetryOptions(
+                attempts=MAX_ATTEMPTS,
+                initial_delay=BACKOFF_BASE,
+                max_delay=BACKOFF_MAX,
+                exp_base=2,
+                jitter=1,
+                http_status_codes=list(RETRY_STATUSES),
+            ),
+        )
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            models = {model: s.snapshot() for model, s in self._stats.items()}
+            rpm = {model: b.rate * 60 for model, b in self._buckets.items()}
+        return {
+            "queue_depth": sum(m["queue_depth"] for m in models.values()),
+            "in_flight": sum(m["in_flight"] for m in models.values()),
+            "max_concurrent": self.max_concurrent,
+            "rpm": rpm,
+            "models": models,
+        }
+
+    # ── Scheduling (loop thread only) ─────────────────────────────────────────
+
+    def _model_stats(self, model: str) -> _ModelStats:
+        s = self._stats.get(model)
+        if s is None:
+            with self._stats_lock:
+                s = self._stats.setdefault(model, _ModelStats())
+        return s
+
+    async def _acquire(self, model: str):
+        bucket = self._buckets.get(model)
+        if bucket is None:
+            with self._stats_lock:
+                bucket = self._buckets[model] = _Bucket(MODEL_RPM.get(model, DEFAULT_RPM))
+        stats = self._model_stats(model)
+        start = time.monotonic()
+        with self._stats_lock:
+            stats.queued += 1
+        try:
+            delay = bucket.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+            await self._slots.acquire()
+        finally:
+            with self._stats_lock:
+                stats.queued -= 1
+        with self._stats_lock:
+            stats.requests += 1
+            stats.in_flight += 1
+            stats.wait_sum += time.monotonic() - start
+
+    def _release(self, model: str, start: float, ok: bool):
+        self._slots.release()
+        stats = self._model_stats(model)
+        with self._stats_lock:
+            stats.in_flight -= 1
+            if ok:
+                stats.observe_latency(time.monotonic() - start)
+
+    async def _generate(self, model: str, contents, config):
+        key = _fingerprint(model, contents, config)
+        task = self._inflight.get(key)
+        if task is not None:
+            stats = self._model_stats(model)
+            with self._stats_lock:
+                stats.coalesced += 1
+        else:
+            task = self._loop.create_task(self._generate_with_retry(model, contents, config))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # One caller giving up must not cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def _generate_with_retry(self, model: str, contents, config):
+        stats = self._model_stats(model)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            await self._acquire(model)
+            start = time.monotonic()
+            ok = False
+            try:
+                response = await self.client.aio.models.generate_content(model=model, contents=contents, config=config)
+                ok = True
+                return response
+            except (errors.APIError, httpx.TransportError) as e:
+                status = getattr(e, "code", None)
+                with self._stats_lock:
+                    if status == 429:
+                        stats.rate_limited += 1
+                    elif status is not None and status >= 500:
+                        stats.server_errors += 1
+                if status == 429:
+                    self._buckets[model].drain()
+                if (status is not None and status not in RETRY_STATUSES) or attempt == MAX_ATTEMPTS:
+                    with self._stats_lock:
+                        stats.failures += 1
+                    raise
+                delay = _retry_delay(e) or min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                print(f"[Gemini] {model} {status or type(e).__name__} — retry {attempt}/{MAX_ATTEMPTS - 1} in {delay:.1f}s")
+                with self._stats_lock:
+                    stats.retries += 1
+            finally:
+                self._release(model, start, ok)
+            await asyncio.sleep(delay)
+
+
+class _GatewayGemini(Gemini):
+    """ADK's Gemini model, with every call holding a gateway slot for its model."""
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        async with _gateway.slot(llm_request.model or self.model):
+            async for response in super().generate_content_async(llm_request, stream):
+                yield response
+
+
+def _fingerprint(model: str, contents, config) -> str:
+    h = hashlib.sha256()
+
+    def feed(value):
+        if isinstance(value, bytes):
+            h.update(b"b")
+            h.update(hashlib.sha256(value).digest())
+        elif isinstance(value, str):
+            h.update(b"s")
+            h.update(value.encode())
+        elif isinstance(value, (list, tuple)):
+            h.update(b"[")
+            for item in value:
+                feed(item)
+            h.update(b"]")
+        elif isinstance(value, dict):
+            h.update(b"{")
+            for k in sorted(value):
+                feed(k)
+                feed(value[k])
+            h.update(b"}")
+        elif hasattr(value, "model_dump"):
+            feed(value.model_dump(exclude_none=True))
+        else:
+            h.update(json.dumps(value, default=str).encode())
+
+    feed([model, contents, config])
+    return h.hexdigest()
+
+
+def _retry_delay(error: Exception) -> float | None:
+    """Gemini's RetryInfo delay ("retryDelay": "17s") for a 429, if it sent one."""
+    details = getattr(error, "details", None)
+    if not isinstance(details, dict):
+        return None
+    for detail in (details.get("error") or {}).get("details") or []:
+        match = re.fullmatch(r"([\d.]+)s", str(detail.get("retryDelay", "")))
+        if match:
+            return min(BACKOFF_MAX, float(match.group(1)))
+    return None
+
+
+_gateway = GeminiGateway()
+
+client        = _gateway.client
+generate      = _gateway.generate
+generate_sync = _gateway.generate_sync
+slot          = _gateway.slot
+slot_sync     = _gateway.slot_sync
+adk_model     = _gateway.adk_model
+stats         = _gateway.stats
@@ -0,0 +1,165 @@
+"""
+Gemini Files API handles for images sent to Gemini more than once.
+
+Images used to be inlined with Part.from_bytes, i.e. base64 inside every
+request. The product image went out with every masking review and the
+scene/product pair with every turn of the masking and inpainting agents,
+because an ADK agent re-sends the whole conversation on each model call.
+part() now uploads each image once and returns a Part that references the
+file by URI:
+
+- handles are keyed by the sha256 of the bytes, so the same product or
+  template preview is uploaded once per process whichever node sends it
+- a handle is reused until EXPIRY_MARGIN before the file's expiration_time
+  (the Files API keeps uploads for 48 h) and then uploaded again
+- concurrent part() calls for the same bytes share one upload
+- images under GEMINI_FILES_MIN_KB are still inlined (the upload round trip
+  costs more than the bytes), as is anything whose upload fails
+- uploads use the gateway's client and hold a gateway slot (FILES bucket), so
+  they count against the same concurrency limit as generate calls
+- callers pass the form they send everywhere — the review copy from
+  review_images — so an image has one handle shared by the agents and reviews
+- counters (uploads, reuses, bytes uploaded / inlined / not re-sent) are
+  reported by stats() under /api/pipeline/metrics
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+from google import genai
+from google.genai import types
+
+from infra import gemini
+
+MIN_BYTES      = int(os.environ.get("GEMINI_FILES_MIN_KB", "64")) * 1024
+EXPIRY_MARGIN  = 3600   # seconds before expiration_time at which a handle is re-uploaded
+ACTIVE_TIMEOUT = 30     # seconds to wait for an upload to leave PROCESSING
+ACTIVE_POLL    = 0.5
+
+
+class GeminiFiles:
+    def __init__(self, client: genai.Client | None = None, min_bytes: int = MIN_BYTES):
+        self.client = client or gemini.client
+        self.min_bytes = min_bytes
+        self._lock = threading.Lock()
+        self._handles: dict[str, tuple[str, str, float]] = {}   # sha → (uri, mime_type, expires_at)
+        self._inflight: dict[str, Future] = {}
+        self._counters = {
+            "uploads": 0,
+            "reuses": 0,
+            "coalesced": 0,
+            "inlined": 0,
+            "upload_failures": 0,
+            "bytes_uploaded": 0,
+            "bytes_inlined": 0,
+            "bytes_not_resent": 0,
+            "upload_seconds": 0.0,
+        }
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def part(self, data: bytes, mime_type: str) -> types.Part:
+        """A Part for the image: a Files API reference, or inline bytes when small or if the upload fails."""
+        if len(data) < self.min_bytes:
+            return self._inline(data, mime_type)
+
+        sha = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            handle = self._handles.get(sha)
+            if handle is not None and handle[2] - time.time() > EXPIRY_MARGIN:
+                self._counters["reuses"] += 1
+                self._counters["bytes_not_resent"] += _base64_size(len(data))
+                return types.Part.from_uri(file_uri=handle[0], mime_type=handle[1])
+            future = self._inflight.get(sha)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[sha] = future
+            else:
+                self._counters["coalesced"] += 1
+        if not leader:
+            handle = future.result()
+            if handle is None:
+                return self._inline(data, mime_type)
+            with self._lock:
+                self._counters["reuses"] += 1
+                self._counters["bytes_not_resent"] += _base64_size(len(data))
+            return types.Part.from_uri(file_uri=handle[0], mime_type=handle[1])
+
+        handle = None
+        try:
+            handle = self._upload(sha, data, mime_type)
+        except Exception as e:
+            print(f"[GeminiFiles] Upload failed ({e}) — sending {len(data)} bytes inline")
+            with self._lock:
+                self._counters["upload_failures"] += 1
+        finally:
+            with self._lock:
+                if handle is not None:
+                    self._handles[sha] = handle
+                self._inflight.pop(sha, None)
+            future.set_result(handle)
+        if handle is None:
+            return self._inline(data, mime_type)
+        return types.Part.from_uri(file_uri=handle[0], mime_type=handle[1])
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            now = time.time()
+            live = sum(1 for _, _, expires_at in self._handles.values() if expires_at > now)
+        counters["upload_seconds"] = round(counters["upload_seconds"], 2)
+        return {**counters, "live_handles": live, "min_bytes": self.min_bytes}
+
+    # ── Internals ─────────────────────────────────────────────────────────────
+
+    def _inline(self, data: bytes, mime_type: str) -> types.Part:
+        with self._lock:
+            self._counters["inlined"] += 1
+            self._counters["bytes_inlined"] += _base64_size(len(data))
+        return types.Part.from_bytes(data=data, mime_type=mime_type)
+
+    def _upload(self, sha: str, data: bytes, mime_type: str) -> tuple[str, str, float]:
+        start = time.monotonic()
+        with gemini.slot_sync(gemini.FILES):
+            file = self.client.files.upload(
+                file=io.BytesIO(data),
+                config=types.UploadFileConfig(mime_type=mime_type, display_name=f"pipeline-{sha[:16]}"),
+            )
+        deadline = time.monotonic() + ACTIVE_TIMEOUT
+        while file.state == types.FileState.PROCESSING:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{file.name} still processing after {ACTIVE_TIMEOUT}s")
+            time.sleep(ACTIVE_POLL)
+            with gemini.slot_sync(gemini.FILES):
+                file = self.client.files.get(name=file.name)
+        if file.state == types.FileState.FAILED:
+            raise RuntimeError(f"{file.name} failed processing: {file.error}")
+
+        elapsed = time.monotonic() - start
+        expires_at = file.expiration_time.timestamp() if file.expiration_time else time.time() + 47 * 3600
+        with self._lock:
+            self._counters["uploads"] += 1
+            self._counters["bytes_uploaded"] += len(data)
+            self._counters["upload_seconds"] += elapsed
+            # Drop handles that have expired so the map doesn't grow without bound
+            now = time.time()
+            for stale in [s for s, h in self._handles.items() if h[2] <= now]:
+                del self._handles[stale]
+        print(f"[GeminiFiles] Uploaded {len(data)} bytes as {file.name} in {elapsed:.2f}s "
+              f"(expires {datetime.fromtimestamp(expires_at, timezone.utc):%Y-%m-%d %H:%M}Z)")
+        return file.uri, file.mime_type or mime_type, expires_at
+
+
+def _base64_size(n: int) -> int:
+    return 4 * ((n + 2) // 3)
+
+
+_files = GeminiFiles()
+
+part  = _files.part
+stats = _files.stats
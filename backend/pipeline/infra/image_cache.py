@@ -0,0 +1,233 @@
+"""
+Content-addressed cache for images fetched from R2.
+
+The same object is read by several stages (runner result → masking input →
+inpainting input → generate routes writing local files), so every download
+goes through here and each object crosses the network at most once per process.
+
+- index: r2_path → sha256 of bytes. R2 keys we read are write-once
+  (uuid-named), so a hit on the path needs no revalidation. A path is dropped
+  from the index once its blob has left both tiers, so the index is bounded
+  by what the tiers hold.
+- memory tier: LRU of blobs by sha256, bounded by IMAGE_CACHE_MEMORY_MB
+- disk tier: <IMAGE_CACHE_DIR>/<sha256>, LRU-evicted above IMAGE_CACHE_DISK_MB
+- concurrent misses for the same path share one download
+
+The index lives in memory only. Blobs left in the directory by an earlier
+process are counted against the disk budget and evicted first; they are not
+reachable by path until the same bytes are fetched again.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from infra import r2
+
+CACHE_DIR        = os.environ.get("IMAGE_CACHE_DIR", "/tmp/pipeline-image-cache")
+MEMORY_BUDGET    = int(os.environ.get("IMAGE_CACHE_MEMORY_MB", "256")) * 1024 * 1024
+DISK_BUDGET      = int(os.environ.get("IMAGE_CACHE_DISK_MB", "2048")) * 1024 * 1024
+
+
+class ImageCache:
+    def __init__(self, cache_dir: str = CACHE_DIR, memory_budget: int = MEMORY_BUDGET, disk_budget: int = DISK_BUDGET):
+        self.cache_dir = cache_dir
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+
+        self._lock = threading.Lock()
+        self._index: dict[str, str] = {}                    # r2_path → sha
+        self._paths: dict[str, set[str]] = {}               # sha → r2_paths indexed to it
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()   # sha → size
+        self._disk_bytes = 0
+        self._inflight: dict[str, Future] = {}
+
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "bytes_downloaded": 0,
+            "bytes_served_from_cache": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._scan_disk()
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def fetch(self, r2_path: str) -> bytes:
+        """Return the object's bytes, downloading it only if no tier has it."""
+        data = self._lookup(r2_path)
+        if data is not None:
+            return data
+
+        with self._lock:
+            future = self._inflight.get(r2_path)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[r2_path] = future
+            else:
+                self._counters["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            bucket, key = r2.parse_r2_path(r2_path)
+            resp = r2.client().get_object(Bucket=bucket, Key=key)
+            data = resp["Body"].read()
+            with self._lock:
+                self._counters["misses"] += 1
+                self._counters["bytes_downloaded"] += len(data)
+            self.put(r2_path, data)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(r2_path, None)
+
+    def put(self, r2_path: str, data: bytes):
+        """Seed the cache with bytes we already hold (e.g. right after uploading them)."""
+        sha = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            old_sha = self._index.get(r2_path)
+            if old_sha is not None and old_sha != sha:
+                self._paths.get(old_sha, set()).discard(r2_path)
+            self._index[r2_path] = sha
+            self._paths.setdefault(sha, set()).add(r2_path)
+            self._memory_put(sha, data)
+            on_disk = sha in self._disk
+        if not on_disk:
+            self._disk_put(sha, data)
+        with self._lock:
+            self._forget_if_uncached(sha)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+            return {
+                **counters,
+                "hit_rate": round((counters["memory_hits"] + counters["disk_hits"]) / lookups, 3) if lookups else None,
+                "indexed_paths": len(self._index),
+                "memory": {"entries": len(self._memory), "bytes": self._memory_bytes, "budget": self.memory_budget},
+                "disk": {"entries": len(self._disk), "bytes": self._disk_bytes, "budget": self.disk_budget},
+            }
+
+    # ── Tiers ─────────────────────────────────────────────────────────────────
+
+    def _lookup(self, r2_path: str) -> bytes | None:
+        with self._lock:
+            sha = self._index.get(r2_path)
+            if sha is None:
+                return None
+            data = self._memory.get(sha)
+            if data is not None:
+                self._memory.move_to_end(sha)
+                self._counters["memory_hits"] += 1
+                self._counters["bytes_served_from_cache"] += len(data)
+                return data
+            if sha not in self._disk:
+                return None
+            self._disk.move_to_end(sha)
+
+        try:
+            with open(self._blob_path(sha), "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(sha, 0)
+                self._forget_if_uncached(sha)
+            return None
+
+        with self._lock:
+            self._memory_put(sha, data)
+            self._counters["disk_hits"] += 1
+            self._counters["bytes_served_from_cache"] += len(data)
+        return data
+
+    def _memory_put(self, sha: str, data: bytes):
+        # Caller holds self._lock
+        if sha in self._memory:
+            self._memory.move_to_end(sha)
+            return
+        if len(data) > self.memory_budget:
+            return
+        self._memory[sha] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_budget:
+            evicted_sha, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counters["memory_evictions"] += 1
+            self._forget_if_uncached(evicted_sha)
+
+    def _disk_put(self, sha: str, data: bytes):
+        if len(data) > self.disk_budget:
+            return
+        path = self._blob_path(sha)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[ImageCache] disk write failed for {sha[:12]}: {e}")
+            return
+
+        evict = []
+        with self._lock:
+            if sha not in self._disk:
+                self._disk[sha] = len(data)
+                self._disk_bytes += len(data)
+            while self._disk_bytes > self.disk_budget and len(self._disk) > 1:
+                old_sha, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self._counters["disk_evictions"] += 1
+                self._forget_if_uncached(old_sha)
+                evict.append(old_sha)
+        for old_sha in evict:
+            try:
+                os.remove(self._blob_path(old_sha))
+            except OSError:
+                pass
+
+    def _forget_if_uncached(self, sha: str):
+        """Drop the index entries of a blob neither tier holds any more. Caller holds self._lock."""
+        if sha in self._memory or sha in self._disk:
+            return
+        for r2_path in self._paths.pop(sha, ()):
+            if self._index.get(r2_path) == sha:
+                del self._index[r2_path]
+
+    def _scan_disk(self):
+        """Count blobs left by a previous process against the budget (oldest first, so they're evicted first)."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+                continue
+            st = os.stat(path)
+            entries.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_bytes += size
+
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.cache_dir, sha)
+
+
+_cache = ImageCache()
+
+fetch = _cache.fetch
+put   = _cache.put
+stats = _cache.stats
@@ -0,0 +1,220 @@
+"""
+Cache for template preview images (the character reference in template mode).
+
+Every template-mode attempt used to HEAD the preview (_verify_preview) and then
+GET it again inside review_character, so each character review paid two round
+trips to the templates service. Both now go through fetch():
+
+- entries are kept in memory by URL (bytes, content type, ETag, Last-Modified)
+  and served without any request for PREVIEW_CACHE_FRESH_SECONDS after the
+  last check
+- after that the entry is revalidated with a conditional GET
+  (If-None-Match / If-Modified-Since, answered by the templates service's
+  serve_template_image); a 304 costs no body, a 200 replaces the entry
+- if revalidation fails (templates service down) the cached copy is served
+- filesystem paths (local dev templates) are cached by mtime
+- concurrent misses for the same URL share one download
+- prewarm() fetches every template's preview at pipeline-service startup, so
+  the first attempt of a run doesn't pay for it either
+- at most PREVIEW_CACHE_MAX_ENTRIES previews are kept, least recently used
+  dropped first
+"""
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+TEMPLATES_BASE_URL = os.environ.get("TEMPLATES_SERVICE_URL", "http://localhost:5003")
+FRESH_SECONDS      = float(os.environ.get("PREVIEW_CACHE_FRESH_SECONDS", "60"))
+MAX_ENTRIES        = int(os.environ.get("PREVIEW_CACHE_MAX_ENTRIES", "256"))
+PREWARM_WORKERS    = 8
+IMAGE_TYPES        = ("image/jpeg", "image/png", "image/webp")
+
+
+class PreviewCache:
+    def __init__(self, base_url: str = TEMPLATES_BASE_URL, fresh_seconds: float = FRESH_SECONDS,
+                 max_entries: int = MAX_ENTRIES):
+        self.base_url = base_url
+        self.fresh_seconds = fresh_seconds
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, dict] = OrderedDict()   # url → {data, content_type, etag, last_modified, checked}
+        self._inflight: dict[str, Future] = {}
+        self._counters = {
+            "hits": 0,
+            "revalidated": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "stale_served": 0,
+            "bytes_downloaded": 0,
+            "prewarmed": 0,
+        }
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def fetch(self, url: str) -> tuple[bytes, str]:
+        """
+        Return (bytes, content type) of a preview given as a filesystem path, a
+        templates-service path (/api/template-images/...) or an absolute URL.
+        Raises if it can't be read and nothing is cached.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and time.monotonic() - entry["checked"] < self.fresh_seconds:
+                self._entries.move_to_end(url)
+                self._counters["hits"] += 1
+                return entry["data"], entry["content_type"]
+            future = self._inflight.get(url)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[url] = future
+            else:
+                self._counters["coalesced"] += 1
+        if not leader:
+            entry = future.result()
+            return entry["data"], entry["content_type"]
+
+        try:
+            entry = self._revalidate(url, entry)
+            future.set_result(entry)
+            return entry["data"], entry["content_type"]
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(url, None)
+
+    def available(self, url: str) -> bool:
+        """Whether the preview can be read (and is now cached)."""
+        try:
+            self.fetch(url)
+            return True
+        except Exception as e:
+            print(f"[PreviewCache] Preview not available ({e}): {url}")
+            return False
+
+    def prewarm(self) -> int:
+        """Fetch every template's preview image. Returns how many were cached."""
+        try:
+            resp = requests.get(f"{self.base_url}/api/templates", timeout=10)
+            resp.raise_for_status()
+            urls = {t.get("preview_image_url") for t in resp.json().get("templates", [])}
+        except Exception as e:
+            print(f"[PreviewCache] Prewarm skipped — templates service unavailable: {e}")
+            return 0
+        urls = [u for u in urls if u][: self.max_entries]
+        if not urls:
+            return 0
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=min(PREWARM_WORKERS, len(urls))) as pool:
+            warmed = sum(pool.map(self.available, urls))
+        with self._lock:
+            self._counters["prewarmed"] += warmed
+        print(f"[PreviewCache] Prewarmed {warmed}/{len(urls)} template previews in {time.monotonic() - start:.2f}s")
+        return warmed
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            lookups = counters["hits"] + counters["revalidated"] + counters["misses"]
+            return {
+                **counters,
+                "hit_rate": round((counters["hits"] + counters["revalidated"]) / lookups, 3) if lookups else None,
+                "entries": len(self._entries),
+                "bytes": sum(len(e["data"]) for e in self._entries.values()),
+                "max_entries": self.max_entries,
+                "fresh_seconds": self.fresh_seconds,
+            }
+
+    # ── Internals ─────────────────────────────────────────────────────────────
+
+    def _revalidate(self, url: str, entry: dict | None) -> dict:
+        if os.path.exists(url):
+            return self._from_disk(url, entry)
+
+        full_url = (self.base_url + url) if url.startswith("/") else url
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            resp = requests.get(full_url, headers=headers, timeout=15)
+            if resp.status_code != 304:
+                resp.raise_for_status()
+        except requests.RequestException as e:
+            if entry is None:
+                raise
+            print(f"[PreviewCache] Revalidation failed ({e}) — serving cached {url}")
+            with self._lock:
+                self._counters["stale_served"] += 1
+            return entry
+
+        if resp.status_code == 304 and entry is not None:
+            with self._lock:
+                entry["checked"] = time.monotonic()
+                self._counters["revalidated"] += 1
+                self._store(url, entry)
+            return entry
+
+        content_type = resp.headers.get("content-type", "image/jpeg").split(";")[0].strip()
+        entry = {
+            "data": resp.content,
+            "content_type": content_type if content_type in IMAGE_TYPES else "image/jpeg",
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "checked": time.monotonic(),
+        }
+        with self._lock:
+            self._counters["misses"] += 1
+            self._counters["bytes_downloaded"] += len(entry["data"])
+            self._store(url, entry)
+        return entry
+
+    def _from_disk(self, path: str, entry: dict | None) -> dict:
+        mtime = str(os.stat(path).st_mtime_ns)
+        if entry is not None and entry["etag"] == mtime:
+            with self._lock:
+                entry["checked"] = time.monotonic()
+                self._counters["revalidated"] += 1
+                self._store(path, entry)
+            return entry
+
+        with open(path, "rb") as f:
+            data = f.read()
+        content_type = mimetypes.guess_type(path)[0]
+        entry = {
+            "data": data,
+            "content_type": content_type if content_type in IMAGE_TYPES else "image/jpeg",
+            "etag": mtime,
+            "last_modified": None,
+            "checked": time.monotonic(),
+        }
+        with self._lock:
+            self._counters["misses"] += 1
+            self._store(path, entry)
+        return entry
+
+    def _store(self, url: str, entry: dict):
+        """Insert as most recently used and trim to max_entries. Caller holds self._lock."""
+        self._entries[url] = entry
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+_cache = PreviewCache()
+
+fetch     = _cache.fetch
+available = _cache.available
+prewarm   = _cache.prewarm
+stats     = _cache.stats
@@ -0,0 +1,79 @@
+"""
+Process-wide R2 (S3-compatible) client.
+
+boto3 clients are thread-safe, so one client with a tuned connection pool is
+shared by every download/upload in the process. Building it once avoids paying
+credential resolution, endpoint setup and a fresh TLS handshake per call;
+keep-alive connections are reused from the pool.
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+R2_ENDPOINT_URL      = os.environ.get("R2_ENDPOINT_URL")
+R2_ACCESS_KEY_ID     = os.environ.get("R2_ACCESS_KEY_ID")
+R2_SECRET_ACCESS_KEY = os.environ.get("R2_SECRET_ACCESS_KEY")
+R2_BUCKET            = os.environ.get("R2_OUTPUT_BUCKET", "")
+
+MAX_POOL_CONNECTIONS = int(os.environ.get("R2_MAX_POOL_CONNECTIONS", "50"))
+
+_CONFIG = Config(
+    signature_version="s3v4",
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    retries={"max_attempts": 5, "mode": "adaptive"},
+    connect_timeout=5,
+    read_timeout=60,
+    tcp_keepalive=True,
+)
+
+_client = None
+_lock = threading.Lock()
+
+
+def client():
+    """Return the shared boto3 S3 client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = boto3.session.Session().client(
+                    "s3",
+                    endpoint_url=R2_ENDPOINT_URL,
+                    aws_access_key_id=R2_ACCESS_KEY_ID,
+                    aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+                    config=_CONFIG,
+                    region_name="auto",
+                )
+    return _client
+
+
+def parse_r2_path(r2_path: str) -> tuple[str, str]:
+    """Split r2://bucket/key into (bucket, key). A bare key uses R2_OUTPUT_BUCKET."""
+    if r2_path.startswith("r2://"):
+        bucket, key = r2_path[5:].split("/", 1)
+        return bucket, key
+    return R2_BUCKET, r2_path
+
+
+def download(r2_path: str) -> bytes:
+    bucket, key = parse_r2_path(r2_path)
+    resp = client().get_object(Bucket=bucket, Key=key)
+    return resp["Body"].read()
+
+
+def upload(data: bytes, key: str, content_type: str, bucket: str | None = None) -> str:
+    """Upload bytes and return the r2:// path."""
+    bucket = bucket or R2_BUCKET
+    client().put_object(Bucket=bucket, Key=key, Body=data, ContentType=content_type)
+    return f"r2://{bucket}/{key}"
+
+
+def presign(r2_path: str, expires_in: int = 3600) -> str:
+    bucket, key = parse_r2_path(r2_path)
+    return client().generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket, "Key": key},
+        ExpiresIn=expires_in,
+    )
@@ -0,0 +1,158 @@
+"""
+Persistent cache of Gemini review verdicts.
+
+The agents re-review the same r2_path, and re-run pipelines produce identical
+bytes; both used to cost a fresh gemini-2.0-flash call. Reviews now go through
+cached(), which stores Gemini's parsed JSON answer keyed by
+
+    sha256(model, rendered reviewer prompt, review image settings, sha256 of each image)
+
+The rendered prompt carries the subject and any params, so editing a
+reviewer prompt (a new prompt version) or changing its inputs is a new key.
+Images are hashed as the original bytes, but Gemini sees the review copy, so
+review_images.fingerprint() (max edge, format, quality, version) is part of
+the key too — nothing needs manual invalidation. Only Gemini's answer is stored; thresholds
+and result shaping stay in the reviewers and apply to cached answers too.
+
+- SQLite (REVIEW_CACHE_PATH, WAL) so every pipeline process shares the cache
+- entries expire after REVIEW_CACHE_TTL_HOURS; above REVIEW_CACHE_MAX_ENTRIES
+  the least recently used are dropped
+- each row keeps the Gemini latency of the call that produced it, so a hit
+  counts the seconds it saved
+- counters per reviewer node (hits, misses, hit_rate, saved / spent Gemini
+  seconds) are reported by stats() under /api/pipeline/metrics
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from infra import review_images
+
+CACHE_PATH  = os.environ.get("REVIEW_CACHE_PATH", "data/review_cache.db")
+TTL_SECONDS = float(os.environ.get("REVIEW_CACHE_TTL_HOURS", "168")) * 3600
+MAX_ENTRIES = int(os.environ.get("REVIEW_CACHE_MAX_ENTRIES", "50000"))
+PRUNE_EVERY = 100   # inserts between expiry / size sweeps
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    key        TEXT PRIMARY KEY,
+    node       TEXT NOT NULL,
+    result     TEXT NOT NULL,
+    latency    REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_used  REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_reviews_last_used ON reviews (last_used);
+"""
+
+
+class ReviewCache:
+    def __init__(self, path: str = CACHE_PATH, ttl: float = TTL_SECONDS, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._counters: dict[str, dict] = {}
+        self._conn().executescript(_SCHEMA)
+        self._prune()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def cached(self, node: str, model: str, prompt: str, images: list[bytes], call) -> dict:
+        """
+        Gemini's parsed answer for this review: from the cache when the same
+        model, prompt and image bytes were reviewed within the TTL, otherwise
+        from call() (which is then stored). Failures are not cached.
+        """
+        key = _key(model, prompt, images)
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT result, latency, created_at FROM reviews WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and now - row[2] <= self.ttl:
+            self._conn().execute("UPDATE reviews SET last_used = ? WHERE key = ?", (now, key))
+            self._count(node, hit=True, seconds=row[1])
+            print(f"[ReviewCache] hit node={node} saved={row[1]:.2f}s")
+            return json.loads(row[0])
+
+        start = time.monotonic()
+        result = call()
+        latency = time.monotonic() - start
+        self._count(node, hit=False, seconds=latency)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO reviews (key, node, result, latency, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, node, json.dumps(result), latency, now, now),
+        )
+        with self._lock:
+            self._inserts += 1
+            prune = self._inserts % PRUNE_EVERY == 0
+        if prune:
+            self._prune()
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            nodes = {}
+            for node, c in self._counters.items():
+                lookups = c["hits"] + c["misses"]
+                nodes[node] = {
+                    **c,
+                    "hit_rate": round(c["hits"] / lookups, 3) if lookups else None,
+                    "saved_gemini_seconds": round(c["saved_gemini_seconds"], 2),
+                    "gemini_seconds": round(c["gemini_seconds"], 2),
+                }
+        entries = self._conn().execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+        return {"entries": entries, "max_entries": self.max_entries, "ttl_hours": self.ttl / 3600, "nodes": nodes}
+
+    # ── Internals ─────────────────────────────────────────────────────────────
+
+    def _count(self, node: str, hit: bool, seconds: float):
+        with self._lock:
+            c = self._counters.setdefault(
+                node, {"hits": 0, "misses": 0, "saved_gemini_seconds": 0.0, "gemini_seconds": 0.0}
+            )
+            if hit:
+                c["hits"] += 1
+                c["saved_gemini_seconds"] += seconds
+            else:
+                c["misses"] += 1
+                c["gemini_seconds"] += seconds
+
+    def _prune(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM reviews WHERE created_at < ?", (time.time() - self.ttl,))
+        excess = conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM reviews WHERE key IN (SELECT key FROM reviews ORDER BY last_used LIMIT ?)", (excess,)
+            )
+
+
+def _key(model: str, prompt: str, images: list[bytes]) -> str:
+    h = hashlib.sha256()
+    for part in (model, prompt, review_images.fingerprint(), *(hashlib.sha256(image).hexdigest() for image in images)):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+_cache = ReviewCache()
+
+cached = _cache.cached
+stats  = _cache.stats
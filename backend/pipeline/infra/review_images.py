@@ -0,0 +1,151 @@
+"""
+Downscaled copies of images for Gemini reviews.
+
+Reviews sent the full-resolution PNG (upscaled outputs are up to 2560 px) as
+image/png although the reviewer judges composition, identity and defects at
+~1024 px. prepare() returns a review copy instead; callers keep the original
+bytes for everything downstream (R2, masking/inpainting inputs, the review
+cache key).
+
+- the longest edge is scaled down to REVIEW_IMAGE_MAX_EDGE (LANCZOS); smaller
+  images keep their size
+- re-encoded as REVIEW_IMAGE_FORMAT (jpeg or webp) at REVIEW_IMAGE_QUALITY;
+  images with transparency always go to WebP, which keeps the alpha
+- a JPEG/WebP that is already within the edge limit is passed through as-is,
+  as is a small image the re-encode wouldn't shrink (flat masks as PNG)
+- prepare_many() handles the images of one review in parallel on a pool of
+  REVIEW_IMAGE_WORKERS threads (Pillow releases the GIL while resizing and
+  encoding)
+- recent results are memoised by sha256, so the product image or template
+  preview that every review repeats is only re-encoded once
+- anything Pillow can't decode is sent unchanged
+- fingerprint() names the settings (edge, format, quality, VERSION); the
+  review cache puts it in its key, so verdicts on differently prepared
+  images (or the full-size PNGs sent before this module) are never reused
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+MAX_EDGE = int(os.environ.get("REVIEW_IMAGE_MAX_EDGE", "1024"))
+FORMAT   = os.environ.get("REVIEW_IMAGE_FORMAT", "jpeg").lower()
+QUALITY  = int(os.environ.get("REVIEW_IMAGE_QUALITY", "90"))
+WORKERS  = int(os.environ.get("REVIEW_IMAGE_WORKERS", "4"))
+MEMO_ENTRIES = 64
+VERSION      = 1      # bump when _encode changes what the reviewer sees
+REDUCING_GAP = 1.25   # box-reduce by an integer factor first, then LANCZOS the rest (~2.5x faster from 2560 px)
+
+_MIME = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class ReviewImages:
+    def __init__(self, max_edge: int = MAX_EDGE, fmt: str = FORMAT, quality: int = QUALITY, workers: int = WORKERS):
+        if fmt not in ("jpeg", "webp"):
+            raise ValueError(f"REVIEW_IMAGE_FORMAT must be jpeg or webp, not {fmt!r}")
+        self.max_edge = max_edge
+        self.format = fmt.upper()
+        self.quality = quality
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="review-image")
+        self._lock = threading.Lock()
+        self._memo: OrderedDict[str, tuple[bytes, str]] = OrderedDict()
+        self._counters = {
+            "images": 0,
+            "reencoded": 0,
+            "passed_through": 0,
+            "memo_hits": 0,
+            "decode_failures": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "seconds": 0.0,
+        }
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def prepare(self, data: bytes, mime_type: str = "image/png") -> tuple[bytes, str]:
+        """(bytes, mime type) to send to the reviewer for this image. `mime_type` is the fallback if it can't be decoded."""
+        sha = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            memo = self._memo.get(sha)
+            if memo is not None:
+                self._memo.move_to_end(sha)
+                self._counters["memo_hits"] += 1
+                return memo
+
+        start = time.monotonic()
+        try:
+            out, out_type, reencoded = self._encode(data)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print(f"[ReviewImages] Could not decode image ({e}) — sending it unchanged")
+            with self._lock:
+                self._counters["decode_failures"] += 1
+            return data, mime_type
+        elapsed = time.monotonic() - start
+
+        with self._lock:
+            self._counters["images"] += 1
+            self._counters["reencoded" if reencoded else "passed_through"] += 1
+            self._counters["bytes_in"] += len(data)
+            self._counters["bytes_out"] += len(out)
+            self._counters["seconds"] += elapsed
+            self._memo[sha] = (out, out_type)
+            while len(self._memo) > MEMO_ENTRIES:
+                self._memo.popitem(last=False)
+        return out, out_type
+
+    def prepare_many(self, images: list[tuple[bytes, str]]) -> list[tuple[bytes, str]]:
+        """prepare() for each (bytes, mime type), in parallel. Results are in input order."""
+        if len(images) <= 1:
+            return [self.prepare(data, mime_type) for data, mime_type in images]
+        return list(self._pool.map(lambda image: self.prepare(*image), images))
+
+    def fingerprint(self) -> str:
+        """Identifies what prepare() produces for a given image under these settings."""
+        return f"v{VERSION}:{self.max_edge}:{self.format.lower()}:q{self.quality}"
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        counters["seconds"] = round(counters["seconds"], 2)
+        counters["size_ratio"] = round(counters["bytes_out"] / counters["bytes_in"], 3) if counters["bytes_in"] else None
+        return {**counters, "max_edge": self.max_edge, "format": self.format.lower(), "quality": self.quality}
+
+    # ── Internals ─────────────────────────────────────────────────────────────
+
+    def _encode(self, data: bytes) -> tuple[bytes, str, bool]:
+        """Returns (bytes, mime type, whether it was re-encoded)."""
+        with Image.open(io.BytesIO(data)) as im:
+            source = im.format
+            downscale = max(im.size) > self.max_edge
+            if source in ("JPEG", "WEBP") and not downscale:
+                return data, _MIME[source], False
+
+            alpha = im.mode in ("RGBA", "LA", "PA") or (im.mode == "P" and "transparency" in im.info)
+            im = im.convert("RGBA" if alpha else "RGB")
+            if downscale:
+                scale = self.max_edge / max(im.size)
+                im = im.resize((max(1, round(im.width * scale)), max(1, round(im.height * scale))), Image.LANCZOS, reducing_gap=REDUCING_GAP)
+
+        fmt = "WEBP" if alpha else self.format
+        buf = io.BytesIO()
+        if fmt == "JPEG":
+            im.save(buf, "JPEG", quality=self.quality, optimize=True)
+        else:
+            im.save(buf, "WEBP", quality=self.quality, method=4)
+        # Flat images (masks) can compress better as the original PNG
+        if not downscale and source in _MIME and buf.tell() >= len(data):
+            return data, _MIME[source], False
+        return buf.getvalue(), _MIME[fmt], True
+
+
+_images = ReviewImages()
+
+prepare      = _images.prepare
+prepare_many = _images.prepare_many
+fingerprint  = _images.fingerprint
+stats        = _images.stats
@@ -0,0 +1,308 @@
+"""
+Shared RunPod job poller.
+
+Every in-flight RunPod job in the process is tracked here instead of in its own
+sleep/poll loop. One scheduler (on its own background event loop) decides when
+each job is next due and issues the GET /status calls over a single keep-alive
+session, resolving one future per job when it reaches a terminal status.
+
+Poll intervals adapt per endpoint:
+- sleep until the job's expected completion — queue delay plus execution time,
+  both tracked as EWMAs of what RunPod reported for recent jobs on that endpoint
+  (never longer than RUNPOD_POLL_SLOW between checks)
+- then poll fast (RUNPOD_POLL_FAST) for a short window
+- if the job overruns that window, back off exponentially up to RUNPOD_POLL_MAX
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+RUNPOD_API_KEY  = os.environ.get("RUNPOD_API_KEY", "")
+RUNPOD_BASE_URL = os.environ.get("RUNPOD_BASE_URL", "https://api.runpod.ai/v2")
+TERMINAL        = {"COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT", "CANCELLED_BY_SYSTEM"}
+
+FAST_INTERVAL    = float(os.environ.get("RUNPOD_POLL_FAST", "1.0"))
+SLOW_INTERVAL    = float(os.environ.get("RUNPOD_POLL_SLOW", "5.0"))
+MAX_INTERVAL     = float(os.environ.get("RUNPOD_POLL_MAX", "15.0"))
+DEFAULT_EXPECTED = 30.0   # assumed execution time (s) before an endpoint has history
+DEFAULT_DELAY    = 2.0    # assumed queue delay (s) before an endpoint has history
+EWMA_ALPHA       = 0.3
+MAX_POLL_ERRORS  = 5
+HTTP_WORKERS     = int(os.environ.get("RUNPOD_POLL_WORKERS", "8"))
+
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+
+def _headers():
+    return {"Authorization": f"Bearer {RUNPOD_API_KEY}", "Content-Type": "application/json"}
+
+
+class _Job:
+    __slots__ = (
+        "endpoint_id", "job_id", "future", "submitted_at", "submitted_wall",
+        "started_at", "last_poll_at", "polls", "overdue_polls", "errors", "in_flight",
+    )
+
+    def __init__(self, endpoint_id: str, job_id: str, future: Future):
+        self.endpoint_id = endpoint_id
+        self.job_id = job_id
+        self.future = future
+        self.submitted_at = time.monotonic()
+        self.submitted_wall = time.time()
+        self.started_at: float | None = None
+        self.last_poll_at = self.submitted_at
+        self.polls = 0
+        self.overdue_polls = 0
+        self.errors = 0
+        self.in_flight = False
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.poll_calls = 0
+        self.poll_errors = 0
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.expected_execution = DEFAULT_EXPECTED
+        self.expected_delay = DEFAULT_DELAY
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def observe_latency(self, seconds: float):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.latency_counts[i] += 1
+                break
+        else:
+            self.latency_counts[-1] += 1
+        self.latency_sum += seconds
+        self.latency_count += 1
+
+    def snapshot(self) -> dict:
+        finished = self.jobs_completed + self.jobs_failed
+        buckets, running = {}, 0
+        for bound, count in zip(LATENCY_BUCKETS, self.latency_counts):
+            running += count
+            buckets[str(bound)] = running
+        buckets["+Inf"] = running + self.latency_counts[-1]
+        return {
+            "poll_calls": self.poll_calls,
+            "poll_errors": self.poll_errors,
+            "jobs_completed": self.jobs_completed,
+            "jobs_failed": self.jobs_failed,
+            "polls_per_job": round(self.poll_calls / finished, 2) if finished else None,
+            "expected_execution_s": round(self.expected_execution, 2),
+            "expected_delay_s": round(self.expected_delay, 2),
+            "detection_latency_s": {
+                "buckets": buckets,
+                "count": self.latency_count,
+                "sum": round(self.latency_sum, 3),
+            },
+        }
+
+
+class RunPodPoller:
+    def __init__(self):
+        self._session = requests.Session()
+        self._http = ThreadPoolExecutor(max_workers=HTTP_WORKERS, thread_name_prefix="runpod-poll")
+        self._jobs: dict[tuple[str, str], _Job] = {}
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._stats: dict[str, _EndpointStats] = {}
+        self._stats_lock = threading.Lock()
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._start_lock = threading.Lock()
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            ready = threading.Event()
+            threading.Thread(target=self._run_loop, args=(ready,), name="runpod-poller", daemon=True).start()
+            ready.wait()
+
+    def _run_loop(self, ready: threading.Event):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        loop.create_task(self._schedule())
+        ready.set()
+        loop.run_forever()
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def submit(self, endpoint_id: str, job_input: dict) -> str:
+        """POST /run on the shared session. Returns the RunPod job id."""
+        r = self._session.post(
+            f"{RUNPOD_BASE_URL}/{endpoint_id}/run",
+            headers=_headers(),
+            json={"input": job_input},
+            timeout=30,
+        )
+        r.raise_for_status()
+        return r.json()["id"]
+
+    def cancel(self, endpoint_id: str, job_id: str):
+        """Ask RunPod to cancel a job and stop tracking it. Best effort."""
+        self._ensure_started()
+        self._loop.call_soon_threadsafe(self._drop, endpoint_id, job_id)
+        try:
+            self._session.post(f"{RUNPOD_BASE_URL}/{endpoint_id}/cancel/{job_id}", headers=_headers(), timeout=10)
+        except Exception as e:
+            print(f"[RunPod poller] cancel {job_id} failed: {e}")
+
+    def track(self, endpoint_id: str, job_id: str) -> Future:
+        """Start tracking a submitted job. The future resolves with the terminal status payload."""
+        self._ensure_started()
+        future: Future = Future()
+        job = _Job(endpoint_id, job_id, future)
+        self._loop.call_soon_threadsafe(self._add, job)
+        return future
+
+    async def wait(self, endpoint_id: str, job_id: str) -> dict:
+        return await asyncio.wrap_future(self.track(endpoint_id, job_id))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            endpoints = {ep: s.snapshot() for ep, s in self._stats.items()}
+        return {"tracked_jobs": len(self._jobs), "endpoints": endpoints}
+
+    # ── Scheduler (loop thread only) ──────────────────────────────────────────
+
+    def _endpoint_stats(self, endpoint_id: str) -> _EndpointStats:
+        s = self._stats.get(endpoint_id)
+        if s is None:
+            with self._stats_lock:
+                s = self._stats.setdefault(endpoint_id, _EndpointStats())
+        return s
+
+    def _add(self, job: _Job):
+        self._jobs[(job.endpoint_id, job.job_id)] = job
+        self._endpoint_stats(job.endpoint_id)
+        self._push(job, FAST_INTERVAL)
+
+    def _drop(self, endpoint_id: str, job_id: str):
+        job = self._jobs.pop((endpoint_id, job_id), None)
+        if job and not job.future.done():
+            job.future.cancel()
+
+    def _push(self, job: _Job, delay: float):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), (job.endpoint_id, job.job_id)))
+        self._wakeup.set()
+
+    async def _schedule(self):
+        while True:
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, key = heapq.heappop(self._heap)
+                job = self._jobs.get(key)
+                if job is None or job.in_flight:
+                    continue
+                if job.future.cancelled():
+                    self._jobs.pop(key, None)
+                    continue
+                job.in_flight = True
+                self._loop.create_task(self._poll(job))
+            timeout = (self._heap[0][0] - now) if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, job: _Job):
+        stats = self._endpoint_stats(job.endpoint_id)
+        try:
+            data = await self._loop.run_in_executor(self._http, self._fetch_status, job.endpoint_id, job.job_id)
+        except Exception as e:
+            job.in_flight = False
+            job.errors += 1
+            with self._stats_lock:
+                stats.poll_calls += 1
+                stats.poll_errors += 1
+            if job.errors >= MAX_POLL_ERRORS:
+                self._finish(job, exc=e)
+            else:
+                self._push(job, min(MAX_INTERVAL, SLOW_INTERVAL * job.errors))
+            return
+
+        job.in_flight = False
+        job.errors = 0
+        job.polls += 1
+        with self._stats_lock:
+            stats.poll_calls += 1
+
+        status = data.get("status")
+        if status in TERMINAL:
+            self._finish(job, data=data)
+            return
+        now = time.monotonic()
+        if status == "IN_PROGRESS" and job.started_at is None:
+            # It started somewhere since the previous poll — take the midpoint
+            job.started_at = (job.last_poll_at + now) / 2
+        job.last_poll_at = now
+        self._push(job, self._next_interval(job, stats))
+
+    def _next_interval(self, job: _Job, stats: _EndpointStats) -> float:
+        now = time.monotonic()
+        if job.started_at is not None:
+            eta = job.started_at + stats.expected_execution
+        else:
+            eta = job.submitted_at + stats.expected_delay + stats.expected_execution
+        if now < eta:
+            return max(FAST_INTERVAL, min(eta - now, SLOW_INTERVAL))
+        fast_window = max(3 * FAST_INTERVAL, 0.25 * stats.expected_execution)
+        if now - eta < fast_window:
+            return FAST_INTERVAL
+        job.overdue_polls += 1
+        return min(MAX_INTERVAL, FAST_INTERVAL * (2 ** job.overdue_polls))
+
+    def _fetch_status(self, endpoint_id: str, job_id: str) -> dict:
+        r = self._session.get(f"{RUNPOD_BASE_URL}/{endpoint_id}/status/{job_id}", headers=_headers(), timeout=15)
+        r.raise_for_status()
+        return r.json()
+
+    def _finish(self, job: _Job, data: dict | None = None, exc: Exception | None = None):
+        self._jobs.pop((job.endpoint_id, job.job_id), None)
+        stats = self._endpoint_stats(job.endpoint_id)
+        with self._stats_lock:
+            if data is not None and data.get("status") == "COMPLETED":
+                stats.jobs_completed += 1
+                execution_ms = data.get("executionTime")
+                if execution_ms:
+                    stats.expected_execution += EWMA_ALPHA * (execution_ms / 1000 - stats.expected_execution)
+                if data.get("delayTime") is not None:
+                    stats.expected_delay += EWMA_ALPHA * (data["delayTime"] / 1000 - stats.expected_delay)
+                # RunPod reports queue delay + execution time, which tells us when the job actually finished
+                if execution_ms is not None and data.get("delayTime") is not None:
+                    finished_at = job.submitted_wall + (data["delayTime"] + execution_ms) / 1000
+                    stats.observe_latency(max(0.0, time.time() - finished_at))
+            else:
+                stats.jobs_failed += 1
+        if job.future.done():
+            return
+        if exc is not None:
+            job.future.set_exception(exc)
+        else:
+            job.future.set_result(data)
+
+
+_poller = RunPodPoller()
+
+submit = _poller.submit
+cancel = _poller.cancel
+track  = _poller.track
+wait   = _poller.wait
+stats  = _poller.stats
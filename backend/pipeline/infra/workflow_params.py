@@ -0,0 +1,53 @@
+"""
+Local validation of RunPod job inputs against the workers' parameter manifests.
+
+Each worker declares its workflow parameters (type, min / max / choices, node
+targets) in microservices/<worker>/workflow_params.json. The runners keep a
+copy of the manifest for the endpoint they call and check job inputs against
+it before submitting, so an out-of-range value the agent picked fails in
+microseconds instead of after a RunPod queue + cold start.
+
+Only job-input keys that are manifest parameters are checked; everything else
+(image URLs, worker-side options) is passed through untouched. None values are
+skipped — the worker fills its own default.
+"""
+import json
+
+TYPES = {
+    "int": (int,),
+    "float": (int, float),
+    "str": (str,),
+    "bool": (bool,),
+}
+
+
+def load(path: str) -> dict[str, dict]:
+    """Parameter specs from a manifest, keyed by parameter name."""
+    with open(path) as f:
+        params = json.load(f)["params"]
+    for name, spec in params.items():
+        if spec.get("type", "str") not in TYPES:
+            raise ValueError(f"{path}: parameter '{name}' has unknown type '{spec.get('type')}'")
+    return params
+
+
+def check(params: dict[str, dict], job_input: dict) -> list[str]:
+    """Error messages for job-input values outside their manifest spec."""
+    errors = []
+    for name, value in job_input.items():
+        spec = params.get(name)
+        if spec is None or value is None:
+            continue
+        kind = spec.get("type", "str")
+        # Workers int() their inputs, so 8.0 is a valid int; True is not a seed
+        if kind == "int" and isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if not isinstance(value, TYPES[kind]) or (kind != "bool" and isinstance(value, bool)):
+            errors.append(f"{name} must be {kind}, got {type(value).__name__}")
+        elif spec.get("min") is not None and value < spec["min"]:
+            errors.append(f"{name} must be >= {spec['min']}, got {value}")
+        elif spec.get("max") is not None and value > spec["max"]:
+            errors.append(f"{name} must be <= {spec['max']}, got {value}")
+        elif spec.get("choices") is not None and value not in spec["choices"]:
+            errors.append(f"{name} must be one of {spec['choices']}, got {value!r}")
+    return errors
@@ -1,34 +1,24 @@
-import os
-import requests as _http
+import asyncio
+
+from infra import preview_cache
 
 from .prompt import generate_scenario
 from .runner import NodeFailed
 from . import agent as _agent
 
-_TEMPLATES_BASE_URL = os.environ.get("TEMPLATES_SERVICE_URL", "http://localhost:5003")
-
 
 def _verify_preview(url: str | None) -> str | None:
-    """Return url if accessible, else None."""
+    """Return url if readable, else None. The preview is cached for the character reviews."""
     if not url:
         return None
-    if os.path.exists(url):
-        print(f"[ImageGen] Preview image found on disk: {url}")
+    if preview_cache.available(url):
+        print(f"[ImageGen] Preview image ready: {url}")
         return url
-    full_url = (_TEMPLATES_BASE_URL + url) if url.startswith("/") else url
-    try:
-        resp = _http.head(full_url, timeout=5)
-        if resp.status_code == 200:
-            print(f"[ImageGen] Preview image reachable: {full_url}")
-            return url
-        print(f"[ImageGen] Preview image not accessible (HTTP {resp.status_code}): {full_url} — skipping character check")
-        return None
-    except Exception as e:
-        print(f"[ImageGen] Preview image check failed: {e} — skipping character check")
-        return None
+    print(f"[ImageGen] Preview image not accessible: {url} — skipping character check")
+    return None
 
 
-def run(
+async def run_async(
     subject: str,
     mode: str,
     lora_name: str | None = None,
@@ -40,19 +30,20 @@ def run(
     height: int = 1024,
     on_prompt=None,
     on_step=None,
+    fan_out: int = 1,
 ) -> dict:
     # Verify preview image is accessible before starting; fall back to None if not
-    preview_image_url = _verify_preview(preview_image_url)
+    preview_image_url = await asyncio.to_thread(_verify_preview, preview_image_url)
 
     # Pre-generate scenario once (cheap, non-agentic) so the agent has concrete context
     if template_name and not scenario:
-        scenario = generate_scenario(subject, template_name)
+        scenario = await asyncio.to_thread(generate_scenario, subject, template_name)
 
     # Agent is about to start writing a prompt
     if on_step:
         on_step("prompt", "running")
 
-    return _agent.create_and_run(
+    return await _agent.create_and_run(
         subject=subject,
         mode=mode,
         lora_name=lora_name,
@@ -61,4 +52,10 @@ def run(
         preview_image_url=preview_image_url,
         on_prompt=on_prompt,
         on_step=on_step,
+        fan_out=fan_out,
     )
+
+
+def run(**kwargs) -> dict:
+    """Blocking entry point for callers outside an event loop (generate service)."""
+    return asyncio.run(run_async(**kwargs))
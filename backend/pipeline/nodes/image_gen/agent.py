@@ -13,10 +13,14 @@ from google.adk.agents import Agent
 from google.adk.runners import InMemoryRunner
 from google.genai.types import Content, Part
 
+from infra import gemini
+
+from .fanout import speculate
 from .runner import NodeFailed, submit_and_fetch
 from .review import review, review_character
 
 MAX_ATTEMPTS = 3
+MAX_FAN_OUT  = 4
 
 # ── Agent system instruction ───────────────────────────────────────────────────
 
@@ -151,7 +155,7 @@ Never exceed your allowed attempt budget.
 
 # ── Agent factory + runner ────────────────────────────────────────────────────
 
-def create_and_run(
+async def create_and_run(
     subject: str,
     mode: str,
     lora_name: str | None,
@@ -160,15 +164,22 @@ def create_and_run(
     preview_image_url: str | None,
     on_prompt=None,
     on_step=None,  # callback(key: str, status: str, label: str | None = None)
+    fan_out: int = 1,
 ) -> dict:
     """
-    Creates and runs an ADK image-gen agent.
+    Creates and runs an ADK image-gen agent on the caller's event loop.
+    With fan_out > 1 every submit generates that many seed variants in parallel
+    and hands the agent the best one, already reviewed (see fanout.py).
     Returns result dict: {r2_path, prompt, score, reason, attempts_used}
     Raises NodeFailed if the agent exhausts attempts without a passing result.
     """
+    fan_out = max(1, min(fan_out, MAX_FAN_OUT))
+    check_character = mode == "template" and bool(preview_image_url)
     result_store: dict = {}
     _image_cache: dict[str, bytes] = {}
     _params_cache: dict[str, dict] = {}
+    _quality_cache: dict[str, dict] = {}     # reviews already run during fan-out
+    _character_cache: dict[str, dict] = {}
     _last_attempt: dict = {}   # fallback if agent exhausts budget without passing
     attempt_count = [0]
 
@@ -178,6 +189,31 @@ def create_and_run(
         if on_step:
             on_step(key, status, label, reason)
 
+    async def _evaluate(r2_path: str, image_bytes: bytes, params: dict) -> dict:
+        quality = await asyncio.to_thread(review, image_bytes, subject)
+        _quality_cache[r2_path] = quality
+        if quality["passed"] and check_character:
+            character = await asyncio.to_thread(review_character, image_bytes, preview_image_url, params)
+            _character_cache[r2_path] = character
+            if not character["passed"]:
+                return {**quality, "passed": False}
+        return quality
+
+    async def _fan_out(generate, params: dict) -> tuple[str, bytes]:
+        outcome = await speculate(fan_out, generate, lambda r2_path, data: _evaluate(r2_path, data, params))
+        best = outcome["best"]
+        print(
+            f"[ImageGen agent] fan-out attempt={attempt_count[0]} reviewed={len(outcome['outcomes'])} "
+            f"failed={len(outcome['errors'])} cancelled={outcome['cancelled']} "
+            f"passed={bool(best and best['review'].get('passed'))}"
+        )
+        if best is None:
+            raise NodeFailed("; ".join(outcome["errors"]) or "No variant produced an image")
+        for o in outcome["outcomes"]:
+            _image_cache[o["r2_path"]] = o["image_bytes"]
+            _params_cache[o["r2_path"]] = params
+        return best["r2_path"], best["image_bytes"]
+
     def notify_prompt(prompt: str) -> str:
         """
         Call this immediately after deciding on your prompt, before calling submit_image.
@@ -193,7 +229,7 @@ def create_and_run(
         _step("prompt", "done")
         return "Prompt received."
 
-    def submit_image(
+    async def submit_image(
         prompt: str,
         lora_strength: float = 1.0,
         upscale_lora_strength: float = 0.6,
@@ -211,26 +247,34 @@ def create_and_run(
             {"r2_path": str} on success, {"error": str} on failure.
         """
         attempt_count[0] += 1
-        _step("submit", "running", f"Generate image (attempt {attempt_count[0]})")
+        variants = f", {fan_out} variants" if fan_out > 1 else ""
+        _step("submit", "running", f"Generate image (attempt {attempt_count[0]}{variants})")
         _step("quality", "pending")
-        if mode == "template" and preview_image_url:
+        if check_character:
             _step("character", "pending")
 
-        seed = random.randint(1, 999_999)
         params = (
             {"lora_strength": lora_strength, "upscale_lora_strength": upscale_lora_strength}
             if mode == "template" else {}
         )
-        try:
-            r2_path, image_bytes = submit_and_fetch(
+
+        async def _generate(_i: int = 0) -> tuple[str, bytes]:
+            images = await submit_and_fetch(
                 mode=mode,
                 prompt=prompt,
                 width=1024,
                 height=1024,
                 lora_name=lora_name,
-                seed=seed,
+                seed=random.randint(1, 999_999),
                 **params,
             )
+            return images[0]
+
+        try:
+            if fan_out > 1:
+                r2_path, image_bytes = await _fan_out(_generate, params)
+            else:
+                r2_path, image_bytes = await _generate()
         except NodeFailed as e:
             _step("submit", "failed")
             return {"error": str(e)}
@@ -244,7 +288,7 @@ def create_and_run(
         print(f"[ImageGen agent] attempt={attempt_count[0]} submitted r2={r2_path}")
         return {"r2_path": r2_path}
 
-    def review_quality(r2_path: str) -> dict:
+    async def review_quality(r2_path: str) -> dict:
         """
         Review the quality of the generated image against product photography standards.
 
@@ -260,7 +304,7 @@ def create_and_run(
         image_bytes = _image_cache.get(r2_path)
         if not image_bytes:
             return {"error": "Image not in cache — pass the r2_path from submit_image"}
-        result = review(image_bytes, subject)
+        result = _quality_cache.pop(r2_path, None) or await asyncio.to_thread(review, image_bytes, subject)
         if result["passed"]:
             _step("quality", "done")
             if mode == "template" and preview_image_url:
@@ -270,7 +314,7 @@ def create_and_run(
             _step("prompt", "running")
         return result
 
-    def check_character_match(r2_path: str) -> dict:
+    async def check_character_match(r2_path: str) -> dict:
         """
         Check whether the character in the generated image looks like the template reference character.
         Only call this in template mode after review_quality passes.
@@ -288,7 +332,7 @@ def create_and_run(
         if not image_bytes:
             return {"error": "Image not in cache — pass the r2_path from submit_image"}
         params = _params_cache.get(r2_path, {"lora_strength": 1.0, "upscale_lora_strength": 0.6})
-        result = review_character(image_bytes, preview_image_url, params)
+        result = _character_cache.pop(r2_path, None) or await asyncio.to_thread(review_character, image_bytes, preview_image_url, params)
         if result["passed"]:
             _step("character", "done")
         else:
@@ -362,32 +406,23 @@ def create_and_run(
     # ── Create agent ──────────────────────────────────────────────────────────
     agent = Agent(
         name="image_gen_agent",
-        model="gemini-2.0-flash",
+        model=gemini.adk_model("gemini-2.0-flash"),
         instruction=_INSTRUCTION,
         tools=tools,
     )
 
-    # ── Run agent (sync wrapper around async ADK) ─────────────────────────────
-    async def _run():
-        runner = InMemoryRunner(agent=agent, app_name="image_gen")
-        session = await runner.session_service.create_session(
-            app_name="image_gen", user_id="pipeline"
-        )
-        events = runner.run_async(
-            user_id="pipeline",
-            session_id=session.id,
-            new_message=Content(role="user", parts=[Part.from_text(text=task_message)]),
-        )
-        async for _ in events:
-            pass  # tools populate result_store as side effects
-
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        loop.run_until_complete(_run())
-    finally:
-        loop.close()
-        asyncio.set_event_loop(None)
+    # ── Run agent ─────────────────────────────────────────────────────────────
+    runner = InMemoryRunner(agent=agent, app_name="image_gen")
+    session = await runner.session_service.create_session(
+        app_name="image_gen", user_id="pipeline"
+    )
+    events = runner.run_async(
+        user_id="pipeline",
+        session_id=session.id,
+        new_message=Content(role="user", parts=[Part.from_text(text=task_message)]),
+    )
+    async for _ in events:
+        pass  # tools populate result_store as side effects
 
     if "result" not in result_store:
         if _last_attempt.get("r2_path"):
@@ -0,0 +1,77 @@
+"""
+Speculative fan-out for one image generation attempt.
+
+Instead of submit → wait → review → retry, N variants (different seeds) are
+generated concurrently and each is reviewed as soon as its image lands. The
+first passing review ends the attempt: generations still queued or running
+on RunPod are cancelled, reviews already under way are allowed to finish, and
+the best-scoring passing variant wins. If nothing passes, the best-scoring
+failure is returned so the agent can act on its suggestions.
+"""
+import asyncio
+from typing import Awaitable, Callable
+
+
+async def speculate(
+    count: int,
+    generate: Callable[[int], Awaitable[tuple[str, bytes]]],
+    evaluate: Callable[[str, bytes], Awaitable[dict]],
+) -> dict:
+    """
+    generate(i)                  -> (r2_path, image_bytes); cancelling it must cancel the RunPod job
+    evaluate(r2_path, image_bytes) -> review dict with at least "passed" and "score"
+
+    Returns {"best": outcome | None, "outcomes": [...], "errors": [...], "cancelled": int}
+    where each outcome is {"r2_path", "image_bytes", "review"}.
+    """
+    generations = {asyncio.create_task(generate(i)) for i in range(count)}
+    reviews: set[asyncio.Task] = set()
+    outcomes: list[dict] = []
+    errors: list[str] = []
+    cancelled = 0
+
+    async def _review(r2_path: str, image_bytes: bytes) -> dict:
+        try:
+            result = await evaluate(r2_path, image_bytes)
+        except Exception as e:
+            result = {"passed": False, "score": 0.0, "reason": f"Review failed: {e}"}
+        return {"r2_path": r2_path, "image_bytes": image_bytes, "review": result}
+
+    pending = set(generations)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task in generations:
+                    try:
+                        r2_path, image_bytes = task.result()
+                    except Exception as e:
+                        errors.append(str(e))
+                        continue
+                    review_task = asyncio.create_task(_review(r2_path, image_bytes))
+                    reviews.add(review_task)
+                    pending.add(review_task)
+                    continue
+
+                outcome = task.result()
+                outcomes.append(outcome)
+                if outcome["review"].get("passed"):
+                    losers = [g for g in generations if not g.done()]
+                    for g in losers:
+                        g.cancel()
+                    cancelled += len(losers)
+                    if losers:
+                        await asyncio.gather(*losers, return_exceptions=True)
+                    pending = {t for t in pending if t in reviews}
+    finally:
+        # Caller was cancelled — don't leave RunPod jobs behind
+        leftover = [t for t in generations | reviews if not t.done()]
+        for t in leftover:
+            t.cancel()
+        if leftover:
+            await asyncio.gather(*leftover, return_exceptions=True)
+
+    passing = [o for o in outcomes if o["review"].get("passed")]
+    pool = passing or outcomes
+    best = max(pool, key=lambda o: o["review"].get("score") or 0.0) if pool else None
+    return {"best": best, "outcomes": outcomes, "errors": errors, "cancelled": cancelled}
@@ -1,10 +1,6 @@
-import os
-
-from google import genai
 from google.genai import types
 
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
-_gemini = genai.Client(api_key=GEMINI_API_KEY)
+from infra import gemini
 
 
 def generate_scenario(subject: str, template_name: str) -> str:
@@ -13,8 +9,8 @@ def generate_scenario(subject: str, template_name: str) -> str:
     E.g. subject='cap', template_name='young boy' -> 'a young boy casually wearing a cap outdoors'
     Used to seed the ADK agent with concrete context before it writes the full prompt.
     """
-    response = _gemini.models.generate_content(
-        model="gemini-2.0-flash",
+    response = gemini.generate_sync(
+        "gemini-2.0-flash",
         config=types.GenerateContentConfig(temperature=0.8),
         contents=(
             f"You are a creative director for product photography.\n"
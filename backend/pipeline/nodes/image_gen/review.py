@@ -1,15 +1,9 @@
 import json
-import os
 
-import requests as http_requests
-from google import genai
-from google.genai import types
+from infra import gemini, gemini_files, preview_cache, review_cache, review_images
 
-GEMINI_API_KEY      = os.environ.get("GEMINI_API_KEY", "")
+REVIEW_MODEL        = "gemini-2.0-flash"
 REVIEW_THRESHOLD    = 7.0
-TEMPLATES_BASE_URL  = os.environ.get("TEMPLATES_SERVICE_URL", "http://localhost:5003")
-
-_gemini = genai.Client(api_key=GEMINI_API_KEY)
 
 # Human-readable description of exposed workflow params (derived from lora_z_turbo_upscale_api.json)
 _WORKFLOW_PARAM_GUIDE = (
@@ -77,15 +71,10 @@ def review(image_bytes: bytes, subject: str) -> dict:
         f"\"suggested_prompt_adjustments\": \"<concrete prompt guidance>\"}}  "
         f"— omit suggested_prompt_adjustments if score >= 7.0"
     )
-    response = _gemini.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=[
-            types.Part.from_bytes(data=image_bytes, mime_type="image/png"),
-            prompt,
-        ],
+    data = review_cache.cached(
+        "image_gen.review", REVIEW_MODEL, prompt, [image_bytes],
+        lambda: _generate_json([gemini_files.part(*review_images.prepare(image_bytes)), prompt]),
     )
-    raw = response.text.strip().strip("```json").strip("```").strip()
-    data = json.loads(raw)
     score = float(data["score"])
     passed = score >= REVIEW_THRESHOLD
     result = {"score": score, "reason": data.get("reason", ""), "passed": passed}
@@ -99,22 +88,8 @@ def review_character(image_bytes: bytes, preview_url: str, current_params: dict)
     Compare the generated image against the template preview character.
     Returns: {passed, reason, suggested_params (only if not passed)}
     """
-    # Support three formats: filesystem path, relative URL, or absolute URL
-    import mimetypes
-    if os.path.exists(preview_url):
-        # Absolute filesystem path (local dev)
-        with open(preview_url, "rb") as f:
-            preview_bytes = f.read()
-        content_type = mimetypes.guess_type(preview_url)[0] or "image/jpeg"
-    else:
-        # Relative URLs (e.g. /api/template-images/...) need the templates service base
-        full_url = (TEMPLATES_BASE_URL + preview_url) if preview_url.startswith("/") else preview_url
-        resp = http_requests.get(full_url, timeout=15)
-        resp.raise_for_status()
-        preview_bytes = resp.content
-        content_type = resp.headers.get("content-type", "image/jpeg").split(";")[0].strip()
-    if content_type not in ("image/jpeg", "image/png", "image/webp"):
-        content_type = "image/jpeg"
+    # Filesystem path, relative templates-service URL or absolute URL; cached and revalidated
+    preview_bytes, content_type = preview_cache.fetch(preview_url)
 
     lora_s = current_params.get("lora_strength", 1.0)
     upscale_s = current_params.get("upscale_lora_strength", 0.6)
@@ -136,18 +111,23 @@ def review_character(image_bytes: bytes, preview_url: str, current_params: dict)
         "Include suggested_params only when passed is false."
     )
 
-    response = _gemini.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=[
-            types.Part.from_bytes(data=preview_bytes, mime_type=content_type),
-            types.Part.from_bytes(data=image_bytes, mime_type="image/png"),
+    data = review_cache.cached(
+        "image_gen.review_character", REVIEW_MODEL, prompt, [preview_bytes, image_bytes],
+        lambda: _generate_json([
+            *(gemini_files.part(data, mime_type) for data, mime_type in review_images.prepare_many(
+                [(preview_bytes, content_type), (image_bytes, "image/png")]
+            )),
             prompt,
-        ],
+        ]),
     )
-    raw = response.text.strip().strip("```json").strip("```").strip()
-    data = json.loads(raw)
     return {
         "passed": bool(data["passed"]),
         "reason": data.get("reason", ""),
         "suggested_params": data.get("suggested_params"),
     }
+
+
+def _generate_json(contents: list) -> dict:
+    response = gemini.generate_sync(REVIEW_MODEL, contents)
+    raw = response.text.strip().strip("```json").strip("```").strip()
+    return json.loads(raw)
@@ -1,65 +1,34 @@
+import asyncio
 import os
-import time
 
-import boto3
-import requests
-from botocore.config import Config
+from infra import image_cache, runpod_poller, workflow_params
 
-RUNPOD_API_KEY      = os.environ.get("RUNPOD_API_KEY", "")
 LORA_ENDPOINT_ID    = "4zt599q013q0cz"
 Z_TURBO_ENDPOINT_ID = "1dv4vwaqf3quge"
 TERMINAL_FAILED     = {"FAILED", "CANCELLED", "TIMED_OUT", "CANCELLED_BY_SYSTEM"}
-POLL_INTERVAL       = 5
+MAX_BATCH_IMAGES    = 16   # the workers' MAX_IMAGES
 
-R2_ENDPOINT_URL      = os.environ.get("R2_ENDPOINT_URL")
-R2_ACCESS_KEY_ID     = os.environ.get("R2_ACCESS_KEY_ID")
-R2_SECRET_ACCESS_KEY = os.environ.get("R2_SECRET_ACCESS_KEY")
-R2_BUCKET            = os.environ.get("R2_OUTPUT_BUCKET", "")
+_HERE = os.path.dirname(os.path.abspath(__file__))
+# Copies of the workers' workflow_params.json — keep in sync with microservices/
+LORA_PARAMS    = workflow_params.load(os.path.join(_HERE, "lora_z_turbo_upscale_params.json"))
+Z_TURBO_PARAMS = workflow_params.load(os.path.join(_HERE, "z_turbo_params.json"))
 
 
 class NodeFailed(Exception):
     pass
 
 
-def _rp_headers():
-    return {"Authorization": f"Bearer {RUNPOD_API_KEY}", "Content-Type": "application/json"}
-
-
-def _r2_client():
-    return boto3.client(
-        "s3",
-        endpoint_url=R2_ENDPOINT_URL,
-        aws_access_key_id=R2_ACCESS_KEY_ID,
-        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        config=Config(signature_version="s3v4"),
-        region_name="auto",
-    )
-
-
 def _download_r2(r2_path: str) -> bytes:
-    parts = r2_path[5:].split("/", 1)
-    bucket, key = parts[0], parts[1]
-    resp = _r2_client().get_object(Bucket=bucket, Key=key)
-    return resp["Body"].read()
+    return image_cache.fetch(r2_path)
 
 
-def _poll_runpod(endpoint_id: str, job_id: str) -> dict:
-    while True:
-        r = requests.get(
-            f"https://api.runpod.ai/v2/{endpoint_id}/status/{job_id}",
-            headers=_rp_headers(),
-        )
-        r.raise_for_status()
-        data = r.json()
-        status = data.get("status")
-        if status == "COMPLETED":
-            return data
-        if status in TERMINAL_FAILED:
-            raise NodeFailed(f"RunPod {status}: {data.get('error') or status}")
-        time.sleep(POLL_INTERVAL)
+def _cancel_job(endpoint: str, job_id: str):
+    """Fire-and-forget RunPod cancel for a job whose caller was cancelled."""
+    print(f"[ImageGen runner] cancelling job={job_id}")
+    asyncio.get_running_loop().run_in_executor(None, runpod_poller.cancel, endpoint, job_id)
 
 
-def submit_and_fetch(
+async def submit_and_fetch(
     mode: str,
     prompt: str,
     width: int,
@@ -68,7 +37,15 @@ def submit_and_fetch(
     lora_strength: float = 1.0,
     upscale_lora_strength: float = 0.6,
     seed: int | None = None,
-) -> tuple[str, bytes]:
+    batch_size: int = 1,
+    variants: list[dict] | None = None,
+) -> list[tuple[str, bytes]]:
+    """
+    One RunPod job for several images: batch_size images per variant, from one
+    latent batch. `variants` overrides prompt / seed / LoRA strengths per
+    ComfyUI run within the job. Returns (r2_path, bytes) per image, in the
+    worker's order; a plain call (no batch_size / variants) returns one.
+    """
     if mode == "template":
         body = {
             "prompt": prompt,
@@ -79,24 +56,45 @@ def submit_and_fetch(
             "upscale_lora_strength": upscale_lora_strength,
             "seed": seed,
         }
-        endpoint = LORA_ENDPOINT_ID
+        endpoint, params = LORA_ENDPOINT_ID, LORA_PARAMS
     else:
         body = {"prompt": prompt, "width": width, "height": height, "seed": seed}
-        endpoint = Z_TURBO_ENDPOINT_ID
-
-    r = requests.post(
-        f"https://api.runpod.ai/v2/{endpoint}/run",
-        headers=_rp_headers(),
-        json={"input": body},
-    )
-    r.raise_for_status()
-    runpod_job_id = r.json()["id"]
-    print(f"[ImageGen runner] job={runpod_job_id} mode={mode}")
-
-    data = _poll_runpod(endpoint, runpod_job_id)
+        endpoint, params = Z_TURBO_ENDPOINT_ID, Z_TURBO_PARAMS
+    if batch_size != 1:
+        body["batch_size"] = batch_size
+    if variants:
+        body["variants"] = variants
+
+    errors = workflow_params.check(params, body)
+    for variant in variants or []:
+        errors += workflow_params.check(params, variant)
+    if len(variants or [None]) * batch_size > MAX_BATCH_IMAGES:
+        errors.append(f"at most {MAX_BATCH_IMAGES} images per job")
+    if errors:
+        raise NodeFailed("Invalid job input: " + "; ".join(errors))
+
+    # Shielded so a cancel that lands mid-POST still learns the job id and cancels it
+    submitting = asyncio.ensure_future(asyncio.to_thread(runpod_poller.submit, endpoint, body))
+    try:
+        runpod_job_id = await asyncio.shield(submitting)
+    except asyncio.CancelledError:
+        submitting.add_done_callback(
+            lambda f: None if f.cancelled() or f.exception() else _cancel_job(endpoint, f.result())
+        )
+        raise
+    print(f"[ImageGen runner] job={runpod_job_id} mode={mode} batch_size={batch_size} variants={len(variants or [None])}")
+
+    try:
+        data = await runpod_poller.wait(endpoint, runpod_job_id)
+    except asyncio.CancelledError:
+        _cancel_job(endpoint, runpod_job_id)
+        raise
+    if data.get("status") in TERMINAL_FAILED:
+        raise NodeFailed(f"RunPod {data['status']}: {data.get('error') or data['status']}")
     images = data.get("output", {}).get("images", [])
     if not images:
         raise NodeFailed("No images returned from RunPod")
 
-    r2_path = images[0]["r2_path"]
-    return r2_path, _download_r2(r2_path)
+    r2_paths = [image["r2_path"] for image in images]
+    blobs = await asyncio.gather(*(asyncio.to_thread(_download_r2, r2_path) for r2_path in r2_paths))
+    return list(zip(r2_paths, blobs))
@@ -1,22 +1,32 @@
+import asyncio
+
 from .runner import NodeFailed, download_r2
 from . import agent as _agent
 
 
-def run(
+async def _bytes_or_download(data: bytes | None, r2_path: str) -> bytes:
+    return data if data is not None else await asyncio.to_thread(download_r2, r2_path)
+
+
+async def run_async(
     masked_r2: str,
     product_r2: str,
     subject: str,
     on_prompt=None,
     on_step=None,
+    masked_image_bytes: bytes | None = None,
+    product_image_bytes: bytes | None = None,
 ) -> dict:
-    # Download both images upfront so the agent can see them
-    masked_image_bytes = download_r2(masked_r2)
-    product_image_bytes = download_r2(product_r2)
+    # Download both images upfront so the agent can see them (unless prefetched by the caller)
+    masked_image_bytes, product_image_bytes = await asyncio.gather(
+        _bytes_or_download(masked_image_bytes, masked_r2),
+        _bytes_or_download(product_image_bytes, product_r2),
+    )
 
     if on_step:
         on_step("prompt", "running")
 
-    return _agent.create_and_run(
+    return await _agent.create_and_run(
         subject=subject,
         masked_r2=masked_r2,
         product_r2=product_r2,
@@ -25,3 +35,8 @@ def run(
         on_prompt=on_prompt,
         on_step=on_step,
     )
+
+
+def run(**kwargs) -> dict:
+    """Blocking entry point for callers outside an event loop (generate service)."""
+    return asyncio.run(run_async(**kwargs))
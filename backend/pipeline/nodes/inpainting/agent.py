@@ -13,6 +13,8 @@ from google.adk.agents import Agent
 from google.adk.runners import InMemoryRunner
 from google.genai.types import Content, Part
 
+from infra import gemini, gemini_files, review_images
+
 from .runner import NodeFailed, submit_and_fetch
 
 MAX_ATTEMPTS = 3
@@ -96,9 +98,14 @@ Never exceed your attempt budget.
 """
 
 
+def _image_part(data: bytes):
+    """Files API reference to the image's review copy — the same upload the reviews send."""
+    return gemini_files.part(*review_images.prepare(data))
+
+
 # ── Agent factory + runner ────────────────────────────────────────────────────
 
-def create_and_run(
+async def create_and_run(
     subject: str,
     masked_r2: str,
     product_r2: str,
@@ -108,7 +115,7 @@ def create_and_run(
     on_step=None,
 ) -> dict:
     """
-    Creates and runs the inpainting ADK agent.
+    Creates and runs the inpainting ADK agent on the caller's event loop.
     Returns: {r2_path, prompt, score, reason, attempts_used}
     Raises NodeFailed if agent exhausts attempts without a passing result.
     """
@@ -136,7 +143,7 @@ def create_and_run(
         _step("prompt", "done")
         return "Prompt received."
 
-    def submit_inpaint(
+    async def submit_inpaint(
         prompt: str,
         steps: int = 4,
         denoise: float = 1.0,
@@ -163,7 +170,7 @@ def create_and_run(
 
         seed = random.randint(1, 999_999)
         try:
-            r2_path, image_bytes = submit_and_fetch(
+            r2_path, image_bytes = await submit_and_fetch(
                 masked_r2=masked_r2,
                 product_r2=product_r2,
                 prompt=prompt,
@@ -186,7 +193,7 @@ def create_and_run(
         print(f"[Inpainting agent] attempt={attempt_count[0]} r2={r2_path}")
         return {"r2_path": r2_path}
 
-    def review_inpaint(r2_path: str) -> dict:
+    async def review_inpaint(r2_path: str) -> dict:
         """
         Review the quality of the inpainted result.
 
@@ -202,7 +209,7 @@ def create_and_run(
         image_bytes = _result_cache.get(r2_path)
         if not image_bytes:
             return {"error": "Result not in cache — pass the r2_path from submit_inpaint"}
-        result = _review(image_bytes, subject)
+        result = await asyncio.to_thread(_review, image_bytes, subject)
         if result["passed"]:
             _step("review", "done")
         else:
@@ -232,9 +239,15 @@ def create_and_run(
         return "Inpainting task completed."
 
     # ── Build task message with both images ───────────────────────────────────
+    # The agent re-sends this message on every model call, so the images go as
+    # Files API references (uploaded once, shared with the reviews) rather than inline bytes
+    scene_part, product_part = await asyncio.gather(
+        asyncio.to_thread(_image_part, masked_image_bytes),
+        asyncio.to_thread(_image_part, product_image_bytes),
+    )
     task_parts = [
-        Part.from_bytes(data=masked_image_bytes, mime_type="image/png"),
-        Part.from_bytes(data=product_image_bytes, mime_type="image/png"),
+        scene_part,
+        product_part,
         Part.from_text(text=(
             f"Inpaint the product into the masked scene.\n\n"
             f"Image 1 (above): the masked scene — the white/highlighted region is where the "
@@ -256,32 +269,23 @@ def create_and_run(
     # ── Create agent ──────────────────────────────────────────────────────────
     agent = Agent(
         name="inpainting_agent",
-        model="gemini-2.0-flash",
+        model=gemini.adk_model("gemini-2.0-flash"),
         instruction=_INSTRUCTION,
         tools=[notify_prompt, submit_inpaint, review_inpaint, complete_task],
     )
 
-    # ── Run agent (sync wrapper around async ADK) ─────────────────────────────
-    async def _run():
-        runner = InMemoryRunner(agent=agent, app_name="inpainting")
-        session = await runner.session_service.create_session(
-            app_name="inpainting", user_id="pipeline"
-        )
-        events = runner.run_async(
-            user_id="pipeline",
-            session_id=session.id,
-            new_message=Content(role="user", parts=task_parts),
-        )
-        async for _ in events:
-            pass
-
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        loop.run_until_complete(_run())
-    finally:
-        loop.close()
-        asyncio.set_event_loop(None)
+    # ── Run agent ─────────────────────────────────────────────────────────────
+    runner = InMemoryRunner(agent=agent, app_name="inpainting")
+    session = await runner.session_service.create_session(
+        app_name="inpainting", user_id="pipeline"
+    )
+    events = runner.run_async(
+        user_id="pipeline",
+        session_id=session.id,
+        new_message=Content(role="user", parts=task_parts),
+    )
+    async for _ in events:
+        pass
 
     if "result" not in result_store:
         if _last_attempt.get("r2_path"):
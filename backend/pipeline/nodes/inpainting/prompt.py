@@ -1,15 +1,11 @@
-import os
-
-from google import genai
 from google.genai import types
 
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
-_gemini = genai.Client(api_key=GEMINI_API_KEY)
+from infra import gemini
 
 
 def generate(subject: str) -> str:
-    response = _gemini.models.generate_content(
-        model="gemini-2.0-flash",
+    response = gemini.generate_sync(
+        "gemini-2.0-flash",
         config=types.GenerateContentConfig(temperature=0.7),
         contents=(
             f"Write a short, specific inpainting prompt for placing a '{subject}' into a scene. "
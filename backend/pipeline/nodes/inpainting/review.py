@@ -1,13 +1,9 @@
 import json
-import os
 
-from google import genai
-from google.genai import types
+from infra import gemini, gemini_files, review_cache, review_images
 
-GEMINI_API_KEY   = os.environ.get("GEMINI_API_KEY", "")
 REVIEW_THRESHOLD = 7.0
-
-_gemini = genai.Client(api_key=GEMINI_API_KEY)
+REVIEW_MODEL     = "gemini-2.0-flash"
 
 
 def review(image_bytes: bytes, subject: str) -> dict:
@@ -54,18 +50,19 @@ def review(image_bytes: bytes, subject: str) -> dict:
         f"{{\"score\": <float>, \"reason\": \"<one specific sentence>\", "
         f"\"suggested_fixes\": {{...}}}}  — omit suggested_fixes if score >= 7.0"
     )
-    response = _gemini.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=[
-            types.Part.from_bytes(data=image_bytes, mime_type="image/png"),
-            prompt,
-        ],
+    data = review_cache.cached(
+        "inpainting.review", REVIEW_MODEL, prompt, [image_bytes],
+        lambda: _generate_json([gemini_files.part(*review_images.prepare(image_bytes)), prompt]),
     )
-    raw = response.text.strip().strip("```json").strip("```").strip()
-    data = json.loads(raw)
     score = float(data["score"])
     passed = score >= REVIEW_THRESHOLD
     result = {"score": score, "reason": data.get("reason", ""), "passed": passed}
     if not passed and data.get("suggested_fixes"):
         result["suggested_fixes"] = data["suggested_fixes"]
     return result
+
+
+def _generate_json(contents: list) -> dict:
+    response = gemini.generate_sync(REVIEW_MODEL, contents)
+    raw = response.text.strip().strip("```json").strip("```").strip()
+    return json.loads(raw)
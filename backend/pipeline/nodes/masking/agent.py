@@ -13,6 +13,8 @@ from google.adk.agents import Agent
 from google.adk.runners import InMemoryRunner
 from google.genai.types import Content, Part
 
+from infra import gemini, gemini_files, review_images
+
 from .runner import NodeFailed, submit_and_fetch
 from .review import review
 
@@ -73,9 +75,14 @@ Pass threshold: score ≥ 5.0 out of 10. Only retry if the mask fundamentally fa
 """
 
 
+def _image_part(data: bytes):
+    """Files API reference to the image's review copy — the same upload the reviews send."""
+    return gemini_files.part(*review_images.prepare(data))
+
+
 # ── Agent factory + runner ────────────────────────────────────────────────────
 
-def create_and_run(
+async def create_and_run(
     subject: str,
     generated_r2: str,
     generated_image_bytes: bytes,
@@ -83,7 +90,7 @@ def create_and_run(
     on_step=None,
 ) -> dict:
     """
-    Creates and runs the masking ADK agent.
+    Creates and runs the masking ADK agent on the caller's event loop.
     Returns: {r2_path, score, reason, attempts_used}
     Raises NodeFailed if agent exhausts attempts without a passing mask.
     """
@@ -96,7 +103,7 @@ def create_and_run(
         if on_step:
             on_step(key, status, label, reason)
 
-    def submit_mask(mask_blur: int, mask_dilation: int) -> dict:
+    async def submit_mask(mask_blur: int, mask_dilation: int) -> dict:
         """
         Submit the generated image to the masking worker with your chosen parameters.
 
@@ -112,7 +119,7 @@ def create_and_run(
 
         seed = random.randint(1, 999_999)
         try:
-            r2_path, mask_bytes = submit_and_fetch(
+            r2_path, mask_bytes = await submit_and_fetch(
                 generated_r2=generated_r2,
                 subject=subject,
                 mask_blur=mask_blur,
@@ -130,7 +137,7 @@ def create_and_run(
         print(f"[Masking agent] attempt={attempt_count[0]} r2={r2_path}")
         return {"r2_path": r2_path}
 
-    def review_mask(r2_path: str) -> dict:
+    async def review_mask(r2_path: str) -> dict:
         """
         Review the quality of the generated mask against the product to be inpainted.
 
@@ -143,7 +150,7 @@ def create_and_run(
         mask_bytes = _mask_cache.get(r2_path)
         if not mask_bytes:
             return {"error": "Mask not in cache — pass the r2_path from submit_mask"}
-        result = review(mask_bytes, subject, product_bytes=product_image_bytes)
+        result = await asyncio.to_thread(review, mask_bytes, subject, product_image_bytes)
         if result["passed"]:
             _step("review", "done")
         else:
@@ -171,9 +178,15 @@ def create_and_run(
         return "Masking task completed."
 
     # ── Build task message with both images ───────────────────────────────────
+    # The agent re-sends this message on every model call, so the images go as
+    # Files API references (uploaded once, shared with the reviews) rather than inline bytes
+    scene_part, product_part = await asyncio.gather(
+        asyncio.to_thread(_image_part, generated_image_bytes),
+        asyncio.to_thread(_image_part, product_image_bytes),
+    )
     task_parts = [
-        Part.from_bytes(data=generated_image_bytes, mime_type="image/png"),
-        Part.from_bytes(data=product_image_bytes, mime_type="image/png"),
+        scene_part,
+        product_part,
         Part.from_text(text=(
             f"Create a mask for the subject in the generated scene above.\n\n"
             f"Image 1 (above): the generated scene — mask the '{subject}' in this image.\n"
@@ -193,32 +206,23 @@ def create_and_run(
     # ── Create agent ──────────────────────────────────────────────────────────
     agent = Agent(
         name="masking_agent",
-        model="gemini-2.0-flash",
+        model=gemini.adk_model("gemini-2.0-flash"),
         instruction=_INSTRUCTION,
         tools=[submit_mask, review_mask, complete_task],
     )
 
-    # ── Run agent (sync wrapper around async ADK) ─────────────────────────────
-    async def _run():
-        runner = InMemoryRunner(agent=agent, app_name="masking")
-        session = await runner.session_service.create_session(
-            app_name="masking", user_id="pipeline"
-        )
-        events = runner.run_async(
-            user_id="pipeline",
-            session_id=session.id,
-            new_message=Content(role="user", parts=task_parts),
-        )
-        async for _ in events:
-            pass
-
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        loop.run_until_complete(_run())
-    finally:
-        loop.close()
-        asyncio.set_event_loop(None)
+    # ── Run agent ─────────────────────────────────────────────────────────────
+    runner = InMemoryRunner(agent=agent, app_name="masking")
+    session = await runner.session_service.create_session(
+        app_name="masking", user_id="pipeline"
+    )
+    events = runner.run_async(
+        user_id="pipeline",
+        session_id=session.id,
+        new_message=Content(role="user", parts=task_parts),
+    )
+    async for _ in events:
+        pass
 
     if "result" not in result_store:
         if _last_attempt.get("r2_path"):
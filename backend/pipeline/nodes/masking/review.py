@@ -1,13 +1,9 @@
 import json
-import os
 
-from google import genai
-from google.genai import types
+from infra import gemini, gemini_files, review_cache, review_images
 
-GEMINI_API_KEY   = os.environ.get("GEMINI_API_KEY", "")
 REVIEW_THRESHOLD = 5.0
-
-_gemini = genai.Client(api_key=GEMINI_API_KEY)
+REVIEW_MODEL     = "gemini-2.0-flash"
 
 
 def review(mask_bytes: bytes, subject: str, product_bytes: bytes | None = None) -> dict:
@@ -16,10 +12,6 @@ def review(mask_bytes: bytes, subject: str, product_bytes: bytes | None = None)
     Only fails on genuinely broken masks — wrong object masked, subject not covered,
     or mask completely fragmented into noise.
     """
-    contents_parts = [types.Part.from_bytes(data=mask_bytes, mime_type="image/png")]
-    if product_bytes:
-        contents_parts.append(types.Part.from_bytes(data=product_bytes, mime_type="image/png"))
-
     prompt = (
         f"You are reviewing an AI-generated segmentation mask for product inpainting. Subject: '{subject}'.\n\n"
         f"The mask image shows white areas where the subject will be replaced. "
@@ -38,13 +30,21 @@ def review(mask_bytes: bytes, subject: str, product_bytes: bytes | None = None)
         f"Only give a score below 5 if the mask fundamentally fails to cover the '{subject}'.\n\n"
         f"Reply ONLY with valid JSON: {{\"score\": <float>, \"reason\": \"<one sentence>\"}}"
     )
-    contents_parts.append(prompt)
-
-    response = _gemini.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=contents_parts,
+    images = [mask_bytes, product_bytes] if product_bytes else [mask_bytes]
+    data = review_cache.cached(
+        "masking.review", REVIEW_MODEL, prompt, images,
+        lambda: _generate_json([
+            *(gemini_files.part(data, mime_type) for data, mime_type in review_images.prepare_many(
+                [(image, "image/png") for image in images]
+            )),
+            prompt,
+        ]),
     )
-    raw = response.text.strip().strip("```json").strip("```").strip()
-    data = json.loads(raw)
     score = float(data["score"])
     return {"score": score, "reason": data.get("reason", ""), "passed": score >= REVIEW_THRESHOLD}
+
+
+def _generate_json(contents: list) -> dict:
+    response = gemini.generate_sync(REVIEW_MODEL, contents)
+    raw = response.text.strip().strip("```json").strip("```").strip()
+    return json.loads(raw)
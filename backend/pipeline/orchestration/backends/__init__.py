@@ -0,0 +1,28 @@
+"""
+Pipeline state backends.
+
+Every backend stores full pipeline records (the dicts built by
+orchestration.state.create_pipeline) plus a `version` counter that increases
+on every write, and exposes the same methods:
+
+    create(record)                                   insert a new pipeline
+    update(pipeline_id, fields)                      merge top-level fields
+    update_step(pipeline_id, steps_field, key, status, label, reason)
+    get(pipeline_id) -> dict | None
+    list(limit) -> list[dict]                        newest first
+    running_counts() -> list[(current_node, mode, count)]
+    in_flight() -> list[str]                         ids still "queued"/"running", oldest first
+"""
+import os
+
+STEPS_FIELDS = ("agent_steps", "masking_agent_steps", "inpainting_agent_steps")
+
+
+def create_backend(name: str):
+    if name == "memory":
+        from orchestration.backends.memory import MemoryBackend
+        return MemoryBackend()
+    if name == "sqlite":
+        from orchestration.backends.sqlite import SQLiteBackend
+        return SQLiteBackend(os.environ.get("PIPELINE_DB_PATH", "data/pipelines.db"))
+    raise ValueError(f"Unknown PIPELINE_STATE_BACKEND '{name}' (expected 'sqlite' or 'memory')")
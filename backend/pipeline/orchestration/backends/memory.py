@@ -0,0 +1,98 @@
+"""
+In-process dict backend. Nothing survives a restart; useful for local dev.
+
+Each pipeline is held as an immutable snapshot dict. Writers build the next
+version under that pipeline's lock stripe and swap the reference in; readers
+just grab the current reference, so status/list reads never wait on writers
+and writers to different pipelines rarely wait on each other. Snapshots are
+never mutated after publication — nested step lists are replaced, not edited.
+"""
+import copy
+import threading
+from collections import Counter
+
+from orchestration.backends import STEPS_FIELDS
+
+LOCK_STRIPES = 64
+
+
+class MemoryBackend:
+    def __init__(self, stripes: int = LOCK_STRIPES):
+        self._snapshots: dict[str, dict] = {}
+        self._step_index: dict[str, dict[str, dict[str, int]]] = {}  # pipeline → steps field → key → position
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._order: list[str] = []   # creation order, append-only
+        self._meta_lock = threading.Lock()
+        self._running = Counter()     # (current_node, mode) → running pipelines
+
+    def _lock_for(self, pipeline_id: str) -> threading.Lock:
+        return self._locks[hash(pipeline_id) % len(self._locks)]
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def create(self, record: dict):
+        pipeline_id = record["pipeline_id"]
+        snapshot = {**copy.deepcopy(record), "version": 1}
+        index = {
+            field: {step["key"]: i for i, step in enumerate(snapshot.get(field) or [])}
+            for field in STEPS_FIELDS
+        }
+        with self._lock_for(pipeline_id):
+            self._step_index[pipeline_id] = index
+            self._snapshots[pipeline_id] = snapshot
+        with self._meta_lock:
+            self._order.append(pipeline_id)
+            self._count(snapshot, +1)
+
+    def update(self, pipeline_id: str, fields: dict):
+        with self._lock_for(pipeline_id):
+            old = self._snapshots.get(pipeline_id)
+            if old is None:
+                return
+            new = {**old, **fields, "version": old["version"] + 1}
+            self._snapshots[pipeline_id] = new
+        if any(old.get(k) != new.get(k) for k in ("status", "current_node", "mode")):
+            with self._meta_lock:
+                self._count(old, -1)
+                self._count(new, +1)
+
+    def update_step(self, pipeline_id: str, steps_field: str, key: str, status: str, label: str | None, reason: str | None):
+        with self._lock_for(pipeline_id):
+            old = self._snapshots.get(pipeline_id)
+            if old is None:
+                return
+            position = self._step_index[pipeline_id].get(steps_field, {}).get(key)
+            if position is None:
+                return
+            steps = list(old[steps_field])
+            step = dict(steps[position], status=status)
+            if label is not None:
+                step["label"] = label
+            if reason is not None:
+                step["reason"] = reason
+            elif status != "failed":
+                step.pop("reason", None)  # clear stale reason on non-failure
+            steps[position] = step
+            self._snapshots[pipeline_id] = {**old, steps_field: steps, "version": old["version"] + 1}
+
+    def _count(self, snapshot: dict, delta: int):
+        # Caller holds self._meta_lock
+        if snapshot["status"] == "running":
+            self._running[(snapshot.get("current_node"), snapshot.get("mode"))] += delta
+
+    # ── Reads (lock-free) ─────────────────────────────────────────────────────
+
+    def get(self, pipeline_id: str) -> dict | None:
+        snapshot = self._snapshots.get(pipeline_id)
+        return dict(snapshot) if snapshot else None
+
+    def list(self, limit: int) -> list:
+        newest = self._order[-limit:] if limit > 0 else []
+        return [dict(self._snapshots[pid]) for pid in reversed(newest)]
+
+    def running_counts(self) -> list:
+        with self._meta_lock:
+            return [(node, mode, n) for (node, mode), n in self._running.items() if n]
+
+    def in_flight(self) -> list:
+        return [pid for pid in list(self._order) if self._snapshots[pid]["status"] in ("running", "queued")]
@@ -0,0 +1,202 @@
+"""
+SQLite pipeline store (WAL mode).
+
+Layout:
+- pipelines:   one row per pipeline. Columns that are filtered or sorted on
+               (status, mode, current_node, created_at) are real columns; every
+               other field lives in a JSON `data` blob.
+- agent_steps: one row per (pipeline, steps list, step key), so a step update
+               touches a single row instead of rewriting the pipeline.
+
+Indexes back the hot reads: `created_at DESC` for the history list and a partial
+index over running (and one over queued) pipelines for queue counts and
+resume, so neither scans finished history.
+
+WAL lets the status/list routes read while the engine writes. Connections are
+per thread; SQLite serialises writers, busy_timeout absorbs short contention.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+from orchestration.backends import STEPS_FIELDS
+
+_COLUMNS = ("pipeline_id", "status", "mode", "current_node", "created_at", "version")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pipelines (
+    pipeline_id  TEXT PRIMARY KEY,
+    status       TEXT NOT NULL,
+    mode         TEXT,
+    current_node TEXT,
+    created_at   REAL NOT NULL,
+    version      INTEGER NOT NULL DEFAULT 1,
+    data         TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pipelines_created ON pipelines (created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_pipelines_running ON pipelines (current_node, mode, created_at)
+    WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_pipelines_queued ON pipelines (created_at)
+    WHERE status = 'queued';
+
+CREATE TABLE IF NOT EXISTS agent_steps (
+    pipeline_id TEXT NOT NULL,
+    steps_field TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    position    INTEGER NOT NULL,
+    label       TEXT,
+    status      TEXT NOT NULL,
+    reason      TEXT,
+    PRIMARY KEY (pipeline_id, steps_field, key)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteBackend:
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(pipelines)")}
+        if "version" not in columns:
+            conn.execute("ALTER TABLE pipelines ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def create(self, record: dict):
+        data = {k: v for k, v in record.items() if k not in _COLUMNS and k not in STEPS_FIELDS}
+        steps = [
+            (record["pipeline_id"], field, step["key"], i, step.get("label"), step["status"], step.get("reason"))
+            for field in STEPS_FIELDS
+            for i, step in enumerate(record.get(field) or [])
+        ]
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO pipelines (pipeline_id, status, mode, current_node, created_at, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (record["pipeline_id"], record["status"], record.get("mode"), record.get("current_node"),
+                 record["created_at"], json.dumps(data)),
+            )
+            conn.executemany(
+                "INSERT INTO agent_steps (pipeline_id, steps_field, key, position, label, status, reason) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                steps,
+            )
+
+    def update(self, pipeline_id: str, fields: dict):
+        assignments, params = [], []
+        patch = []
+        for k, v in fields.items():
+            if k in ("pipeline_id", "version") or k in STEPS_FIELDS:
+                continue
+            if k in _COLUMNS:
+                assignments.append(f"{k} = ?")
+                params.append(v)
+            else:
+                patch.append((k, v))
+        if patch:
+            # json_set on a single statement keeps the update atomic without a read
+            paths = ", ".join("?, json(?)" for _ in patch)
+            assignments.append(f"data = json_set(data, {paths})")
+            for k, v in patch:
+                params.extend((f'$."{k}"', json.dumps(v)))
+        if not assignments:
+            return
+        assignments.append("version = version + 1")
+        self._conn().execute(
+            f"UPDATE pipelines SET {', '.join(assignments)} WHERE pipeline_id = ?",
+            (*params, pipeline_id),
+        )
+
+    def update_step(self, pipeline_id: str, steps_field: str, key: str, status: str, label: str | None, reason: str | None):
+        # A reason is cleared on non-failure updates and kept on failure updates that don't carry one
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute(
+                """
+                UPDATE agent_steps
+                   SET status = ?,
+                       label  = COALESCE(?, label),
+                       reason = CASE WHEN ? IS NOT NULL THEN ? WHEN ? = 'failed' THEN reason ELSE NULL END
+                 WHERE pipeline_id = ? AND steps_field = ? AND key = ?
+                """,
+                (status, label, reason, reason, status, pipeline_id, steps_field, key),
+            )
+            if cur.rowcount:
+                conn.execute("UPDATE pipelines SET version = version + 1 WHERE pipeline_id = ?", (pipeline_id,))
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def get(self, pipeline_id: str) -> dict | None:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT pipeline_id, status, mode, current_node, created_at, version, data FROM pipelines WHERE pipeline_id = ?",
+            (pipeline_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return self._hydrate([row])[0]
+
+    def list(self, limit: int) -> list:
+        rows = self._conn().execute(
+            "SELECT pipeline_id, status, mode, current_node, created_at, version, data FROM pipelines ORDER BY created_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return self._hydrate(rows)
+
+    def running_counts(self) -> list:
+        return self._conn().execute(
+            "SELECT current_node, mode, COUNT(*) FROM pipelines WHERE status = 'running' GROUP BY current_node, mode"
+        ).fetchall()
+
+    def in_flight(self) -> list:
+        # One query per status so each is answered from its partial index
+        conn = self._conn()
+        rows = [
+            *conn.execute("SELECT created_at, pipeline_id FROM pipelines WHERE status = 'running'"),
+            *conn.execute("SELECT created_at, pipeline_id FROM pipelines WHERE status = 'queued'"),
+        ]
+        return [pipeline_id for _, pipeline_id in sorted(rows)]
+
+    def _hydrate(self, rows: list) -> list:
+        if not rows:
+            return []
+        records = {}
+        for pipeline_id, status, mode, current_node, created_at, version, data in rows:
+            p = json.loads(data)
+            p.update(pipeline_id=pipeline_id, status=status, mode=mode, current_node=current_node,
+                     created_at=created_at, version=version)
+            for field in STEPS_FIELDS:
+                p[field] = []
+            records[pipeline_id] = p
+
+        placeholders = ", ".join("?" for _ in records)
+        steps = self._conn().execute(
+            f"""
+            SELECT pipeline_id, steps_field, key, label, status, reason FROM agent_steps
+             WHERE pipeline_id IN ({placeholders})
+             ORDER BY pipeline_id, steps_field, position
+            """,
+            tuple(records),
+        ).fetchall()
+        for pipeline_id, field, key, label, status, reason in steps:
+            step = {"key": key, "label": label, "status": status}
+            if reason is not None:
+                step["reason"] = reason
+            records[pipeline_id][field].append(step)
+
+        return [records[r[0]] for r in rows]
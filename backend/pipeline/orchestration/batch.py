@@ -0,0 +1,156 @@
+"""
+Batch pipeline runs.
+
+A batch creates all of its pipelines up front (status "queued") and then feeds
+them to the engine through a bounded window of PIPELINE_BATCH_MAX_IN_FLIGHT.
+Rows are grouped by template and dispatched round-robin across the groups, so
+one template with 1,900 rows can't starve another with 100.
+
+Batch progress (counts, per-template progress, throughput, ETA) is kept in
+memory. The pipelines themselves live in the state store like any other: if
+the process restarts, queued batch pipelines are resumed individually by
+orchestrator.resume_in_flight, without the batch window.
+"""
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from orchestration.engine import engine
+from orchestration.orchestrator import run_pipeline
+from orchestration.state import create_pipeline, get_pipeline
+
+MAX_IN_FLIGHT     = int(os.environ.get("PIPELINE_BATCH_MAX_IN_FLIGHT", "50"))
+THROUGHPUT_WINDOW = 600   # seconds of finishes used for throughput / ETA
+NO_TEMPLATE       = "(no template)"
+
+
+class Batch:
+    def __init__(self, batch_id: str, groups: "OrderedDict[str, list[str]]", max_in_flight: int):
+        self.batch_id = batch_id
+        self.max_in_flight = max_in_flight
+        self.total = sum(len(ids) for ids in groups.values())
+        self.pipeline_ids = [pid for ids in groups.values() for pid in ids]
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+        self._queues = OrderedDict((template, deque(ids)) for template, ids in groups.items())
+        self._finishes: deque = deque()   # monotonic finish times within THROUGHPUT_WINDOW
+        # Only mutated on the engine loop thread
+        self.counts = {"queued": self.total, "running": 0, "completed": 0, "abandoned": 0}
+        self.templates = {
+            template: {"total": len(ids), "running": 0, "completed": 0, "abandoned": 0}
+            for template, ids in groups.items()
+        }
+
+    def _next(self) -> tuple[str, str]:
+        """Round-robin across templates that still have queued rows."""
+        template, queue = next(iter(self._queues.items()))
+        pipeline_id = queue.popleft()
+        if queue:
+            self._queues.move_to_end(template)
+        else:
+            del self._queues[template]
+        return template, pipeline_id
+
+    async def run(self):
+        self.started_at = time.time()
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        while self._queues:
+            await slots.acquire()
+            template, pipeline_id = self._next()
+            self.counts["queued"] -= 1
+            self.counts["running"] += 1
+            self.templates[template]["running"] += 1
+            task = asyncio.ensure_future(self._run_one(template, pipeline_id, slots))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        self.finished_at = time.time()
+        print(f"[Batch] {self.batch_id} finished: {self.counts}")
+
+    async def _run_one(self, template: str, pipeline_id: str, slots: asyncio.Semaphore):
+        try:
+            await asyncio.wrap_future(engine.submit(run_pipeline(pipeline_id)))
+        except Exception as e:
+            print(f"[Batch] {self.batch_id} pipeline {pipeline_id} crashed: {e}")
+        finally:
+            slots.release()
+            # Off the loop: a sqlite read can wait behind a writer's BEGIN IMMEDIATE
+            p = await asyncio.to_thread(get_pipeline, pipeline_id) or {}
+            outcome = "completed" if p.get("status") == "completed" else "abandoned"
+            self.counts["running"] -= 1
+            self.counts[outcome] += 1
+            self.templates[template]["running"] -= 1
+            self.templates[template][outcome] += 1
+            now = time.monotonic()
+            self._finishes.append(now)
+            while now - self._finishes[0] > THROUGHPUT_WINDOW:
+                self._finishes.popleft()
+
+    def progress(self) -> dict:
+        done = self.counts["completed"] + self.counts["abandoned"]
+        now = time.monotonic()
+        recent = sum(1 for t in list(self._finishes) if now - t <= THROUGHPUT_WINDOW)
+        elapsed = min(THROUGHPUT_WINDOW, time.time() - self.started_at) if self.started_at else 0
+        per_second = recent / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - done
+        if not remaining:
+            eta = 0
+        elif per_second:
+            eta = round(remaining / per_second)
+        else:
+            eta = None
+        return {
+            "batch_id": self.batch_id,
+            "status": "completed" if self.finished_at else ("running" if self.started_at else "queued"),
+            "total": self.total,
+            "counts": dict(self.counts),
+            "progress": round(done / self.total, 4) if self.total else 1.0,
+            "templates": {t: dict(c) for t, c in self.templates.items()},
+            "throughput_per_min": round(per_second * 60, 2),
+            "eta_seconds": eta,
+            "max_in_flight": self.max_in_flight,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+_batches: dict[str, Batch] = {}
+_lock = threading.Lock()
+
+
+def submit_batch(rows: list[dict], max_in_flight: int = MAX_IN_FLIGHT) -> Batch:
+    """
+    Create one queued pipeline per row (rows are create_pipeline kwargs) and
+    schedule the batch on the engine loop. Returns immediately.
+    """
+    batch_id = str(uuid.uuid4())
+    groups: OrderedDict[str, list[str]] = OrderedDict()
+    for row in rows:
+        pipeline_id = create_pipeline(**row, status="queued", batch_id=batch_id)
+        groups.setdefault(row.get("template_name") or NO_TEMPLATE, []).append(pipeline_id)
+
+    batch = Batch(batch_id, groups, max_in_flight)
+    with _lock:
+        _batches[batch_id] = batch
+    asyncio.run_coroutine_threadsafe(batch.run(), engine.loop)
+    print(f"[Batch] {batch_id} queued {batch.total} pipelines across {len(groups)} template(s)")
+    return batch
+
+
+def get_batch(batch_id: str) -> Batch | None:
+    with _lock:
+        return _batches.get(batch_id)
+
+
+def list_batches() -> list:
+    with _lock:
+        batches = list(_batches.values())
+    return [b.progress() for b in sorted(batches, key=lambda b: b.created_at, reverse=True)]
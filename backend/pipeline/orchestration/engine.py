@@ -0,0 +1,142 @@
+"""
+Async pipeline engine.
+
+A single asyncio event loop (on one background thread) drives every pipeline as a
+coroutine. Blocking work — RunPod HTTP calls, R2 transfers, Gemini reviews — is
+pushed onto a bounded thread pool, so the number of OS threads stays fixed no
+matter how many pipelines are in flight.
+
+Concurrency is capped twice:
+- globally: at most PIPELINE_MAX_CONCURRENT pipelines run at once, the rest queue
+- per node: at most PIPELINE_MAX_<NODE> pipelines sit inside each node at once
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+MAX_CONCURRENT_PIPELINES = int(os.environ.get("PIPELINE_MAX_CONCURRENT", "200"))
+WORKER_THREADS           = int(os.environ.get("PIPELINE_WORKER_THREADS", "16"))
+NODE_LIMITS = {
+    "image_gen":  int(os.environ.get("PIPELINE_MAX_IMAGE_GEN", "50")),
+    "masking":    int(os.environ.get("PIPELINE_MAX_MASKING", "50")),
+    "inpainting": int(os.environ.get("PIPELINE_MAX_INPAINTING", "50")),
+}
+
+
+class Engine:
+    def __init__(
+        self,
+        max_pipelines: int = MAX_CONCURRENT_PIPELINES,
+        node_limits: dict | None = None,
+        worker_threads: int = WORKER_THREADS,
+    ):
+        self.max_pipelines = max_pipelines
+        self.node_limits = dict(node_limits or NODE_LIMITS)
+        self.worker_threads = worker_threads
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+        # Created on the loop thread in _bootstrap
+        self._pipeline_slots: asyncio.Semaphore | None = None
+        self._node_slots: dict[str, asyncio.Semaphore] = {}
+
+        # Counters are only touched from the loop thread
+        self._queued = 0
+        self._running = 0
+        self._node_active = {name: 0 for name in self.node_limits}
+        self._node_waiting = {name: 0 for name in self.node_limits}
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Start the event loop thread (idempotent)."""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run_loop, args=(ready,), name="pipeline-engine", daemon=True,
+            )
+            self._thread.start()
+            ready.wait()
+
+    def _run_loop(self, ready: threading.Event):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=self.worker_threads, thread_name_prefix="pipeline-io")
+        )
+        self._loop = loop
+        self._pipeline_slots = asyncio.Semaphore(self.max_pipelines)
+        self._node_slots = {name: asyncio.Semaphore(limit) for name, limit in self.node_limits.items()}
+        ready.set()
+        loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    # ── Scheduling ────────────────────────────────────────────────────────────
+
+    def submit(self, coro) -> Future:
+        """Schedule a pipeline coroutine under the global concurrency cap."""
+        return asyncio.run_coroutine_threadsafe(self._guarded(coro), self.loop)
+
+    async def _guarded(self, coro):
+        self._queued += 1
+        try:
+            await self._pipeline_slots.acquire()
+        except BaseException:
+            self._queued -= 1
+            coro.close()
+            raise
+        self._queued -= 1
+        self._running += 1
+        try:
+            return await coro
+        finally:
+            self._running -= 1
+            self._pipeline_slots.release()
+
+    @asynccontextmanager
+    async def node(self, name: str):
+        """Hold one of the per-node slots for the duration of the block."""
+        sem = self._node_slots.get(name)
+        if sem is None:
+            yield
+            return
+        self._node_waiting[name] += 1
+        try:
+            await sem.acquire()
+        finally:
+            self._node_waiting[name] -= 1
+        self._node_active[name] += 1
+        try:
+            yield
+        finally:
+            self._node_active[name] -= 1
+            sem.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_pipelines": self.max_pipelines,
+            "worker_threads": self.worker_threads,
+            "queued": self._queued,
+            "running": self._running,
+            "nodes": {
+                name: {
+                    "limit": self.node_limits[name],
+                    "active": self._node_active[name],
+                    "waiting": self._node_waiting[name],
+                }
+                for name in self.node_limits
+            },
+        }
+
+
+engine = Engine()
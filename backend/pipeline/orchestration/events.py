@@ -0,0 +1,90 @@
+"""
+In-process change notifications for pipeline state.
+
+orchestration.state publishes an event on every write; the SSE routes subscribe
+and forward them, so clients receive field-level diffs instead of re-polling
+whole pipeline records.
+
+Channels:
+- "pipeline:<id>"  changes to one pipeline
+- "pipelines"      every change to every pipeline (list view / queue dashboard)
+
+Events are (name, payload) tuples. A subscriber that falls more than
+MAX_BACKLOG events behind is flagged as overflowed and should resync from a
+fresh snapshot rather than replay the gap.
+"""
+import threading
+from collections import deque
+
+MAX_BACKLOG = 1000
+
+
+class Subscription:
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.overflowed = False
+        self._events: deque = deque()
+        self._cond = threading.Condition()
+
+    def push(self, event: tuple):
+        with self._cond:
+            if len(self._events) >= MAX_BACKLOG:
+                self._events.clear()
+                self.overflowed = True
+            else:
+                self._events.append(event)
+            self._cond.notify()
+
+    def drain(self, timeout: float) -> list:
+        """Wait up to `timeout` seconds for events and return everything queued."""
+        with self._cond:
+            if not self._events and not self.overflowed:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def take_overflow(self) -> bool:
+        with self._cond:
+            overflowed, self.overflowed = self.overflowed, False
+            return overflowed
+
+
+class Hub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, set[Subscription]] = {}
+
+    def subscribe(self, channel: str) -> Subscription:
+        sub = Subscription(channel)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(sub.channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.channel]
+
+    def publish(self, channel: str, name: str, payload: dict):
+        with self._lock:
+            subs = list(self._subscribers.get(channel, ()))
+        for sub in subs:
+            sub.push((name, payload))
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+hub = Hub()
+
+
+def publish_pipeline(pipeline_id: str, name: str, payload: dict):
+    """Fan an event out to the pipeline's own channel and the all-pipelines channel."""
+    payload = {"pipeline_id": pipeline_id, **payload}
+    hub.publish(f"pipeline:{pipeline_id}", name, payload)
+    hub.publish("pipelines", name, payload)
@@ -1,68 +1,182 @@
-import threading
+import asyncio
 import time
 
-from orchestration.state import update_pipeline, get_pipeline, update_agent_step
+from infra import image_cache
+from orchestration.state import update_pipeline, get_pipeline, update_agent_step, in_flight_pipelines
+from orchestration.engine import engine
 from nodes import image_gen, masking, inpainting
 from nodes.image_gen import NodeFailed as ImageGenFailed
 from nodes.masking import NodeFailed as MaskingFailed
 from nodes.inpainting import NodeFailed as InpaintingFailed
 
 
-def run_pipeline(pipeline_id: str):
+def _prefetch(r2_path: str) -> asyncio.Task:
+    """Start downloading an input a later node will need, overlapping the current node."""
+    return asyncio.ensure_future(asyncio.to_thread(image_cache.fetch, r2_path))
+
+
+async def _prefetched(task: asyncio.Task | None) -> bytes | None:
+    """Bytes from a prefetch, or None (node downloads itself) if it failed."""
+    if task is None:
+        return None
+    try:
+        return await task
+    except Exception as e:
+        print(f"[Orchestrator] prefetch failed, node will download: {e}")
+        return None
+
+
+class _StateWriter:
+    """
+    One pipeline's state writes, run on the engine's worker threads in the order
+    they were made. Each write is a SQLite BEGIN IMMEDIATE plus an SSE publish;
+    run on the loop, a wait for the write lock would stall every pipeline.
+    """
+
+    def __init__(self, pipeline_id: str):
+        self.pipeline_id = pipeline_id
+        self._loop = asyncio.get_running_loop()
+        self._last: asyncio.Task | None = None
+
+    def write(self, fn, *args, **kwargs) -> asyncio.Task:
+        """Queue fn(*args, **kwargs) behind this pipeline's earlier writes. Await the task to wait for it."""
+        previous = self._last
+
+        async def run():
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+        self._last = asyncio.ensure_future(run())
+        return self._last
+
+    def send(self, fn, *args, **kwargs):
+        """write() for sync callbacks (on_step, on_prompt) that can't await it; failures are logged."""
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if not on_loop:   # a sync tool run on a worker thread
+            self._loop.call_soon_threadsafe(lambda: self.send(fn, *args, **kwargs))
+            return
+        self.write(fn, *args, **kwargs).add_done_callback(self._log_failure)
+
+    def update(self, **fields) -> asyncio.Task:
+        return self.write(update_pipeline, self.pipeline_id, **fields)
+
+    def _log_failure(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[Orchestrator] state write failed for {self.pipeline_id}: {task.exception()}")
+
+
+def _step_updater(writer: _StateWriter, steps_field: str = "agent_steps"):
+    return lambda key, status, label=None, reason=None: writer.send(
+        update_agent_step, writer.pipeline_id, key, status, label, reason, steps_field=steps_field,
+    )
+
+
+def _record_startup(pipeline_id: str, node: str, startup_ms: int):
+    timings = {**(get_pipeline(pipeline_id) or {}).get("node_startup_ms", {}), node: startup_ms}
+    update_pipeline(pipeline_id, node_startup_ms=timings)
+
+
+def _timed_steps(writer: _StateWriter, node: str, on_step):
+    """
+    Wrap a node's on_step so its first call records the node's startup latency:
+    time from entering the node (slot acquired) until the agent starts working.
+    """
+    started = time.monotonic()
+    recorded = [False]
+
+    def step(key, status, label=None, reason=None):
+        if not recorded[0]:
+            recorded[0] = True
+            startup_ms = round((time.monotonic() - started) * 1000)
+            writer.send(_record_startup, writer.pipeline_id, node, startup_ms)
+        on_step(key, status, label, reason)
+
+    return step
+
+
+async def run_pipeline(pipeline_id: str):
     """
-    Runs in a daemon thread.
+    Runs as a coroutine on the engine loop.
     Chains: image_gen node → masking node → inpainting node.
     Updates state at every transition so the status route reflects live progress.
+
+    Inputs already known are prefetched while earlier nodes run: the product
+    image from the start, each node's output as soon as it exists (before
+    waiting for the next node's slot). Nodes receive the bytes directly.
+
+    State writes go through a _StateWriter, off the loop and in order.
     """
-    p = get_pipeline(pipeline_id)
+    p = await asyncio.to_thread(get_pipeline, pipeline_id)
     if not p:
         return
+    state = _StateWriter(pipeline_id)
+    if p["status"] == "queued":
+        await state.update(status="running")
 
+    product_fetch = _prefetch(p["product_r2"]) if p.get("run_masking", True) else None
     try:
+        # Nodes whose result is already stored (a resumed pipeline) are skipped
         # ── Node 1: Image Generation ───────────────────────────────────────────
-        update_pipeline(pipeline_id, current_node="image_gen")
-        result1 = image_gen.run(
-            subject=p["subject"],
-            mode=p["mode"],
-            lora_name=p.get("lora_name"),
-            keyword=p.get("keyword"),
-            template_name=p.get("template_name"),
-            preview_image_url=p.get("preview_image_url"),
-            on_prompt=lambda prompt: update_pipeline(pipeline_id, current_prompt=prompt),
-            on_step=lambda key, status, label=None, reason=None: update_agent_step(pipeline_id, key, status, label, reason),
-        )
-        if not p.get("run_masking", True):
-            update_pipeline(pipeline_id, image_gen_result=result1, current_node="done", status="completed", completed_at=time.time())
-            print(f"[Orchestrator] Pipeline {pipeline_id} stopped after image_gen (run_masking=False).")
-            return
+        result1 = p.get("image_gen_result")
+        if result1 is None:
+            await state.update(current_node="image_gen")
+            async with engine.node("image_gen"):
+                result1 = await image_gen.run_async(
+                    subject=p["subject"],
+                    mode=p["mode"],
+                    lora_name=p.get("lora_name"),
+                    keyword=p.get("keyword"),
+                    template_name=p.get("template_name"),
+                    preview_image_url=p.get("preview_image_url"),
+                    fan_out=p.get("fan_out") or 1,
+                    on_prompt=lambda prompt: state.send(update_pipeline, pipeline_id, current_prompt=prompt),
+                    on_step=_timed_steps(state, "image_gen", _step_updater(state)),
+                )
+            if not p.get("run_masking", True):
+                await state.update(image_gen_result=result1, current_node="done", status="completed", completed_at=time.time())
+                print(f"[Orchestrator] Pipeline {pipeline_id} stopped after image_gen (run_masking=False).")
+                return
 
-        update_pipeline(pipeline_id, image_gen_result=result1, current_node="masking")
+            await state.update(image_gen_result=result1, current_node="masking")
 
         # ── Node 2: Masking ────────────────────────────────────────────────────
-        result2 = masking.run(
-            generated_r2=result1["r2_path"],
-            subject=p["subject"],
-            product_r2=p["product_r2"],
-            on_step=lambda key, status, label=None, reason=None: update_agent_step(pipeline_id, key, status, label, reason, steps_field="masking_agent_steps"),
-        )
+        result2 = p.get("masking_result")
+        if result2 is None:
+            generated_fetch = _prefetch(result1["r2_path"])
+            async with engine.node("masking"):
+                result2 = await masking.run_async(
+                    generated_r2=result1["r2_path"],
+                    subject=p["subject"],
+                    product_r2=p["product_r2"],
+                    on_step=_timed_steps(state, "masking", _step_updater(state, "masking_agent_steps")),
+                    generated_image_bytes=await _prefetched(generated_fetch),
+                    product_image_bytes=await _prefetched(product_fetch),
+                )
 
-        if not p.get("run_inpainting", True):
-            update_pipeline(pipeline_id, masking_result=result2, current_node="done", status="completed", completed_at=time.time())
-            print(f"[Orchestrator] Pipeline {pipeline_id} stopped after masking (run_inpainting=False).")
-            return
+            if not p.get("run_inpainting", True):
+                await state.update(masking_result=result2, current_node="done", status="completed", completed_at=time.time())
+                print(f"[Orchestrator] Pipeline {pipeline_id} stopped after masking (run_inpainting=False).")
+                return
 
-        update_pipeline(pipeline_id, masking_result=result2, current_node="inpainting")
+            await state.update(masking_result=result2, current_node="inpainting")
 
         # ── Node 3: Inpainting ─────────────────────────────────────────────────
-        result3 = inpainting.run(
-            masked_r2=result2["r2_path"],
-            product_r2=p["product_r2"],
-            subject=p["subject"],
-            on_prompt=lambda prompt: update_pipeline(pipeline_id, current_inpaint_prompt=prompt),
-            on_step=lambda key, status, label=None, reason=None: update_agent_step(pipeline_id, key, status, label, reason, steps_field="inpainting_agent_steps"),
-        )
-        update_pipeline(
-            pipeline_id,
+        masked_fetch = _prefetch(result2["r2_path"])
+        async with engine.node("inpainting"):
+            result3 = await inpainting.run_async(
+                masked_r2=result2["r2_path"],
+                product_r2=p["product_r2"],
+                subject=p["subject"],
+                on_prompt=lambda prompt: state.send(update_pipeline, pipeline_id, current_inpaint_prompt=prompt),
+                on_step=_timed_steps(state, "inpainting", _step_updater(state, "inpainting_agent_steps")),
+                masked_image_bytes=await _prefetched(masked_fetch),
+                product_image_bytes=await _prefetched(product_fetch),
+            )
+        await state.update(
             inpainting_result=result3,
             current_node="done",
             status="completed",
@@ -71,14 +185,33 @@ def run_pipeline(pipeline_id: str):
         print(f"[Orchestrator] Pipeline {pipeline_id} completed.")
 
     except (ImageGenFailed, MaskingFailed, InpaintingFailed) as e:
-        update_pipeline(pipeline_id, status="abandoned", error=str(e))
+        await state.update(status="abandoned", error=str(e))
         print(f"[Orchestrator] Pipeline {pipeline_id} abandoned: {e}")
 
     except Exception as e:
-        update_pipeline(pipeline_id, status="abandoned", error=f"Unexpected error: {e}")
+        await state.update(status="abandoned", error=f"Unexpected error: {e}")
         print(f"[Orchestrator] Pipeline {pipeline_id} unexpected error: {e}")
 
+    finally:
+        if product_fetch is not None:
+            if not product_fetch.done():
+                product_fetch.cancel()
+            elif not product_fetch.cancelled():
+                product_fetch.exception()  # mark retrieved; nodes never needed it
+
 
 def start(pipeline_id: str):
-    """Spawn orchestrator as a daemon thread."""
-    threading.Thread(target=run_pipeline, args=(pipeline_id,), daemon=True).start()
+    """Schedule the pipeline on the shared engine loop (non-blocking)."""
+    engine.submit(run_pipeline(pipeline_id))
+
+
+def resume_in_flight() -> int:
+    """
+    Reschedule pipelines left queued or running by a previous process.
+    Each one restarts at the first node without a stored result.
+    """
+    pipeline_ids = in_flight_pipelines()
+    for pipeline_id in pipeline_ids:
+        print(f"[Orchestrator] Resuming {pipeline_id}")
+        start(pipeline_id)
+    return len(pipeline_ids)
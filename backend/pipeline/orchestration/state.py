@@ -1,9 +1,18 @@
-import threading
+"""
+Pipeline state facade.
+
+Routes and the orchestrator call these functions; storage is delegated to the
+backend selected by PIPELINE_STATE_BACKEND ("sqlite" by default, "memory" for
+a throwaway in-process store). See orchestration/backends.
+"""
+import os
 import time
 import uuid
 
-_pipelines: dict = {}
-_lock = threading.Lock()
+from orchestration.backends import create_backend
+from orchestration.events import publish_pipeline
+
+_backend = create_backend(os.environ.get("PIPELINE_STATE_BACKEND", "sqlite"))
 
 
 def _initial_agent_steps(mode: str, preview_image_url: str | None) -> list:
@@ -42,87 +51,78 @@ def create_pipeline(
     preview_image_url: str | None = None,
     run_masking: bool = True,
     run_inpainting: bool = True,
+    fan_out: int = 1,     # parallel image_gen variants per attempt
+    status: str = "running",   # "queued" when a batch will start it later
+    batch_id: str | None = None,
 ) -> str:
     pipeline_id = str(uuid.uuid4())
-    with _lock:
-        _pipelines[pipeline_id] = {
-            "pipeline_id": pipeline_id,
-            "status": "running",
-            "mode": mode,
-            "subject": subject,
-            "product_r2": product_r2,
-            "lora_name": lora_name,
-            "keyword": keyword,
-            "template_name": template_name,
-            "preview_image_url": preview_image_url,
-            "run_masking": run_masking,
-            "run_inpainting": run_inpainting,
-            "agent_steps": _initial_agent_steps(mode, preview_image_url),
-            "masking_agent_steps": _initial_masking_steps(),
-            "inpainting_agent_steps": _initial_inpainting_steps(),
-            "current_node": "image_gen",   # "image_gen" | "masking" | "inpainting" | "done"
-            "current_prompt": None,
-            "current_inpaint_prompt": None,
-            "image_gen_result": None,
-            "masking_result": None,
-            "inpainting_result": None,
-            "created_at": time.time(),
-            "completed_at": None,
-            "error": None,
-        }
+    record = {
+        "pipeline_id": pipeline_id,
+        "status": status,
+        "mode": mode,
+        "subject": subject,
+        "product_r2": product_r2,
+        "lora_name": lora_name,
+        "keyword": keyword,
+        "template_name": template_name,
+        "preview_image_url": preview_image_url,
+        "run_masking": run_masking,
+        "run_inpainting": run_inpainting,
+        "fan_out": fan_out,
+        "batch_id": batch_id,
+        "agent_steps": _initial_agent_steps(mode, preview_image_url),
+        "masking_agent_steps": _initial_masking_steps(),
+        "inpainting_agent_steps": _initial_inpainting_steps(),
+        "current_node": "image_gen",   # "image_gen" | "masking" | "inpainting" | "done"
+        "current_prompt": None,
+        "current_inpaint_prompt": None,
+        "image_gen_result": None,
+        "masking_result": None,
+        "inpainting_result": None,
+        "created_at": time.time(),
+        "completed_at": None,
+        "error": None,
+    }
+    _backend.create(record)
+    publish_pipeline(pipeline_id, "created", {"pipeline": record})
     return pipeline_id
 
 
 def update_pipeline(pipeline_id: str, **fields):
-    with _lock:
-        if pipeline_id in _pipelines:
-            _pipelines[pipeline_id].update(fields)
+    _backend.update(pipeline_id, fields)
+    publish_pipeline(pipeline_id, "patch", {"fields": fields})
 
 
 def update_agent_step(pipeline_id: str, key: str, status: str, label: str | None = None, reason: str | None = None, steps_field: str = "agent_steps"):
     """Update a single step's status (and optionally label/reason) inside a steps list."""
-    with _lock:
-        p = _pipelines.get(pipeline_id)
-        if not p:
-            return
-        for step in p.get(steps_field, []):
-            if step["key"] == key:
-                step["status"] = status
-                if label is not None:
-                    step["label"] = label
-                if reason is not None:
-                    step["reason"] = reason
-                elif status != "failed":
-                    step.pop("reason", None)  # clear stale reason on non-failure
-                break
+    _backend.update_step(pipeline_id, steps_field, key, status, label, reason)
+    publish_pipeline(pipeline_id, "step", {
+        "steps_field": steps_field, "key": key, "status": status, "label": label, "reason": reason,
+    })
 
 
 def get_pipeline(pipeline_id: str) -> dict | None:
-    with _lock:
-        p = _pipelines.get(pipeline_id)
-        return dict(p) if p else None
+    return _backend.get(pipeline_id)
 
 
 def list_pipelines(limit: int = 50) -> list:
-    with _lock:
-        items = list(_pipelines.values())
-    items.sort(key=lambda p: p["created_at"], reverse=True)
-    return [dict(p) for p in items[:limit]]
+    return _backend.list(limit)
+
+
+def in_flight_pipelines() -> list:
+    """Ids of pipelines still queued or running (e.g. interrupted by a restart), oldest first."""
+    return _backend.in_flight()
 
 
 def get_queue_counts() -> dict:
     """Active pipeline counts per service."""
     counts = {"lora_z_turbo": 0, "z_turbo": 0, "masking": 0, "inpainting": 0}
-    with _lock:
-        for p in _pipelines.values():
-            if p["status"] != "running":
-                continue
-            node = p.get("current_node")
-            if node == "image_gen":
-                key = "lora_z_turbo" if p.get("mode") == "template" else "z_turbo"
-                counts[key] += 1
-            elif node == "masking":
-                counts["masking"] += 1
-            elif node == "inpainting":
-                counts["inpainting"] += 1
+    for node, mode, n in _backend.running_counts():
+        if node == "image_gen":
+            key = "lora_z_turbo" if mode == "template" else "z_turbo"
+            counts[key] += n
+        elif node == "masking":
+            counts["masking"] += n
+        elif node == "inpainting":
+            counts["inpainting"] += n
     return counts
@@ -0,0 +1,89 @@
+"""
+Server-Sent Events generators for pipeline progress.
+
+Each stream opens with a full `snapshot` event, then forwards field-level
+changes as they are published by orchestration.state:
+
+    event: patch    {"pipeline_id", "fields": {...}}           top-level fields changed
+    event: step     {"pipeline_id", "steps_field", "key", "status", "label", "reason"}
+    event: created  {"pipeline_id", "pipeline": {...}}         (list stream only)
+    event: queues   {...}                                      (list stream only)
+
+Subscribing happens before the snapshot is read, so no change is lost in
+between; a change that lands in both is simply applied twice (every event is
+an idempotent set). A subscriber that overflows its backlog gets a new snapshot.
+"""
+import json
+
+from orchestration.events import hub
+from orchestration.state import get_pipeline, list_pipelines, get_queue_counts
+
+KEEPALIVE_SECONDS = 15
+
+# Fields whose change can move a pipeline between queue counters
+_QUEUE_FIELDS = {"status", "current_node"}
+
+# Statuses a pipeline can still leave; batch pipelines start "queued"
+_ACTIVE = ("queued", "running")
+
+
+def _sse(name: str, payload) -> str:
+    return f"event: {name}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+
+def pipeline_events(pipeline_id: str):
+    """Stream one pipeline until it reaches a terminal status (completed / abandoned)."""
+    sub = hub.subscribe(f"pipeline:{pipeline_id}")
+    try:
+        p = get_pipeline(pipeline_id)
+        if p is None:
+            yield _sse("error", {"error": "Pipeline not found"})
+            return
+        yield _sse("snapshot", p)
+        status = p["status"]
+        while status in _ACTIVE:
+            events = sub.drain(KEEPALIVE_SECONDS)
+            if sub.take_overflow():
+                p = get_pipeline(pipeline_id)
+                status = p["status"]
+                yield _sse("snapshot", p)
+                continue
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for name, payload in events:
+                yield _sse(name, payload)
+                if name == "patch":
+                    status = payload["fields"].get("status", status)
+        yield _sse("end", {"pipeline_id": pipeline_id, "status": status})
+    finally:
+        hub.unsubscribe(sub)
+
+
+def list_events(limit: int = 50):
+    """Multiplexed stream behind the list view and queue dashboard."""
+    sub = hub.subscribe("pipelines")
+    try:
+        queues = get_queue_counts()
+        yield _sse("snapshot", {"pipelines": list_pipelines(limit), "queues": queues})
+        while True:
+            events = sub.drain(KEEPALIVE_SECONDS)
+            if sub.take_overflow():
+                queues = get_queue_counts()
+                yield _sse("snapshot", {"pipelines": list_pipelines(limit), "queues": queues})
+                continue
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            queues_dirty = False
+            for name, payload in events:
+                yield _sse(name, payload)
+                if name == "created" or (name == "patch" and _QUEUE_FIELDS & payload["fields"].keys()):
+                    queues_dirty = True
+            if queues_dirty:
+                counts = get_queue_counts()
+                if counts != queues:
+                    queues = counts
+                    yield _sse("queues", queues)
+    finally:
+        hub.unsubscribe(sub)
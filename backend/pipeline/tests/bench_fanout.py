@@ -0,0 +1,123 @@
+"""
+Speculative fan-out width vs pipeline latency, against tests/fake_runpod.py.
+
+Runs --pipelines simulated image_gen nodes per width, all at once. Each
+makes up to --attempts attempts of fanout.speculate(width, ...), as the
+agent's submit_image does with fan_out > 1:
+
+- generate(i) is runner.submit_and_fetch — a real RunPod job on the fake
+  (0.3 s queue, --gen seconds run), tracked by runpod_poller and cancelled on RunPod
+  when speculate() cancels it. The R2 download is replaced by fixed bytes.
+- evaluate() is a stubbed review: sleeps --review seconds and passes with
+  probability --pass-rate.
+
+Prints p50/p95 pipeline latency per width, with the RunPod jobs, cancels and
+GPU seconds it cost, from the fake's /stats.
+
+    cd backend/pipeline
+    python tests/bench_fanout.py --pipelines 40
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+def _wait_for_port(port: int, timeout: float = 10.0):
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"fake RunPod did not start on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pipelines", type=int, default=40, help="concurrent pipelines per width")
+    parser.add_argument("--widths", default="1,2,3,4")
+    parser.add_argument("--attempts", type=int, default=3, help="attempts per pipeline, as the agent retries")
+    parser.add_argument("--pass-rate", type=float, default=0.45)
+    parser.add_argument("--gen", type=float, nargs=2, default=(2.0, 8.0), metavar=("MIN", "MAX"),
+                        help="RunPod job run seconds")
+    parser.add_argument("--review", type=float, nargs=2, default=(0.3, 0.8), metavar=("MIN", "MAX"),
+                        help="stubbed review seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8403)
+    args = parser.parse_args()
+
+    os.environ["RUNPOD_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("GEMINI_API_KEY", "unused")   # nodes.image_gen imports the agent; no Gemini call is made
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, "fake_runpod.py"), str(args.port),
+                               *(str(s) for s in args.gen)])
+    try:
+        _wait_for_port(args.port)
+        _run(args)
+    finally:
+        server.terminate()
+
+
+def _run(args):
+    import requests
+
+    from nodes.image_gen import runner
+    from nodes.image_gen.fanout import speculate
+
+    runner._download_r2 = lambda r2_path: b"\x89PNG\r\n\x1a\n" + r2_path.encode()
+    rng = random.Random(args.seed)
+    base = os.environ["RUNPOD_BASE_URL"]
+
+    async def generate(i: int) -> tuple[str, bytes]:
+        images = await runner.submit_and_fetch(
+            mode="no_template", prompt="bench", width=1024, height=1024, seed=rng.randint(1, 999_999),
+        )
+        return images[0]
+
+    async def evaluate(r2_path: str, image_bytes: bytes) -> dict:
+        await asyncio.sleep(rng.uniform(*args.review))
+        return {"passed": rng.random() < args.pass_rate, "score": rng.uniform(0, 10)}
+
+    async def pipeline(width: int) -> tuple[float, bool]:
+        start = time.monotonic()
+        for _ in range(args.attempts):
+            outcome = await speculate(width, generate, evaluate)
+            if outcome["best"] and outcome["best"]["review"].get("passed"):
+                return time.monotonic() - start, True
+        return time.monotonic() - start, False
+
+    async def width_run(width: int) -> list:
+        return await asyncio.gather(*(pipeline(width) for _ in range(args.pipelines)))
+
+    print(f"{args.pipelines} pipelines per width, {args.attempts} attempts, "
+          f"jobs {args.gen[0]}-{args.gen[1]} s, review {args.review[0]}-{args.review[1]} s passing {args.pass_rate:.0%}")
+    print(f"  {'width':>5} {'p50':>7} {'p95':>7} {'passed':>7} {'jobs/pipeline':>14} "
+          f"{'cancelled':>10} {'GPU s/pipeline':>15}")
+    for width in (int(w) for w in args.widths.split(",")):
+        before = requests.get(f"{base}/stats", timeout=5).json()
+        results = asyncio.run(width_run(width))
+        time.sleep(0.5)   # let the fire-and-forget cancels land
+        after = requests.get(f"{base}/stats", timeout=5).json()
+
+        latencies = sorted(seconds for seconds, _ in results)
+        p50 = statistics.median(latencies)
+        p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+        passed = sum(ok for _, ok in results)
+        n = args.pipelines
+        print(f"  {width:>5} {p50:>6.1f}s {p95:>6.1f}s {passed:>4}/{n:<2} "
+              f"{(after['runs'] - before['runs']) / n:>14.2f} "
+              f"{(after['cancels'] - before['cancels']) / n:>10.2f} "
+              f"{(after['gpu_seconds'] - before['gpu_seconds']) / n:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Micro-benchmark: a boto3 client built per call vs the shared infra.r2 client.
+
+"per-call" is what every runner and handler used to do — build a fresh
+boto3.client for each download/upload, paying credential resolution, endpoint
+setup and a new TLS connection. "pooled" is infra.r2, one client with a
+keep-alive connection pool. Both download and upload small objects, first one
+at a time and then from a thread pool, against tests/fake_s3.py over HTTPS
+with a throwaway self-signed cert (needs the openssl CLI).
+
+    cd backend/pipeline
+    python tests/bench_r2_client.py --ops 300
+
+Pass --endpoint to run against another S3-compatible server instead (e.g.
+`moto_server -p 5000`, then --endpoint http://127.0.0.1:5000).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+BUCKET = "bench"
+
+
+def _self_signed(workdir: str) -> tuple[str, str]:
+    cert, key = os.path.join(workdir, "cert.pem"), os.path.join(workdir, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+         "-keyout", key, "-out", cert],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+def _wait_for_port(port: int, timeout: float = 10.0):
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"fake S3 did not start on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=300, help="operations per scenario")
+    parser.add_argument("--size-kb", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8401)
+    parser.add_argument("--endpoint", help="use this S3-compatible endpoint instead of tests/fake_s3.py")
+    args = parser.parse_args()
+
+    server = None
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.endpoint:
+            endpoint = args.endpoint
+        else:
+            cert, key = _self_signed(workdir)
+            server = subprocess.Popen([sys.executable, os.path.join(HERE, "fake_s3.py"), str(args.port), cert, key])
+            endpoint = f"https://127.0.0.1:{args.port}"
+            os.environ["AWS_CA_BUNDLE"] = cert   # botocore trusts the throwaway cert
+        os.environ.update({
+            "R2_ENDPOINT_URL": endpoint,
+            "R2_ACCESS_KEY_ID": "bench",
+            "R2_SECRET_ACCESS_KEY": "bench",
+            "R2_OUTPUT_BUCKET": BUCKET,
+        })
+        try:
+            _wait_for_port(int(endpoint.rsplit(":", 1)[1].split("/")[0]))
+            _run(args, endpoint)
+        finally:
+            if server is not None:
+                server.terminate()
+
+
+def _run(args, endpoint: str):
+    import boto3
+    from botocore.config import Config
+
+    from infra import r2
+
+    def per_call_client():
+        # The construction every caller used before infra.r2
+        return boto3.client(
+            "s3",
+            endpoint_url=endpoint,
+            aws_access_key_id="bench",
+            aws_secret_access_key="bench",
+            config=Config(signature_version="s3v4"),
+            region_name="auto",
+        )
+
+    payload = os.urandom(args.size_kb << 10)
+    try:
+        r2.client().create_bucket(Bucket=BUCKET)
+    except Exception:
+        pass   # fake_s3 has no buckets; moto needs one
+    r2.upload(payload, "seed.bin", "application/octet-stream")
+
+    scenarios = {
+        "download": {
+            "per-call": lambda i: per_call_client().get_object(Bucket=BUCKET, Key="seed.bin")["Body"].read(),
+            "pooled":   lambda i: r2.download(f"r2://{BUCKET}/seed.bin"),
+        },
+        "upload": {
+            "per-call": lambda i: per_call_client().put_object(Bucket=BUCKET, Key=f"up/{i}.bin", Body=payload),
+            "pooled":   lambda i: r2.upload(payload, f"up/{i}.bin", "application/octet-stream"),
+        },
+    }
+
+    def timed(fn, i):
+        start = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - start
+
+    print(f"{args.ops} ops per row, {args.size_kb} KB objects, endpoint {endpoint}\n")
+    print(f"{'operation':<9} {'client':<9} {'threads':>7} {'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    results = {}
+    for op, clients in scenarios.items():
+        for threads in (1, args.threads):
+            for name, fn in clients.items():
+                fn(0)   # warm up (imports, the pooled client's first connection)
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=threads) as pool:
+                    latencies = list(pool.map(lambda i: timed(fn, i), range(args.ops)))
+                elapsed = time.perf_counter() - start
+                latencies.sort()
+                rate = args.ops / elapsed
+                results[op, threads, name] = rate
+                print(f"{op:<9} {name:<9} {threads:>7} {rate:>8.1f} "
+                      f"{statistics.median(latencies) * 1000:>8.2f} "
+                      f"{latencies[int(len(latencies) * 0.95) - 1] * 1000:>8.2f}")
+        print()
+
+    for op in scenarios:
+        for threads in (1, args.threads):
+            speedup = results[op, threads, "pooled"] / results[op, threads, "per-call"]
+            print(f"{op} x{threads}: pooled is {speedup:.1f}x the per-call throughput")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Review payload and latency with and without infra.review_images.
+
+Runs the real image_gen, masking and inpainting reviews against
+tests/fake_gemini.py, which answers every call with a passing verdict after
+--latency seconds and throttles request bodies to --uplink MB/s. Inputs are
+the repo's 1024 px training PNGs as generated images, 2560 px LANCZOS
+upscales of them, binary masks drawn over them, and a template preview JPEG:
+
+- review 1024 px          image_gen.review on a generated PNG
+- review 2560 px          image_gen.review on an upscale
+- review_character        image_gen.review_character, preview + generated
+- masking review          masking.review, mask + generated as the product
+- inpainting review       inpainting.review on an upscale
+
+"before" sends the images as they are (review_images.prepare passes them
+through, as the reviews did before it existed); "after" sends the review
+copies. Images still go through gemini_files either way; its handles and
+review_images' memo are cleared between cases. Each mode runs in its own
+child process with its own review cache, so no verdict is served from the
+other's. Reported per review: bytes on the wire (generateContent bodies +
+uploads) and p50 latency.
+
+    cd backend/pipeline
+    python tests/bench_review_images.py --uplink 12.5
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+REPO = os.path.dirname(os.path.dirname(os.path.dirname(HERE)))
+TRAINING_PNGS = os.path.join(REPO, "microservices", "dataset-create", "captions-create", "training_datasets", "training_data")
+PREVIEW_JPEG = os.path.join(REPO, "backend", "templates", "templatePreviews", "SENTYSON.jpg")
+VERDICT = json.dumps({"score": 8.0, "passed": True, "reason": "fake verdict"})
+
+
+def _wait_for_port(port: int, timeout: float = 10.0):
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"fake Gemini did not start on port {port}")
+
+
+def _inputs(count: int, upscale_edge: int) -> dict:
+    from PIL import Image, ImageDraw
+
+    def png(im) -> bytes:
+        buf = io.BytesIO()
+        im.save(buf, "PNG")
+        return buf.getvalue()
+
+    generated, upscaled, masks = [], [], []
+    for path in sorted(glob.glob(os.path.join(TRAINING_PNGS, "*.png")))[:count]:
+        with open(path, "rb") as f:
+            generated.append(f.read())
+        with Image.open(path) as im:
+            upscaled.append(png(im.convert("RGB").resize((upscale_edge, upscale_edge), Image.LANCZOS)))
+            mask = Image.new("L", im.size, 0)
+            w, h = im.size
+            ImageDraw.Draw(mask).ellipse((w * 0.25, h * 0.2, w * 0.75, h * 0.9), fill=255)
+            masks.append(png(mask))
+    with open(PREVIEW_JPEG, "rb") as f:
+        preview = f.read()
+    return {"generated": generated, "upscaled": upscaled, "masks": masks, "preview": preview}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=6, help="reviews per case")
+    parser.add_argument("--upscale-edge", type=int, default=2560)
+    parser.add_argument("--uplink", type=float, default=12.5, help="fake Gemini's uplink throttle, MB/s")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8406)
+    parser.add_argument("--child", choices=("before", "after"), help=argparse.SUPPRESS)
+    parser.add_argument("--inputs", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return _child(args)
+
+    server = subprocess.Popen([
+        sys.executable, os.path.join(HERE, "fake_gemini.py"), "--port", str(args.port), "--rps", "0",
+        "--latency", str(args.latency), "--uplink", str(args.uplink), "--reply", VERDICT,
+    ])
+    try:
+        with tempfile.TemporaryDirectory(prefix="review-bench-") as tmp:
+            inputs = _inputs(args.images, args.upscale_edge)
+            inputs_path = os.path.join(tmp, "inputs.json")
+            with open(inputs_path, "w") as f:
+                json.dump({k: [b.hex() for b in v] if isinstance(v, list) else v.hex() for k, v in inputs.items()}, f)
+            _wait_for_port(args.port)
+            print(f"{len(inputs['generated'])} reviews per case, fake Gemini: {args.latency * 1000:.0f} ms latency, "
+                  f"{args.uplink} MB/s uplink")
+            for mode in ("before", "after"):
+                env = dict(
+                    os.environ,
+                    GOOGLE_GEMINI_BASE_URL=f"http://127.0.0.1:{args.port}",
+                    GEMINI_API_KEY="fake",
+                    REVIEW_CACHE_PATH=os.path.join(tmp, f"review_cache_{mode}.db"),
+                )
+                subprocess.run([
+                    sys.executable, os.path.abspath(__file__), "--child", mode, "--inputs", inputs_path,
+                    "--port", str(args.port),
+                ], env=env, check=True)
+    finally:
+        server.terminate()
+
+
+def _child(args):
+    import requests
+
+    from infra import gemini, gemini_files, review_images
+    from nodes.image_gen import review as image_gen_review
+    from nodes.inpainting import review as inpainting_review
+    from nodes.masking import review as masking_review
+
+    with open(args.inputs) as f:
+        raw = json.load(f)
+    inputs = {k: [bytes.fromhex(h) for h in v] if isinstance(v, list) else bytes.fromhex(v) for k, v in raw.items()}
+    generated, upscaled, masks, preview = inputs["generated"], inputs["upscaled"], inputs["masks"], inputs["preview"]
+
+    if args.child == "before":
+        review_images.prepare = lambda data, mime_type="image/png": (data, mime_type)
+        review_images.prepare_many = lambda images: list(images)
+    image_gen_review.preview_cache.fetch = lambda url: (preview, "image/jpeg")
+
+    cases = {
+        "review 1024 px": [lambda g=g: image_gen_review.review(g, "jacket") for g in generated],
+        "review 2560 px": [lambda u=u: image_gen_review.review(u, "jacket") for u in upscaled],
+        "review_character": [
+            lambda g=g: image_gen_review.review_character(g, "/api/template-images/SENTYSON.jpg", {}) for g in generated
+        ],
+        "masking review": [lambda m=m, g=g: masking_review.review(m, "jacket", g) for m, g in zip(masks, generated)],
+        "inpainting review": [lambda u=u: inpainting_review.review(u, "jacket") for u in upscaled],
+    }
+    base = f"http://127.0.0.1:{args.port}"
+    gemini.generate_sync(image_gen_review.REVIEW_MODEL, "warm-up")   # gateway loop and connection
+    for name, calls in cases.items():
+        requests.post(f"{base}/reset", timeout=5)
+        gemini_files._files._handles.clear()
+        review_images._images._memo.clear()
+        latencies = []
+        for call in calls:
+            start = time.perf_counter()
+            assert call()["passed"]
+            latencies.append(time.perf_counter() - start)
+        s = requests.get(f"{base}/stats", timeout=5).json()
+        wire_kb = (s["generate_bytes"] + s["upload_bytes"]) / len(calls) / 1024
+        print(f"  {args.child:<6} {name:<18} {wire_kb:7.0f} KB per review   p50 {statistics.median(latencies) * 1000:5.0f} ms")
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Pipeline state reads with a large history, per backend.
+
+Seeds --pipelines pipelines through orchestration.state, leaving one in 50
+running (2k of 100k) and the rest completed, then times the three calls the
+dashboard polls:
+
+- list_pipelines(50)    the pipelines page
+- get_queue_counts()    the queue badges
+- get_pipeline(id)      a status poll for a random pipeline
+
+on the sqlite and memory backends. For comparison the same calls are timed on
+the old module-level dict, which sorted every record for list_pipelines and
+scanned every record for get_queue_counts under one lock.
+
+orchestration.state binds its backend at import, so each backend is measured
+in its own child process with PIPELINE_STATE_BACKEND set and a throwaway
+PIPELINE_DB_PATH.
+
+    cd backend/pipeline
+    python tests/bench_state_backend.py --pipelines 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+BACKENDS = ("old", "memory", "sqlite")
+
+
+class OldDictState:
+    """The pre-backend orchestration.state: one dict, one lock, full scans."""
+
+    def __init__(self):
+        self._pipelines: dict = {}
+        self._lock = threading.Lock()
+
+    def create(self, record: dict):
+        with self._lock:
+            self._pipelines[record["pipeline_id"]] = record
+
+    def update(self, pipeline_id: str, fields: dict):
+        with self._lock:
+            if pipeline_id in self._pipelines:
+                self._pipelines[pipeline_id].update(fields)
+
+    def get_pipeline(self, pipeline_id: str) -> dict | None:
+        with self._lock:
+            p = self._pipelines.get(pipeline_id)
+            return dict(p) if p else None
+
+    def list_pipelines(self, limit: int = 50) -> list:
+        with self._lock:
+            items = list(self._pipelines.values())
+        items.sort(key=lambda p: p["created_at"], reverse=True)
+        return [dict(p) for p in items[:limit]]
+
+    def get_queue_counts(self) -> dict:
+        counts = {"lora_z_turbo": 0, "z_turbo": 0, "masking": 0, "inpainting": 0}
+        with self._lock:
+            for p in self._pipelines.values():
+                if p["status"] != "running":
+                    continue
+                node = p.get("current_node")
+                if node == "image_gen":
+                    counts["lora_z_turbo" if p.get("mode") == "template" else "z_turbo"] += 1
+                elif node in ("masking", "inpainting"):
+                    counts[node] += 1
+        return counts
+
+
+def _time(fn, iterations: int) -> tuple[float, float]:
+    """(p50, p95) of fn() in milliseconds."""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95)]
+
+
+def _child(backend: str, pipelines: int, iterations: int):
+    from orchestration import state
+
+    rng = random.Random(7)
+    old = OldDictState() if backend == "old" else None
+    done = {"status": "completed", "current_node": "done", "image_gen_result": {"r2_path": "r2://bench/out.png"}}
+
+    start = time.monotonic()
+    ids = []
+    for i in range(pipelines):
+        pid = state.create_pipeline(
+            f"subject {i}", rng.choice(["template", "no_template"]), "r2://bench/product.png", lora_name="bench",
+        )
+        if old is not None:
+            old.create(state.get_pipeline(pid))
+        if i % 50 and old is not None:
+            old.update(pid, dict(done))
+        elif i % 50:
+            state.update_pipeline(pid, **done)
+        ids.append(pid)
+    seed_s = time.monotonic() - start
+
+    api = old if old is not None else state
+    counts = api.get_queue_counts()
+    assert sum(counts.values()) == pipelines // 50, counts
+    assert len(api.list_pipelines(50)) == 50
+
+    calls = [
+        ("list_pipelines(50)", lambda: api.list_pipelines(50)),
+        ("get_queue_counts()", api.get_queue_counts),
+        ("get_pipeline(id)", lambda: api.get_pipeline(rng.choice(ids))),
+    ]
+    print(f"{backend:<7} seeded {pipelines} pipelines ({sum(counts.values())} running) in {seed_s:.1f}s")
+    for name, fn in calls:
+        p50, p95 = _time(fn, iterations)
+        print(f"  {name:<20} p50 {p50:8.3f} ms   p95 {p95:8.3f} ms")
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pipelines", type=int, default=100_000)
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per read")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help=f"comma-separated subset of {BACKENDS}")
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return _child(args.child, args.pipelines, args.iterations)
+
+    for backend in args.backends.split(","):
+        with tempfile.TemporaryDirectory(prefix="state-bench-") as tmp:
+            env = dict(
+                os.environ,
+                PIPELINE_STATE_BACKEND="memory" if backend == "old" else backend,
+                PIPELINE_DB_PATH=os.path.join(tmp, "pipelines.db"),
+            )
+            subprocess.run([
+                sys.executable, os.path.abspath(__file__), "--child", backend,
+                "--pipelines", str(args.pipelines), "--iterations", str(args.iterations),
+            ], env=env, check=True)
+
+
+if __name__ == "__main__":
+    main()
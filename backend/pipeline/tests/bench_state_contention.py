@@ -0,0 +1,174 @@
+"""
+Pipeline state under write contention: many step writers, a few pollers.
+
+--writers threads call update_agent_step on random pipelines as fast as they
+can, as the engine's nodes do, while --readers threads loop over the
+dashboard's read round: get_pipeline, list_pipelines(50), get_queue_counts.
+Runs for --seconds against each backend, swapped in under
+orchestration.state:
+
+- single lock   the memory backend before lock striping: one lock around
+                every read and write, steps edited in place
+- 1 stripe      the current memory backend with a single stripe: snapshots
+                and lock-free reads, but every writer on one lock
+- striped       the current memory backend (LOCK_STRIPES stripes)
+- sqlite        the sqlite backend on a throwaway file
+
+and prints step writes per second, writes that failed, and read round
+p50/p99.
+
+    cd backend/pipeline
+    python tests/bench_state_contention.py --writers 300 --readers 20
+"""
+import argparse
+import copy
+import heapq
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+os.environ.setdefault("PIPELINE_STATE_BACKEND", "memory")   # keep the import from opening data/pipelines.db
+
+
+class SingleLockBackend:
+    """The memory backend before lock striping, for comparison."""
+
+    def __init__(self):
+        self._pipelines: dict = {}
+        self._lock = threading.Lock()
+
+    def create(self, record: dict):
+        with self._lock:
+            self._pipelines[record["pipeline_id"]] = copy.deepcopy(record)
+
+    def update(self, pipeline_id: str, fields: dict):
+        with self._lock:
+            if pipeline_id in self._pipelines:
+                self._pipelines[pipeline_id].update(fields)
+
+    def update_step(self, pipeline_id: str, steps_field: str, key: str, status: str, label: str | None, reason: str | None):
+        with self._lock:
+            p = self._pipelines.get(pipeline_id)
+            if not p:
+                return
+            for step in p.get(steps_field, []):
+                if step["key"] == key:
+                    step["status"] = status
+                    if label is not None:
+                        step["label"] = label
+                    if reason is not None:
+                        step["reason"] = reason
+                    elif status != "failed":
+                        step.pop("reason", None)
+                    break
+
+    def get(self, pipeline_id: str) -> dict | None:
+        with self._lock:
+            p = self._pipelines.get(pipeline_id)
+            return dict(p) if p else None
+
+    def list(self, limit: int) -> list:
+        with self._lock:
+            items = heapq.nlargest(limit, self._pipelines.values(), key=lambda p: p["created_at"])
+            return [dict(p) for p in items]
+
+    def running_counts(self) -> list:
+        with self._lock:
+            counts = Counter(
+                (p.get("current_node"), p.get("mode"))
+                for p in self._pipelines.values()
+                if p["status"] == "running"
+            )
+        return [(node, mode, n) for (node, mode), n in counts.items()]
+
+    def in_flight(self) -> list:
+        with self._lock:
+            running = [p for p in self._pipelines.values() if p["status"] == "running"]
+        return [p["pipeline_id"] for p in sorted(running, key=lambda p: p["created_at"])]
+
+
+def _contend(state, args) -> tuple[float, int, list[float]]:
+    """Returns (step writes per second, failed writes, sorted read round seconds)."""
+    ids = [state.create_pipeline("subject", "template", "r2://bench/p.png", preview_image_url="u") for _ in range(args.pipelines)]
+    for pid in ids[::2]:
+        state.update_pipeline(pid, status="completed", current_node="done")
+
+    go, stop = threading.Event(), threading.Event()
+    writes, failed, reads = [0], [0], []
+    count_lock = threading.Lock()
+
+    def writer():
+        rng, n, errors = random.Random(), 0, 0
+        go.wait()
+        while not stop.is_set():
+            try:
+                state.update_agent_step(rng.choice(ids), rng.choice(["prompt", "submit", "quality", "character"]), "running")
+                n += 1
+            except Exception:   # sqlite: "database is locked" once busy_timeout runs out
+                errors += 1
+        with count_lock:
+            writes[0] += n
+            failed[0] += errors
+
+    def reader():
+        rng, rounds = random.Random(), []
+        go.wait()
+        while not stop.is_set():
+            start = time.perf_counter()
+            state.get_pipeline(rng.choice(ids))
+            state.list_pipelines(50)
+            state.get_queue_counts()
+            rounds.append(time.perf_counter() - start)
+        with count_lock:
+            reads.extend(rounds)
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for t in threads:
+        t.start()
+    go.set()   # start together; starting threads one by one among busy ones takes minutes
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return writes[0] / args.seconds, failed[0], sorted(reads)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=300)
+    parser.add_argument("--readers", type=int, default=20)
+    parser.add_argument("--pipelines", type=int, default=2000, help="half of them left running")
+    parser.add_argument("--seconds", type=float, default=5.0, help="per backend")
+    args = parser.parse_args()
+
+    from orchestration import state
+    from orchestration.backends.memory import LOCK_STRIPES, MemoryBackend
+    from orchestration.backends.sqlite import SQLiteBackend
+
+    tmp = tempfile.mkdtemp(prefix="state-contention-")
+    backends = [
+        ("single lock", SingleLockBackend),
+        ("1 stripe", lambda: MemoryBackend(stripes=1)),
+        (f"striped ({LOCK_STRIPES})", MemoryBackend),
+        ("sqlite", lambda: SQLiteBackend(os.path.join(tmp, "pipelines.db"))),
+    ]
+    print(f"{args.writers} step writers, {args.readers} readers, {args.pipelines} pipelines, {args.seconds:.0f}s each")
+    print(f"  {'backend':<14} {'step writes/s':>14} {'failed':>7} {'read rounds/s':>14} {'read p50':>10} {'read p99':>10}")
+    for name, factory in backends:
+        state._backend = factory()
+        per_second, failed, reads = _contend(state, args)
+        p50 = reads[len(reads) // 2] * 1000
+        p99 = reads[int(len(reads) * 0.99)] * 1000
+        print(f"  {name:<14} {per_second:>14,.0f} {failed:>7} {len(reads) / args.seconds:>14,.0f} {p50:>8.2f}ms {p99:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
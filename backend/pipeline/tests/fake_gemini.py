@@ -0,0 +1,181 @@
+"""
+Local Gemini API stand-in for the gateway, Files API and review tests.
+
+Answers models/{model}:generateContent like the real API after --latency
+seconds, with two failure modes:
+- more than --rps calls in any one-second window get 429 RESOURCE_EXHAUSTED
+  with a RetryInfo delay, as the real quota does
+- a random --error-rate fraction of the admitted calls get 503 UNAVAILABLE
+
+The reply echoes the request's text, so callers can tell answers apart, or
+is the fixed --reply text (e.g. a review verdict in JSON).
+
+The Files API's resumable upload is served as google-genai drives it:
+POST /upload/v1beta/files starts a session (x-goog-upload-url), the bytes are
+POSTed to that URL with "upload, finalize", and the reply carries the ACTIVE
+file with an expirationTime 48 h out. GET /v1beta/files/{id} returns it again.
+
+--uplink MB/s throttles every request body, as a slow uplink would, so the
+bytes a client sends show up in its latency.
+
+GET /stats returns call and byte counters (generateContent bodies and uploads
+apart); POST /reset clears them. POST /config {"fail_uploads": n} answers the
+next n upload starts with 503.
+
+    python tests/fake_gemini.py --port 8402 --rps 10 --latency 0.2 --error-rate 0.1
+"""
+import argparse
+import collections
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILE_TTL = 48 * 3600   # seconds the Files API keeps an upload
+
+_lock = threading.Lock()
+_recent: collections.deque = collections.deque()
+_stats = {
+    "calls": 0, "answered": 0, "rejected_429": 0, "rejected_503": 0, "generate_bytes": 0,
+    "uploads": 0, "upload_bytes": 0, "upload_failures": 0,
+}
+_files: dict[str, dict] = {}
+_config = {"fail_uploads": 0}
+
+
+def make_handler(rps: float, latency: float, error_rate: float, uplink: float = 0.0, reply: str | None = None):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, payload: dict, code: int = 200, headers: dict | None = None):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, code: int, status: str, message: str, details: list):
+            self._json({"error": {"code": code, "message": message, "status": status, "details": details}}, code)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                with _lock:
+                    return self._json(dict(_stats))
+            if self.path.startswith("/v1beta/files/"):
+                file = _files.get(self.path.split("?")[0].rsplit("/", 1)[1])
+                return self._json(file) if file else self._error(404, "NOT_FOUND", "File not found.", [])
+            self._json({}, 404)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if uplink:
+                time.sleep(len(body) / uplink)
+            if self.path == "/reset":
+                with _lock:
+                    _recent.clear()
+                    for key in _stats:
+                        _stats[key] = 0
+                    _config["fail_uploads"] = 0
+                return self._json({})
+            if self.path == "/config":
+                with _lock:
+                    _config.update(json.loads(body))
+                return self._json({})
+            if self.path.startswith("/upload/v1beta/files"):
+                return self._start_upload(body)
+            if self.path.startswith("/upload-session/"):
+                return self._upload(self.path.rsplit("/", 1)[1], body)
+            if ":generateContent" not in self.path:
+                return self._json({}, 404)
+            request = json.loads(body or b"{}")
+
+            now = time.monotonic()
+            with _lock:
+                _stats["calls"] += 1
+                _stats["generate_bytes"] += len(body)
+                while _recent and now - _recent[0] > 1.0:
+                    _recent.popleft()
+                limited = rps and len(_recent) >= rps
+                failed = not limited and random.random() < error_rate
+                if limited:
+                    _stats["rejected_429"] += 1
+                elif failed:
+                    _stats["rejected_503"] += 1
+                else:
+                    _recent.append(now)
+            if limited:
+                retry = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "1s"}]
+                return self._error(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).", retry)
+            if failed:
+                return self._error(503, "UNAVAILABLE", "The model is overloaded. Please try again later.", [])
+
+            time.sleep(latency)
+            text = " ".join(p.get("text", "") for c in request.get("contents", []) for p in c.get("parts", []))
+            with _lock:
+                _stats["answered"] += 1
+            self._json({
+                "candidates": [{"content": {"role": "model", "parts": [{"text": reply or f"echo: {text}"}]}, "finishReason": "STOP"}],
+                "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": 1, "totalTokenCount": 2},
+            })
+
+        def _start_upload(self, body: bytes):
+            with _lock:
+                _stats["upload_bytes"] += len(body)
+                failing = _config["fail_uploads"] > 0
+                if failing:
+                    _config["fail_uploads"] -= 1
+                    _stats["upload_failures"] += 1
+            if failing:
+                return self._error(503, "UNAVAILABLE", "The service is currently unavailable.", [])
+            file_id = uuid.uuid4().hex[:12]
+            meta = json.loads(body or b"{}").get("file", {})
+            _files[file_id] = {
+                "name": f"files/{file_id}",
+                "displayName": meta.get("displayName", ""),
+                "mimeType": meta.get("mimeType", "application/octet-stream"),
+                "uri": f"http://{self.headers['Host']}/v1beta/files/{file_id}",
+                "state": "ACTIVE",
+                "expirationTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + FILE_TTL)),
+            }
+            self._json({}, headers={"x-goog-upload-url": f"http://{self.headers['Host']}/upload-session/{file_id}"})
+
+        def _upload(self, file_id: str, body: bytes):
+            if file_id not in _files:
+                return self._error(404, "NOT_FOUND", "Upload session not found.", [])
+            time.sleep(latency)
+            with _lock:
+                _stats["upload_bytes"] += len(body)
+                if "finalize" in self.headers.get("X-Goog-Upload-Command", ""):
+                    _stats["uploads"] += 1
+            _files[file_id]["sizeBytes"] = str(len(body))
+            self._json({"file": _files[file_id]}, headers={"X-Goog-Upload-Status": "final"})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8402)
+    parser.add_argument("--rps", type=float, default=10.0, help="calls per second before 429s (0: unlimited)")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per answered call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    parser.add_argument("--uplink", type=float, default=0.0, help="MB/s of simulated client uplink (0: unlimited)")
+    parser.add_argument("--reply", help="answer every call with this text instead of the echo")
+    args = parser.parse_args()
+
+    handler = make_handler(args.rps, args.latency, args.error_rate, args.uplink * (1 << 20), args.reply)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Local RunPod stand-in for the load tests.
+
+Implements the serverless calls the pipeline makes: POST /{endpoint}/run
+queues a job and GET /{endpoint}/status/{job_id} reports IN_QUEUE for
+QUEUE_SECONDS, IN_PROGRESS for a random 2–3 s (or the run-time range given
+after the port), then COMPLETED with
+delayTime / executionTime and an output image, like RunPod does.
+POST /{endpoint}/cancel/{job_id} stops a job; it reports CANCELLED from then on.
+
+GET /stats counts runs, status calls, cancels and GPU seconds (time jobs spent
+IN_PROGRESS, up to their completion or cancel).
+
+    python tests/fake_runpod.py 8400          # jobs run 2–3 s
+    python tests/fake_runpod.py 8400 2 8      # jobs run 2–8 s
+"""
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUEUE_SECONDS = 0.3
+MIN_SECONDS   = 2.0
+MAX_SECONDS   = 3.0
+
+_jobs: dict[str, tuple[float, float]] = {}
+_cancelled: set[str] = set()
+_run_seconds = [MIN_SECONDS, MAX_SECONDS]
+_lock = threading.Lock()
+_stats = {"runs": 0, "status_calls": 0, "cancels": 0, "gpu_seconds": 0.0}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real API
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, payload: dict, code: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if "/cancel/" in self.path:
+            return self._cancel(self.path.rsplit("/", 1)[1])
+        with _lock:
+            job_id = f"job-{len(_jobs)}"
+            _jobs[job_id] = (time.monotonic(), random.uniform(_run_seconds[0], _run_seconds[1]))
+            _stats["runs"] += 1
+            _stats["gpu_seconds"] += _jobs[job_id][1]   # taken back if the job is cancelled early
+        self._json({"id": job_id, "status": "IN_QUEUE"})
+
+    def _cancel(self, job_id: str):
+        with _lock:
+            job = _jobs.get(job_id)
+            if job is None:
+                return self._json({"error": "job not found"}, 404)
+            started, duration = job
+            ran = min(max(time.monotonic() - started - QUEUE_SECONDS, 0.0), duration)
+            if job_id not in _cancelled and ran < duration:
+                _cancelled.add(job_id)
+                _stats["cancels"] += 1
+                _stats["gpu_seconds"] -= duration - ran
+        self._json({"id": job_id, "status": "CANCELLED"})
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with _lock:
+                return self._json(dict(_stats))
+        job_id = self.path.rsplit("/", 1)[1]
+        with _lock:
+            _stats["status_calls"] += 1
+            job = _jobs.get(job_id)
+        if job is None:
+            return self._json({"error": "job not found"}, 404)
+        if job_id in _cancelled:
+            return self._json({"id": job_id, "status": "CANCELLED"})
+        started, duration = job
+        elapsed = time.monotonic() - started
+        if elapsed < QUEUE_SECONDS:
+            return self._json({"id": job_id, "status": "IN_QUEUE"})
+        if elapsed < QUEUE_SECONDS + duration:
+            return self._json({"id": job_id, "status": "IN_PROGRESS"})
+        self._json({
+            "id": job_id,
+            "status": "COMPLETED",
+            "delayTime": int(QUEUE_SECONDS * 1000),
+            "executionTime": int(duration * 1000),
+            "output": {"images": [{"r2_path": f"r2://fake/outputs/{job_id}.png"}]},
+        })
+
+
+def serve(port: int, min_seconds: float = MIN_SECONDS, max_seconds: float = MAX_SECONDS):
+    _run_seconds[:] = [min_seconds, max_seconds]
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve(int(sys.argv[1]) if len(sys.argv) > 1 else 8400, *(float(a) for a in sys.argv[2:4]))
@@ -0,0 +1,131 @@
+"""
+Local S3-compatible stand-in for the R2 benchmark.
+
+Just enough of the S3 REST API for get_object / put_object / head_object on
+path-style URLs, held in memory. With a cert and key it serves HTTPS, so a
+client that reconnects pays a real TLS handshake, as it would against R2.
+Request signatures and checksums are not checked.
+
+Test hooks outside the S3 API:
+- POST /_config {"latency": s, "fail": {key: n}} adds s seconds to every
+  request (a stand-in for the round trip to R2) and answers the next n PUTs
+  to key with 503 SlowDown
+- GET /_stats returns the PUT count per key; POST /_reset clears objects,
+  counts and config
+
+    python tests/fake_s3.py 8401 [cert.pem key.pem]
+"""
+import hashlib
+import json
+import ssl
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+_objects: dict[str, tuple[bytes, str]] = {}
+_puts: dict[str, int] = {}
+_config = {"latency": 0.0, "fail": {}}
+_lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, so pooled connections are reused
+
+    def log_message(self, *args):
+        pass
+
+    def _key(self) -> str:
+        return urlparse(self.path).path.lstrip("/")
+
+    def _reply(self, code: int, body: bytes = b"", headers: dict | None = None, head: bool = False):
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding") != "chunked":
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        # botocore streams uploads over HTTPS as aws-chunked: HTTP chunks plus a checksum trailer
+        data = bytearray()
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if size == 0:
+                break
+            data += self.rfile.read(size)
+            self.rfile.readline()
+        while self.rfile.readline() not in (b"\r\n", b""):
+            pass
+        return bytes(data)
+
+    def do_POST(self):
+        body = json.loads(self._body() or b"{}")
+        with _lock:
+            if self.path == "/_config":
+                _config["latency"] = body.get("latency", _config["latency"])
+                _config["fail"].update(body.get("fail", {}))
+            elif self.path == "/_reset":
+                _objects.clear()
+                _puts.clear()
+                _config.update(latency=0.0, fail={})
+            else:
+                return self._reply(501)
+        self._reply(200)
+
+    def do_PUT(self):
+        data = self._body()
+        key = self._key()
+        time.sleep(_config["latency"])
+        with _lock:
+            _puts[key] = _puts.get(key, 0) + 1
+            failing = _config["fail"].get(key, 0)
+            if failing:
+                _config["fail"][key] = failing - 1
+        if failing:
+            body = b"<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message></Error>"
+            return self._reply(503, body, {"Content-Type": "application/xml"})
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with _lock:
+            _objects[key] = (data, etag)
+        self._reply(200, headers={"ETag": etag})
+
+    def do_GET(self):
+        if self.path == "/_stats":
+            with _lock:
+                body = json.dumps({"puts": _puts}).encode()
+            return self._reply(200, body, {"Content-Type": "application/json"})
+        self._get(head=False)
+
+    def do_HEAD(self):
+        self._get(head=True)
+
+    def _get(self, head: bool):
+        time.sleep(_config["latency"])
+        with _lock:
+            entry = _objects.get(self._key())
+        if entry is None:
+            body = b"<Error><Code>NoSuchKey</Code></Error>"
+            return self._reply(404, body, {"Content-Type": "application/xml"}, head=head)
+        data, etag = entry
+        self._reply(200, data, {"ETag": etag, "Content-Type": "application/octet-stream"}, head=head)
+
+
+def serve(port: int, cert: str | None = None, key: str | None = None):
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    if cert:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        # Handshake in the handler thread, not in the accept loop
+        server.socket = context.wrap_socket(server.socket, server_side=True, do_handshake_on_connect=False)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    serve(int(args[0]) if args else 8401, *(args[1:3] or [None, None]))
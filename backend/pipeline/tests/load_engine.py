@@ -0,0 +1,129 @@
+"""
+Load test: thousands of simulated pipelines on the async engine.
+
+Each simulated pipeline runs image_gen → masking → inpainting the way
+orchestrator.run_pipeline does — inside engine.node() slots, submitting a
+RunPod job with runpod_poller.submit on the engine's worker pool and awaiting
+runpod_poller.wait — against tests/fake_runpod.py in a child process. Agents,
+reviews and R2 are left out; only the scheduling and polling are exercised.
+
+The process's thread count is sampled throughout and must stay fixed however
+many pipelines are in flight.
+
+    cd backend/pipeline
+    python tests/load_engine.py --pipelines 3000 --concurrency 1000
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+NODES = ("image_gen", "masking", "inpainting")
+
+
+def _wait_for_port(port: int, timeout: float = 10.0):
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"fake RunPod did not start on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pipelines", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=1000, help="PIPELINE_MAX_CONCURRENT")
+    parser.add_argument("--node-limit", type=int, default=500, help="per-node cap")
+    parser.add_argument("--worker-threads", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8400)
+    args = parser.parse_args()
+
+    os.environ["RUNPOD_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, "fake_runpod.py"), str(args.port)])
+    try:
+        _wait_for_port(args.port)
+        _run(args)
+    finally:
+        server.terminate()
+
+
+def _run(args):
+    import requests
+
+    from infra import runpod_poller
+    from orchestration.engine import Engine
+
+    engine = Engine(
+        max_pipelines=args.concurrency,
+        node_limits={name: args.node_limit for name in NODES},
+        worker_threads=args.worker_threads,
+    )
+    done = {name: 0 for name in NODES}
+
+    async def pipeline(index: int):
+        for name in NODES:
+            async with engine.node(name):
+                job_id = await asyncio.to_thread(runpod_poller.submit, f"fake-{name}", {"pipeline": index})
+                data = await runpod_poller.wait(f"fake-{name}", job_id)
+                if data.get("status") != "COMPLETED":
+                    raise RuntimeError(f"pipeline {index} {name}: {data.get('status')}")
+            done[name] += 1
+
+    baseline = threading.active_count()
+    peak = [baseline]
+    running = True
+
+    def sample():
+        while running:
+            peak[0] = max(peak[0], threading.active_count())
+            time.sleep(0.1)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    start = time.monotonic()
+    futures = [engine.submit(pipeline(i)) for i in range(args.pipelines)]
+    last_report = 0.0
+    while not all(f.done() for f in futures):
+        time.sleep(0.5)
+        now = time.monotonic() - start
+        if now - last_report >= 5:
+            last_report = now
+            stats = engine.stats()
+            print(f"  t={now:5.1f}s  running={stats['running']:4d}  queued={stats['queued']:4d}  "
+                  f"done image_gen={done['image_gen']} masking={done['masking']} "
+                  f"inpainting={done['inpainting']}  threads={threading.active_count()}")
+    elapsed = time.monotonic() - start
+    running = False
+    sampler.join()
+
+    failed = [f.exception() for f in futures if f.exception() is not None]
+    server_stats = requests.get(f"{runpod_poller.RUNPOD_BASE_URL}/stats", timeout=5).json()
+    print()
+    print(f"pipelines:        {args.pipelines} ({len(failed)} failed) in {elapsed:.1f}s "
+          f"= {args.pipelines / elapsed:.1f} pipelines/s")
+    print(f"RunPod jobs:      {server_stats['runs']}  status calls: {server_stats['status_calls']} "
+          f"({server_stats['status_calls'] / max(server_stats['runs'], 1):.2f} per job)")
+    print(f"threads:          {baseline} before, peak {peak[0]} during "
+          f"(engine pool {args.worker_threads}, poller pool {runpod_poller.HTTP_WORKERS})")
+
+    assert not failed, failed[:3]
+    assert done["inpainting"] == args.pipelines
+    # Loop threads + both pools + the sampler; nothing scales with the pipeline count
+    bound = baseline + 2 + args.worker_threads + runpod_poller.HTTP_WORKERS + 1
+    assert peak[0] <= bound, f"thread count {peak[0]} exceeded {bound}"
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
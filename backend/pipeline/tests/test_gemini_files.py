@@ -0,0 +1,189 @@
+"""
+infra.gemini_files against the Files API of tests/fake_gemini.py.
+
+Checks that part():
+- uploads an image once per sha256, however many threads ask for it at once
+  or one after the other, and hands out the same file URI every time
+- reuses a handle until EXPIRY_MARGIN before the file's expirationTime, then
+  uploads the bytes again
+- inlines images under GEMINI_FILES_MIN_KB without uploading them
+- inlines an image whose upload fails, and uploads it on the next call
+
+then measures bytes on the wire per pipeline, all images inline (before) vs
+through part() (after). A pipeline is modelled as the generateContent calls
+the nodes make and the images each one carries; the ADK agents re-send their
+task images on every turn:
+
+- image_gen, 2 attempts: quality review [image], character review
+  [preview, image]
+- masking agent: AGENT_TURNS turns with [scene, product]; 2 mask reviews
+  [mask, product]
+- inpainting agent: AGENT_TURNS turns with [masked scene, product];
+  2 result reviews [result]
+
+The product and template preview are the same in every pipeline; the other
+images are new each time. Images are incompressible random bytes of
+--image-kb KB.
+
+    cd backend/pipeline
+    python tests/test_gemini_files.py
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+AGENT_TURNS = 6   # submit, review, submit, review, complete_task, final answer
+MODEL = "fake-review"
+
+
+def _wait_for_port(port: int, timeout: float = 10.0):
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"fake Gemini did not start on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pipelines", type=int, default=3)
+    parser.add_argument("--image-kb", type=int, default=1400, help="size of each image")
+    parser.add_argument("--port", type=int, default=8405)
+    args = parser.parse_args()
+
+    os.environ.update(GOOGLE_GEMINI_BASE_URL=f"http://127.0.0.1:{args.port}", GEMINI_API_KEY="fake")
+    server = subprocess.Popen([
+        sys.executable, os.path.join(HERE, "fake_gemini.py"), "--port", str(args.port), "--rps", "0", "--latency", "0.05",
+    ])
+    try:
+        _wait_for_port(args.port)
+        _run(args)
+    finally:
+        server.terminate()
+
+
+def _run(args):
+    import requests
+    from google.genai import types
+
+    from infra import gemini, gemini_files
+    from tests.fake_gemini import FILE_TTL
+
+    base = os.environ["GOOGLE_GEMINI_BASE_URL"]
+    image_size = args.image_kb << 10
+
+    def server_stats() -> dict:
+        return requests.get(f"{base}/stats", timeout=5).json()
+
+    def uri(part: types.Part) -> str | None:
+        return part.file_data.file_uri if part.file_data else None
+
+    # 1. One upload per sha, shared by concurrent and later callers
+    requests.post(f"{base}/reset", timeout=5)
+    files = gemini_files.GeminiFiles()
+    image = os.urandom(image_size)
+    barrier = threading.Barrier(8)
+
+    def concurrent_part(_):
+        barrier.wait()
+        return files.part(image, "image/jpeg")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        parts = list(pool.map(concurrent_part, range(8)))
+    parts += [files.part(image, "image/jpeg") for _ in range(4)]
+    stats = files.stats()
+    assert server_stats()["uploads"] == 1 and stats["uploads"] == 1, (server_stats(), stats)
+    assert len({uri(p) for p in parts}) == 1 and uri(parts[0]), [uri(p) for p in parts]
+    assert stats["reuses"] == 11 and stats["coalesced"] > 0, stats   # a coalesced call counts as a reuse too
+    print(f"one sha, 8 concurrent + 4 later calls: 1 upload, {stats['reuses']} reused "
+          f"({stats['coalesced']} waiting on the upload), one URI")
+
+    # 2. Reused until EXPIRY_MARGIN before expiry, then uploaded again
+    margin = gemini_files.EXPIRY_MARGIN
+    try:
+        gemini_files.EXPIRY_MARGIN = FILE_TTL + 60   # every handle is now inside the margin
+        stale = files.part(image, "image/jpeg")
+    finally:
+        gemini_files.EXPIRY_MARGIN = margin
+    fresh = files.part(image, "image/jpeg")
+    assert files.stats()["uploads"] == 2 and server_stats()["uploads"] == 2
+    assert uri(stale) != uri(parts[0]) and uri(fresh) == uri(stale)
+    print("handle inside the expiry margin: uploaded again, the new handle reused after")
+
+    # 3. Small images stay inline
+    small = os.urandom(gemini_files.MIN_BYTES - 1)
+    part = files.part(small, "image/png")
+    assert part.inline_data and part.inline_data.data == small and server_stats()["uploads"] == 2
+    print(f"{len(small)} bytes (< GEMINI_FILES_MIN_KB): inlined, no upload")
+
+    # 4. A failed upload falls back to inline and is not remembered
+    other = os.urandom(image_size)
+    requests.post(f"{base}/config", json={"fail_uploads": 1}, timeout=5)
+    part = files.part(other, "image/jpeg")
+    assert part.inline_data and part.inline_data.data == other
+    assert files.stats()["upload_failures"] == 1 and server_stats()["upload_failures"] == 1
+    assert uri(files.part(other, "image/jpeg")) and files.stats()["uploads"] == 3
+    print("upload answered 503: inlined, uploaded on the next call")
+
+    # 5. Bytes on the wire per pipeline
+    def pipeline(send):
+        new = lambda: os.urandom(image_size)   # noqa: E731
+        for _ in range(2):
+            generated = new()
+            send([generated])
+            send([preview, generated])
+        scene, masks = new(), [new(), new()]
+        for _ in range(AGENT_TURNS):
+            send([scene, product])
+        for mask in masks:
+            send([mask, product])
+        masked, results = new(), [new(), new()]
+        for _ in range(AGENT_TURNS):
+            send([masked, product])
+        for result in results:
+            send([result])
+
+    def sender(to_part):
+        def send(images: list[bytes]):
+            gemini.generate_sync(MODEL, [*(to_part(data) for data in images), "Review these images."])
+        return send
+
+    product, preview = os.urandom(image_size), os.urandom(image_size)
+    after_files = gemini_files.GeminiFiles()
+    modes = [
+        ("before: all inline", sender(lambda data: types.Part.from_bytes(data=data, mime_type="image/jpeg"))),
+        ("after: gemini_files", sender(lambda data: after_files.part(data, "image/jpeg"))),
+    ]
+    totals = {}
+    print(f"\nbytes on the wire per pipeline ({args.pipelines} pipelines, {args.image_kb} KB images):")
+    for name, send in modes:
+        requests.post(f"{base}/reset", timeout=5)
+        start = time.monotonic()
+        for _ in range(args.pipelines):
+            pipeline(send)
+        seconds = time.monotonic() - start
+        s = server_stats()
+        per = lambda n: n / args.pipelines / (1 << 20)   # noqa: E731
+        totals[name] = per(s["generate_bytes"] + s["upload_bytes"])
+        print(f"  {name:<20} {totals[name]:6.1f} MB  (generateContent {per(s['generate_bytes']):.2f} MB, "
+              f"uploads {per(s['upload_bytes']):.2f} MB in {s['uploads'] / args.pipelines:.1f} files; "
+              f"{s['calls'] / args.pipelines:.0f} calls, {seconds / args.pipelines:.2f}s)")
+    before, after = totals.values()
+    print(f"  {before / after:.1f}x fewer bytes")
+    assert after < before / 3, totals
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+infra.gemini gateway against tests/fake_gemini.py.
+
+The fake answers --rps calls per second and 429s the rest, and fails a few
+calls with 503. The same burst of calls from worker threads is sent:
+
+1. straight to a genai.Client, as every module used to — for comparison
+2. through the gateway with the bucket under the fake's quota
+3. through the gateway with the bucket 4x over it, so 429s happen and the
+   bucket is drained and retried
+4. with only 10 distinct prompts all in flight at once, so they coalesce
+5. through the async generate() API from an event loop
+
+With the bucket at or under the quota every call must succeed. A bucket set
+over the quota leans on 429 retries alone and may exhaust GEMINI_MAX_ATTEMPTS
+for a few calls; it must still fail far fewer than the direct client. Queue
+depth and latency come from gemini.stats().
+
+    cd backend/pipeline
+    python tests/test_gemini_gateway.py
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+def _wait_for_port(port: int, timeout: float = 10.0):
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"fake Gemini did not start on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=100, help="calls per scenario")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--rps", type=float, default=10.0, help="the fake's quota")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8402)
+    args = parser.parse_args()
+
+    os.environ.update(GOOGLE_GEMINI_BASE_URL=f"http://127.0.0.1:{args.port}", GEMINI_API_KEY="fake")
+    server = subprocess.Popen([
+        sys.executable, os.path.join(HERE, "fake_gemini.py"), "--port", str(args.port),
+        "--rps", str(args.rps), "--error-rate", str(args.error_rate),
+    ])
+    try:
+        _wait_for_port(args.port)
+        _run(args)
+    finally:
+        server.terminate()
+
+
+def _run(args):
+    import requests
+    from google import genai
+
+    from infra import gemini
+
+    base = os.environ["GOOGLE_GEMINI_BASE_URL"]
+
+    def burst(call, prompts, threads: int = args.threads) -> tuple[int, float, int]:
+        """Run call(prompt) for every prompt on the thread pool. Returns (failures, seconds, peak queue depth)."""
+        requests.post(f"{base}/reset", timeout=5)
+        peak, running = [0], [True]
+
+        def sample():
+            while running[0]:
+                peak[0] = max(peak[0], gemini.stats()["queue_depth"])
+                time.sleep(0.05)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        failures = 0
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for future in [pool.submit(call, prompt) for prompt in prompts]:
+                try:
+                    assert future.result().text.startswith("echo: ")
+                except Exception:
+                    failures += 1
+        running[0] = False
+        sampler.join()
+        return failures, time.monotonic() - start, peak[0]
+
+    def report(name: str, model: str | None, failures: int, seconds: float, peak: int | None):
+        server = requests.get(f"{base}/stats", timeout=5).json()
+        print(f"{name}")
+        print(f"  {args.calls} calls: {failures} failed, {seconds:.1f}s; fake saw {server['calls']} requests, "
+              f"{server['rejected_429']} x 429, {server['rejected_503']} x 503")
+        if model:
+            m = gemini.stats()["models"][model]
+            latency = m["latency_s"]
+            print(f"  gateway: requests={m['requests']} retries={m['retries']} coalesced={m['coalesced']} "
+                  f"rate_limited={m['rate_limited']} peak queue depth={'-' if peak is None else peak} "
+                  f"avg queue wait={m['avg_queue_wait_s']}s "
+                  f"avg latency={latency['sum'] / max(latency['count'], 1):.3f}s")
+        return server
+
+    prompts = [f"review image {i}" for i in range(args.calls)]
+    quota_rpm = args.rps * 60
+
+    # 1. One genai.Client, no limits or retries of ours
+    client = genai.Client(api_key="fake")
+    direct = burst(lambda p: client.models.generate_content(model="direct", contents=p), prompts)
+    report("direct genai.Client (old)", None, *direct)
+    assert direct[0] > 0, "the fake's quota was never hit; lower --rps"
+
+    # 2. Gateway, bucket at 90% of the quota
+    gemini.MODEL_RPM["under-quota"] = quota_rpm * 0.9
+    result = burst(lambda p: gemini.generate_sync("under-quota", p), prompts)
+    report("gateway, bucket under the quota", "under-quota", *result)
+    assert result[0] == 0
+
+    # 3. Gateway, bucket 4x over the quota: 429s drain the bucket and are retried
+    gemini.MODEL_RPM["over-quota"] = quota_rpm * 4
+    result = burst(lambda p: gemini.generate_sync("over-quota", p), prompts)
+    report("gateway, bucket 4x over the quota", "over-quota", *result)
+    assert result[0] <= direct[0] // 10, (result[0], direct[0])
+    assert gemini.stats()["models"]["over-quota"]["rate_limited"] > 0
+
+    # 4. Coalescing: 10 distinct prompts, every call in flight at once
+    gemini.MODEL_RPM["coalesce"] = quota_rpm * 0.9
+    repeated = [f"review image {i % 10}" for i in range(args.calls)]
+    result = burst(lambda p: gemini.generate_sync("coalesce", p), repeated, threads=args.calls)
+    server = report("gateway, 10 distinct prompts", "coalesce", *result)
+    assert result[0] == 0
+    assert server["answered"] < args.calls // 2, server
+    assert gemini.stats()["models"]["coalesce"]["coalesced"] > 0
+
+    # 5. The async API from an event loop
+    gemini.MODEL_RPM["async"] = quota_rpm * 0.9
+    requests.post(f"{base}/reset", timeout=5)
+
+    async def many():
+        return await asyncio.gather(*(gemini.generate("async", p) for p in prompts), return_exceptions=True)
+
+    start = time.monotonic()
+    responses = asyncio.run(many())
+    failures = sum(isinstance(r, Exception) for r in responses)
+    report("gateway, async generate()", "async", failures, time.monotonic() - start, None)
+    assert failures == 0
+
+    stats = gemini.stats()
+    assert stats["queue_depth"] == 0 and stats["in_flight"] == 0, stats
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -77,4 +77,13 @@ def serve_template_image(filename):
         return jsonify({"error": "Image not found"}), 404
     ext = os.path.splitext(filepath)[1].lower()
     mimetypes = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
-    return send_file(filepath, mimetype=mimetypes.get(ext, "application/octet-stream"))
+    # ETag + Last-Modified with no-cache: clients (the pipeline's preview cache)
+    # revalidate with If-None-Match / If-Modified-Since and get a 304 when unchanged
+    return send_file(
+        filepath,
+        mimetype=mimetypes.get(ext, "application/octet-stream"),
+        conditional=True,
+        etag=True,
+        last_modified=os.path.getmtime(filepath),
+        max_age=None,
+    )
@@ -1,15 +1,12 @@
-import { useState, useEffect, useRef } from 'react'
+import { useState, useEffect } from 'react'
 import {
   uploadProductImage,
   submitPipeline,
-  listPipelines,
-  getPipelineQueues,
+  streamPipelines,
 } from '../services/api'
 import QueueDashboard from './QueueDashboard'
 import TemplateGrid from './TemplateGrid'
 
-const POLL_INTERVAL = 5000
-
 export default function PipelineTab() {
   const [queues, setQueues]           = useState(null)
   const [pipelines, setPipelines]     = useState([])
@@ -24,22 +21,9 @@ export default function PipelineTab() {
   const [runInpainting, setRunInpainting] = useState(true)
   const [submitting, setSubmitting]       = useState(false)
   const [submitError, setSubmitError]     = useState(null)
-  const pollRef = useRef(null)
 
-  // ── Polling ──────────────────────────────────────────────────────────────
-  async function refresh() {
-    try {
-      const [q, p] = await Promise.all([getPipelineQueues(), listPipelines()])
-      setQueues(q)
-      setPipelines(p)
-    } catch (_) {}
-  }
-
-  useEffect(() => {
-    refresh()
-    pollRef.current = setInterval(refresh, POLL_INTERVAL)
-    return () => clearInterval(pollRef.current)
-  }, [])
+  // ── Live updates (SSE; EventSource reconnects and resyncs on its own) ─────
+  useEffect(() => streamPipelines({ onPipelines: setPipelines, onQueues: setQueues }), [])
 
   // ── Product image upload ──────────────────────────────────────────────────
   async function handleFileChange(e) {
@@ -79,7 +63,6 @@ export default function PipelineTab() {
         run_masking:    runMasking,
         run_inpainting: runInpainting,
       })
-      await refresh()
     } catch (err) {
       setSubmitError(err.message)
     } finally {
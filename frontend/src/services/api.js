@@ -113,11 +113,11 @@ export async function uploadProductImage(file) {
   return res.json() // { r2_path, preview_url }
 }
 
-export async function submitPipeline({ subject, mode, product_r2, lora_name, keyword, template_name, preview_image_url, run_masking, run_inpainting }) {
+export async function submitPipeline({ subject, mode, product_r2, lora_name, keyword, template_name, preview_image_url, run_masking, run_inpainting, fan_out }) {
   const res = await fetch('/api/pipeline/submit', {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ subject, mode, product_r2, lora_name, keyword, template_name, preview_image_url, run_masking, run_inpainting }),
+    body: JSON.stringify({ subject, mode, product_r2, lora_name, keyword, template_name, preview_image_url, run_masking, run_inpainting, fan_out }),
   })
   if (!res.ok) {
     const err = await res.json().catch(() => ({}))
@@ -144,3 +144,52 @@ export async function getPipelineQueues() {
   if (!res.ok) throw new Error('Failed to get queue counts')
   return res.json()
 }
+
+// ── Pipeline progress streams (SSE) ──────────────────────────────────────────
+
+function applyStep(pipeline, { steps_field, key, status, label, reason }) {
+  const steps = (pipeline[steps_field] || []).map(step => {
+    if (step.key !== key) return step
+    const next = { ...step, status }
+    if (label != null) next.label = label
+    if (reason != null) next.reason = reason
+    else if (status !== 'failed') delete next.reason
+    return next
+  })
+  return { ...pipeline, [steps_field]: steps }
+}
+
+// Apply one streamed diff event to a pipeline record.
+export function applyPipelineEvent(pipeline, name, payload) {
+  if (name === 'patch') return { ...pipeline, ...payload.fields }
+  if (name === 'step')  return applyStep(pipeline, payload)
+  return pipeline
+}
+
+// Subscribe to the pipeline list + queue counts. Returns an unsubscribe function.
+export function streamPipelines({ onPipelines, onQueues, limit = 50 }) {
+  const source = new EventSource(`/api/pipeline/stream?limit=${limit}`)
+  let pipelines = []
+  source.addEventListener('snapshot', e => {
+    const data = JSON.parse(e.data)
+    pipelines = data.pipelines
+    onPipelines(pipelines)
+    onQueues(data.queues)
+  })
+  source.addEventListener('created', e => {
+    pipelines = [JSON.parse(e.data).pipeline, ...pipelines].slice(0, limit)
+    onPipelines(pipelines)
+  })
+  for (const name of ['patch', 'step']) {
+    source.addEventListener(name, e => {
+      const payload = JSON.parse(e.data)
+      if (!pipelines.some(p => p.pipeline_id === payload.pipeline_id)) return
+      pipelines = pipelines.map(p =>
+        p.pipeline_id === payload.pipeline_id ? applyPipelineEvent(p, name, payload) : p
+      )
+      onPipelines(pipelines)
+    })
+  }
+  source.addEventListener('queues', e => onQueues(JSON.parse(e.data)))
+  return () => source.close()
+}
@@ -1,32 +1,21 @@
 import runpod
 import requests
 import os
-import json
-import copy
 import time
 import random
 import uuid
-import boto3
-from botocore.config import Config
 
-WORKFLOW_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dual_lora_z_turbo_upscale_api.json")
+from worker_common import comfyui
+from worker_common.workflow import WorkflowTemplate
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workflow_params.json")
 
 COMFYUI_URL = "http://127.0.0.1:8188"
 
 R2_BUCKET = os.environ.get("R2_BUCKET", "")
 R2_OUTPUT_BUCKET = os.environ.get("R2_OUTPUT_BUCKET", R2_BUCKET)
 
-
-def _r2_client():
-    account_id = os.environ["R2_ACCOUNT_ID"].strip()
-    return boto3.client(
-        "s3",
-        endpoint_url=f"https://{account_id}.r2.cloudflarestorage.com",
-        aws_access_key_id=os.environ["R2_ACCESS_KEY_ID"].strip(),
-        aws_secret_access_key=os.environ["R2_SECRET_ACCESS_KEY"].strip(),
-        config=Config(signature_version="s3v4"),
-        region_name="auto",
-    )
+TEMPLATE = WorkflowTemplate.from_manifest(MANIFEST_PATH)
 
 
 def wait_for_comfyui(timeout=300):
@@ -59,96 +48,34 @@ def build_workflow(
     scale_by: float = 1.25,
     upscale_resolution: int = 2560,
 ) -> dict:
-    with open(WORKFLOW_PATH) as f:
-        workflow = copy.deepcopy(json.load(f))
-
-    # Style LoRA — node 30
-    workflow["30"]["inputs"]["lora_name"] = style_lora_name
-    workflow["30"]["inputs"]["strength_model"] = style_lora_strength
-    workflow["30"]["inputs"]["strength_clip"] = style_lora_strength
-
-    # Character LoRA — node 33 (chained after style LoRA)
-    workflow["33"]["inputs"]["lora_name"] = character_lora_name
-    workflow["33"]["inputs"]["strength_model"] = character_lora_strength
-    workflow["33"]["inputs"]["strength_clip"] = character_lora_strength
-
-    # Prompts — CLIPTextEncode nodes 28 (positive) and 29 (negative)
-    workflow["28"]["inputs"]["text"] = prompt
-    workflow["29"]["inputs"]["text"] = negative_prompt
-
-    # Image dimensions — EmptySD3LatentImage node 23
-    workflow["23"]["inputs"]["width"] = width
-    workflow["23"]["inputs"]["height"] = height
-
-    # LoRA generation KSampler — node 31
-    workflow["31"]["inputs"]["seed"] = seed
-    workflow["31"]["inputs"]["steps"] = steps
-    workflow["31"]["inputs"]["cfg"] = cfg
-    workflow["31"]["inputs"]["denoise"] = denoise
-
-    # Latent upscale refine KSampler — node 18
-    workflow["18"]["inputs"]["seed"] = seed
-    workflow["18"]["inputs"]["cfg"] = cfg
-    workflow["18"]["inputs"]["denoise"] = upscale_denoise
-
-    # LatentUpscaleBy — node 14
-    workflow["14"]["inputs"]["scale_by"] = scale_by
-
-    # SeedVR2 upscaler — node 20
-    workflow["20"]["inputs"]["seed"] = seed
-    workflow["20"]["inputs"]["resolution"] = upscale_resolution
-
-    return workflow
-
-
-def queue_workflow(workflow: dict) -> str:
-    r = requests.post(f"{COMFYUI_URL}/prompt", json={"prompt": workflow})
-    r.raise_for_status()
-    return r.json()["prompt_id"]
-
-
-def wait_for_job(prompt_id: str, timeout: int = 600) -> dict:
-    start = time.time()
-    while time.time() - start < timeout:
-        r = requests.get(f"{COMFYUI_URL}/history/{prompt_id}", timeout=10)
-        history = r.json()
-        if prompt_id in history:
-            job = history[prompt_id]
-            status = job.get("status", {})
-            if status.get("status_str") == "error":
-                messages = status.get("messages", [])
-                raise RuntimeError(f"ComfyUI job failed: {messages}")
-            return job
-        time.sleep(2)
-    raise TimeoutError(f"Job {prompt_id} timed out after {timeout}s")
+    return TEMPLATE.build(
+        style_lora_name=style_lora_name,
+        style_lora_strength=style_lora_strength,
+        character_lora_name=character_lora_name,
+        character_lora_strength=character_lora_strength,
+        prompt=prompt,
+        negative_prompt=negative_prompt,
+        width=width,
+        height=height,
+        seed=seed,
+        steps=steps,
+        cfg=cfg,
+        denoise=denoise,
+        upscale_denoise=upscale_denoise,
+        scale_by=scale_by,
+        upscale_resolution=upscale_resolution,
+    )
 
 
 def upload_images_to_r2(history: dict) -> list:
     """Fetch final upscaled image from SaveImage node 19 and upload to R2."""
-    client = _r2_client()
-    results = []
+    images = history["outputs"].get("19", {}).get("images", [])
+    keys = [f"generated/{uuid.uuid4()}_{img['filename']}" for img in images]
+    sources = comfyui.upload_outputs(list(zip(images, keys)), R2_OUTPUT_BUCKET, "image/png")
 
-    save_node_output = history["outputs"].get("19", {})
-    for img in save_node_output.get("images", []):
-        r = requests.get(
-            f"{COMFYUI_URL}/view",
-            params={
-                "filename": img["filename"],
-                "subfolder": img.get("subfolder", ""),
-                "type": img.get("type", "output"),
-            },
-            timeout=120,
-        )
-        r.raise_for_status()
-
-        key = f"generated/{uuid.uuid4()}_{img['filename']}"
-        client.put_object(
-            Bucket=R2_OUTPUT_BUCKET,
-            Key=key,
-            Body=r.content,
-            ContentType="image/png",
-        )
-        print(f"Uploaded result to R2: {R2_OUTPUT_BUCKET}/{key}")
+    results = []
+    for img, key, source in zip(images, keys, sources):
+        print(f"Uploaded result to R2: {R2_OUTPUT_BUCKET}/{key} (from {source})")
         results.append({
             "r2_path": f"r2://{R2_OUTPUT_BUCKET}/{key}",
             "key": key,
@@ -200,17 +127,20 @@ def handler(job):
     print(f"Using style LoRA: {style_lora_name} (strength={style_lora_strength})")
     print(f"Using character LoRA: {character_lora_name} (strength={character_lora_strength})")
 
-    workflow = build_workflow(
-        style_lora_name, character_lora_name, prompt, seed,
-        width, height, steps, cfg, denoise,
-        style_lora_strength, character_lora_strength,
-        negative_prompt, upscale_denoise, scale_by, upscale_resolution,
-    )
-
-    prompt_id = queue_workflow(workflow)
-    print(f"Queued workflow prompt_id={prompt_id}")
+    try:
+        workflow = build_workflow(
+            style_lora_name, character_lora_name, prompt, seed,
+            width, height, steps, cfg, denoise,
+            style_lora_strength, character_lora_strength,
+            negative_prompt, upscale_denoise, scale_by, upscale_resolution,
+        )
+    except ValueError as e:
+        return {"error": str(e)}
 
-    history = wait_for_job(prompt_id)
+    history = comfyui.run(
+        workflow, timeout=600,
+        on_progress=lambda progress: runpod.serverless.progress_update(job, progress),
+    )
     images = upload_images_to_r2(history)
 
     duration = round(time.time() - start_time, 2)
@@ -1,32 +1,21 @@
 import runpod
 import requests
 import os
-import json
-import copy
 import time
-import random
 import uuid
-import boto3
-from botocore.config import Config
 
-WORKFLOW_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DualLoraZTurboAPI.json")
+from worker_common import comfyui
+from worker_common.variants import check_image_count, resolve_variants
+from worker_common.workflow import WorkflowTemplate
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workflow_params.json")
 
 COMFYUI_URL = "http://127.0.0.1:8188"
 
 R2_BUCKET = os.environ.get("R2_BUCKET", "")
 R2_OUTPUT_BUCKET = os.environ.get("R2_OUTPUT_BUCKET", R2_BUCKET)
 
-
-def _r2_client():
-    account_id = os.environ["R2_ACCOUNT_ID"].strip()
-    return boto3.client(
-        "s3",
-        endpoint_url=f"https://{account_id}.r2.cloudflarestorage.com",
-        aws_access_key_id=os.environ["R2_ACCESS_KEY_ID"].strip(),
-        aws_secret_access_key=os.environ["R2_SECRET_ACCESS_KEY"].strip(),
-        config=Config(signature_version="s3v4"),
-        region_name="auto",
-    )
+TEMPLATE = WorkflowTemplate.from_manifest(MANIFEST_PATH)
 
 
 def wait_for_comfyui(timeout=300):
@@ -53,85 +42,34 @@ def build_workflow(
     lora_strength: float = 0.5,
     style_lora_strength: float = 0.5,
     negative_prompt: str = "",
+    batch_size: int = 1,
 ) -> dict:
-    with open(WORKFLOW_PATH) as f:
-        workflow = copy.deepcopy(json.load(f))
-
-    # LoRA node 30 — detailedSkin.safetensors (hardcoded)
-    workflow["30"]["inputs"]["lora_name"] = "detailedSkin.safetensors"
-    workflow["30"]["inputs"]["strength_model"] = style_lora_strength
-    workflow["30"]["inputs"]["strength_clip"] = style_lora_strength
-
-    # LoRA node 33 — detailedSkin2.safetensors (hardcoded)
-    workflow["33"]["inputs"]["lora_name"] = "detailedSkin2.safetensors"
-    workflow["33"]["inputs"]["strength_model"] = lora_strength
-    workflow["33"]["inputs"]["strength_clip"] = lora_strength
-
-    # Positive prompt — node 28
-    workflow["28"]["inputs"]["text"] = prompt
-
-    # Negative prompt — node 29
-    workflow["29"]["inputs"]["text"] = negative_prompt
-
-    # Image dimensions — EmptySD3LatentImage node 23
-    workflow["23"]["inputs"]["width"] = width
-    workflow["23"]["inputs"]["height"] = height
-
-    # KSampler — node 31
-    workflow["31"]["inputs"]["seed"] = seed
-    workflow["31"]["inputs"]["steps"] = steps
-    workflow["31"]["inputs"]["cfg"] = cfg
-    workflow["31"]["inputs"]["denoise"] = denoise
-
-    return workflow
-
-
-def queue_workflow(workflow: dict) -> str:
-    r = requests.post(f"{COMFYUI_URL}/prompt", json={"prompt": workflow})
-    r.raise_for_status()
-    return r.json()["prompt_id"]
-
-
-def wait_for_job(prompt_id: str) -> dict:
-    while True:
-        r = requests.get(f"{COMFYUI_URL}/history/{prompt_id}", timeout=10)
-        history = r.json()
-        if prompt_id in history:
-            job = history[prompt_id]
-            status = job.get("status", {})
-            if status.get("status_str") == "error":
-                messages = status.get("messages", [])
-                raise RuntimeError(f"ComfyUI job failed: {messages}")
-            return job
-        time.sleep(2)
+    return TEMPLATE.build(
+        style_lora_name="detailedSkin.safetensors",
+        style_lora_strength=style_lora_strength,
+        lora_name="detailedSkin2.safetensors",
+        lora_strength=lora_strength,
+        prompt=prompt,
+        negative_prompt=negative_prompt,
+        width=width,
+        height=height,
+        batch_size=batch_size,
+        seed=seed,
+        steps=steps,
+        cfg=cfg,
+        denoise=denoise,
+    )
 
 
 def upload_images_to_r2(history: dict) -> list:
     """Fetch generated images from SaveImage node 34 and upload to R2."""
-    client = _r2_client()
-    results = []
+    images = history["outputs"].get("34", {}).get("images", [])
+    keys = [f"generated/{uuid.uuid4()}_{img['filename']}" for img in images]
+    sources = comfyui.upload_outputs(list(zip(images, keys)), R2_OUTPUT_BUCKET, "image/png")
 
-    save_node_output = history["outputs"].get("34", {})
-    for img in save_node_output.get("images", []):
-        r = requests.get(
-            f"{COMFYUI_URL}/view",
-            params={
-                "filename": img["filename"],
-                "subfolder": img.get("subfolder", ""),
-                "type": img.get("type", "output"),
-            },
-            timeout=120,
-        )
-        r.raise_for_status()
-
-        key = f"generated/{uuid.uuid4()}_{img['filename']}"
-        client.put_object(
-            Bucket=R2_OUTPUT_BUCKET,
-            Key=key,
-            Body=r.content,
-            ContentType="image/png",
-        )
-        print(f"Uploaded result to R2: {R2_OUTPUT_BUCKET}/{key}")
+    results = []
+    for img, key, source in zip(images, keys, sources):
+        print(f"Uploaded result to R2: {R2_OUTPUT_BUCKET}/{key} (from {source})")
         results.append({
             "r2_path": f"r2://{R2_OUTPUT_BUCKET}/{key}",
             "key": key,
@@ -143,58 +81,73 @@ def upload_images_to_r2(history: dict) -> list:
 def handler(job):
     job_input = job["input"]
 
-    prompt = job_input.get("prompt")
-    seed = job_input.get("seed")
     width = job_input.get("width", 2048)
     height = job_input.get("height", 2048)
     steps = job_input.get("steps", 15)
     cfg = job_input.get("cfg", 1.0)
     denoise = job_input.get("denoise", 1.0)
-    lora_strength = job_input.get("lora_strength", 0.5)
-    style_lora_strength = job_input.get("style_lora_strength", 0.5)
     negative_prompt = job_input.get("negative_prompt", "")
+    batch_size = job_input.get("batch_size", 1)
 
-    if not prompt:
-        return {"error": "prompt is required"}
-
-    seed = random.randint(0, 2**32 - 1) if seed is None else int(seed)
     width = int(width)
     height = int(height)
     steps = int(steps)
     cfg = float(cfg)
     denoise = float(denoise)
-    lora_strength = float(lora_strength)
-    style_lora_strength = float(style_lora_strength)
+    batch_size = int(batch_size)
 
     start_time = time.time()
 
-    workflow = build_workflow(
-        prompt, seed, width, height, steps, cfg, denoise,
-        lora_strength, style_lora_strength, negative_prompt,
+    try:
+        variants = resolve_variants(job_input, {
+            "prompt": job_input.get("prompt"),
+            "seed": job_input.get("seed"),
+            "lora_strength": job_input.get("lora_strength", 0.5),
+            "style_lora_strength": job_input.get("style_lora_strength", 0.5),
+        }, float_keys=("lora_strength", "style_lora_strength"))
+        check_image_count(variants, batch_size)
+        workflows = [
+            build_workflow(
+                v["prompt"], v["seed"], width, height, steps, cfg, denoise,
+                v["lora_strength"], v["style_lora_strength"], negative_prompt, batch_size,
+            )
+            for v in variants
+        ]
+    except ValueError as e:
+        return {"error": str(e)}
+
+    for i, v in enumerate(variants):
+        print(f"Variant {i}: seed={v['seed']} batch_size={batch_size} "
+              f"LoRA node30=detailedSkin.safetensors (strength={v['style_lora_strength']}), "
+              f"node33=detailedSkin2.safetensors (strength={v['lora_strength']})")
+
+    # All variants are queued up front; each one's images upload while ComfyUI runs the next
+    histories = comfyui.run_many(
+        workflows, timeout=600,
+        on_progress=lambda progress: runpod.serverless.progress_update(job, progress),
     )
-
-    print(f"LoRA node30=detailedSkin.safetensors (strength={style_lora_strength}), node33=detailedSkin2.safetensors (strength={lora_strength})")
-
-    prompt_id = queue_workflow(workflow)
-    print(f"Queued workflow prompt_id={prompt_id}")
-
-    history = wait_for_job(prompt_id)
-    images = upload_images_to_r2(history)
+    images = []
+    for history, (i, v) in zip(histories, enumerate(variants)):
+        for batch_index, image in enumerate(upload_images_to_r2(history)):
+            images.append({**image, "variant": i, "seed": v["seed"], "batch_index": batch_index})
 
     duration = round(time.time() - start_time, 2)
+    first = variants[0]
     return {
         "images": images,
         "params": {
-            "prompt": prompt,
-            "seed": seed,
+            "prompt": first["prompt"],
+            "seed": first["seed"],
             "width": width,
             "height": height,
             "steps": steps,
             "cfg": cfg,
             "denoise": denoise,
-            "lora_strength": lora_strength,
-            "style_lora_strength": style_lora_strength,
+            "lora_strength": first["lora_strength"],
+            "style_lora_strength": first["style_lora_strength"],
             "negative_prompt": negative_prompt,
+            "batch_size": batch_size,
+            "variants": variants,
         },
         "duration_seconds": duration,
     }
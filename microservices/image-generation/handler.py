@@ -1,17 +1,17 @@
 import runpod
 import requests
 import os
-import json
-import copy
 import time
 import subprocess
 import random
 import socket
 import uuid
-import boto3
-from botocore.config import Config
 
-WORKFLOW_PATH = os.path.join(os.path.dirname(__file__), "LoraWorkflow.json")
+from worker_common import comfyui
+from worker_common.loras import LoraManager
+from worker_common.workflow import WorkflowTemplate
+
+MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "workflow_params.json")
 
 COMFYUI_URL = "http://127.0.0.1:8188"
 LORAS_DIR = "/comfyui/models/loras"
@@ -19,25 +19,14 @@ LORAS_DIR = "/comfyui/models/loras"
 R2_LORA_BUCKET = os.environ.get("R2_LORA_BUCKET", "test-ftp")
 R2_OUTPUT_BUCKET = os.environ.get("R2_OUTPUT_BUCKET", "test-ftp")
 
+TEMPLATE = WorkflowTemplate.from_manifest(MANIFEST_PATH)
 
-def _r2_client():
-    account_id = os.environ["R2_ACCOUNT_ID"].strip()
-    return boto3.client(
-        "s3",
-        endpoint_url=f"https://{account_id}.r2.cloudflarestorage.com",
-        aws_access_key_id=os.environ["R2_ACCESS_KEY_ID"].strip(),
-        aws_secret_access_key=os.environ["R2_SECRET_ACCESS_KEY"].strip(),
-        config=Config(signature_version="s3v4"),
-        region_name="auto",
-    )
-
-# Track which LoRAs were present when ComfyUI last started
-known_loras = set()
 comfyui_process = None  # Only tracked when we restart ComfyUI ourselves
 
 
 def start_comfyui():
-    global comfyui_process, known_loras
+    """Last resort when ComfyUI won't list a new LoRA — see LoraManager.register."""
+    global comfyui_process
 
     print("Killing existing ComfyUI processes...")
     subprocess.run(["pkill", "-9", "-f", "main.py"], capture_output=True)
@@ -65,10 +54,7 @@ def start_comfyui():
     )
 
     wait_for_comfyui()
-
-    # Record which LoRAs ComfyUI now knows about
-    known_loras = set(os.listdir(LORAS_DIR)) if os.path.exists(LORAS_DIR) else set()
-    print(f"ComfyUI ready. Known LoRAs: {known_loras}")
+    print("ComfyUI ready.")
 
 
 def wait_for_comfyui(timeout=300):
@@ -84,108 +70,53 @@ def wait_for_comfyui(timeout=300):
     raise TimeoutError("ComfyUI failed to start in time")
 
 
+LORAS = LoraManager(LORAS_DIR, COMFYUI_URL, restart=start_comfyui)
+
+
 def _build_workflow(prompt: str, width: int, height: int,
-                    steps: int, lora_scale: float,
+                    steps: int, lora_scale: float, lora_name: str,
                     seed: int | None = None,
                     guidance_scale: float | None = None,
-                    negative_prompt: str | None = None) -> dict:
-    """Load LoraWorkflow.json and inject runtime params."""
-    with open(WORKFLOW_PATH) as f:
-        workflow = copy.deepcopy(json.load(f))
-
+                    negative_prompt: str | None = None) -> tuple[dict, int]:
+    """Apply runtime params to the cached LoraWorkflow.json template."""
     actual_seed = seed if seed is not None else random.randint(0, 2**32 - 1)
-
-    positive_node_id = None
-    negative_node_id = None
-    for node in workflow.values():
-        if node.get("class_type") == "KSampler":
-            node["inputs"]["steps"] = steps
-            node["inputs"]["seed"] = actual_seed
-            if guidance_scale is not None:
-                node["inputs"]["cfg"] = guidance_scale
-            positive_node_id = str(node["inputs"]["positive"][0])
-            negative_node_id = str(node["inputs"]["negative"][0])
-
-    for node_id, node in workflow.items():
-        class_type = node.get("class_type")
-        if class_type == "CLIPTextEncode" and node_id == positive_node_id:
-            node["inputs"]["text"] = prompt
-        elif class_type == "CLIPTextEncode" and node_id == negative_node_id:
-            if negative_prompt is not None:
-                node["inputs"]["text"] = negative_prompt
-        elif class_type == "EmptyLatentImage":
-            node["inputs"]["width"] = width
-            node["inputs"]["height"] = height
-        elif class_type == "LoraLoader":
-            node["inputs"]["strength_model"] = lora_scale
-            node["inputs"]["strength_clip"] = lora_scale
-
+    workflow = TEMPLATE.build(
+        prompt=prompt,
+        negative_prompt=negative_prompt,
+        width=width,
+        height=height,
+        steps=steps,
+        seed=actual_seed,
+        guidance_scale=guidance_scale,
+        lora_name=lora_name,
+        lora_scale=lora_scale,
+    )
     return workflow, actual_seed
 
 
-def download_lora(lora_key: str) -> str:
-    """Download LoRA from Cloudflare R2 into the ComfyUI loras dir. Returns filename."""
+def _lora_location(lora_key: str) -> tuple[str, str]:
+    """(bucket, key) of a LoRA given as r2://bucket/key or a key in R2_LORA_BUCKET."""
     if lora_key.startswith("r2://"):
         parts = lora_key[5:].split("/", 1)
-        bucket = parts[0]
-        key = parts[1]
-    else:
-        bucket = R2_LORA_BUCKET
-        key = lora_key
-
-    filename = os.path.basename(key)
-    dest = os.path.join(LORAS_DIR, filename)
-
-    if not os.path.exists(dest):
-        print(f"Downloading LoRA from R2: bucket={bucket} key={key}")
-        os.makedirs(LORAS_DIR, exist_ok=True)
-        _r2_client().download_file(bucket, key, dest)
-        print(f"Downloaded: {filename}")
+        return parts[0], parts[1]
+    return R2_LORA_BUCKET, lora_key
 
-    return filename
 
-
-def queue_workflow(workflow):
-    r = requests.post(f"{COMFYUI_URL}/prompt", json={"prompt": workflow})
-    r.raise_for_status()
-    return r.json()["prompt_id"]
-
-
-def wait_for_job(prompt_id, timeout=600):
-    start = time.time()
-    while time.time() - start < timeout:
-        r = requests.get(f"{COMFYUI_URL}/history/{prompt_id}")
-        history = r.json()
-        if prompt_id in history:
-            return history[prompt_id]
-        time.sleep(1)
-    raise TimeoutError(f"Job {prompt_id} timed out")
+def download_lora(lora_key: str) -> tuple[str, dict]:
+    """Fetch LoRA from Cloudflare R2 through the loras-dir cache. Returns (filename, cache info)."""
+    return LORAS.install(*_lora_location(lora_key))
 
 
 def upload_images_to_r2(history) -> list:
     """Fetch generated images from ComfyUI, upload to R2, return list of r2_paths."""
-    client = _r2_client()
+    images = [img for node_output in history["outputs"].values() for img in node_output.get("images", [])]
+    keys = [f"generated/{uuid.uuid4()}_{img['filename']}" for img in images]
+    sources = comfyui.upload_outputs(list(zip(images, keys)), R2_OUTPUT_BUCKET, "image/png")
+
     results = []
-    for node_output in history["outputs"].values():
-        for img in node_output.get("images", []):
-            r = requests.get(
-                f"{COMFYUI_URL}/view",
-                params={
-                    "filename": img["filename"],
-                    "subfolder": img["subfolder"],
-                    "type": img["type"],
-                },
-            )
-            r.raise_for_status()
-            key = f"generated/{uuid.uuid4()}_{img['filename']}"
-            client.put_object(
-                Bucket=R2_OUTPUT_BUCKET,
-                Key=key,
-                Body=r.content,
-                ContentType="image/png",
-            )
-            print(f"Uploaded image to R2: {key}")
-            results.append({"r2_path": f"r2://{R2_OUTPUT_BUCKET}/{key}", "filename": img["filename"]})
+    for img, key, source in zip(images, keys, sources):
+        print(f"Uploaded image to R2: {key} (from {source})")
+        results.append({"r2_path": f"r2://{R2_OUTPUT_BUCKET}/{key}", "filename": img["filename"]})
     return results
 
 
@@ -210,24 +141,27 @@ def handler(job):
 
     start_time = time.time()
 
-    lora_filename = download_lora(lora_key)
-
-    if lora_filename not in known_loras:
-        print(f"New LoRA detected ({lora_filename}), restarting ComfyUI...")
-        start_comfyui()
-
-    workflow, actual_seed = _build_workflow(
-        prompt, width, height, steps, lora_scale,
-        seed=seed, guidance_scale=guidance_scale,
-        negative_prompt=negative_prompt,
+    # Validate before paying for the download and registration; install() keeps the key's basename
+    lora_filename = os.path.basename(_lora_location(lora_key)[1])
+    try:
+        workflow, actual_seed = _build_workflow(
+            prompt, width, height, steps, lora_scale, lora_filename,
+            seed=seed, guidance_scale=guidance_scale,
+            negative_prompt=negative_prompt,
+        )
+    except ValueError as e:
+        return {"error": str(e)}
+
+    lora_filename, lora_cache = download_lora(lora_key)
+    register_start = time.time()
+    registration = LORAS.register(lora_filename)
+    register_seconds = round(time.time() - register_start, 3)
+    print(f"LoRA {lora_filename} ready ({registration}, {register_seconds}s)")
+
+    history = comfyui.run(
+        workflow, timeout=600,
+        on_progress=lambda progress: runpod.serverless.progress_update(job, progress),
     )
-
-    for node in workflow.values():
-        if node.get("class_type") == "LoraLoader":
-            node["inputs"]["lora_name"] = lora_filename
-
-    prompt_id = queue_workflow(workflow)
-    history = wait_for_job(prompt_id)
     images = upload_images_to_r2(history)
 
     duration = round(time.time() - start_time, 2)
@@ -244,6 +178,12 @@ def handler(job):
             "seed": actual_seed,
             "guidance_scale": guidance_scale,
         },
+        "lora": {
+            "filename": lora_filename,
+            "registration": registration,
+            "register_seconds": register_seconds,
+            **lora_cache,
+        },
         "duration_seconds": duration,
     }
 
@@ -251,9 +191,6 @@ def handler(job):
 # ComfyUI is already started by start.sh — just wait for it to be ready
 print("Waiting for ComfyUI to be ready...")
 wait_for_comfyui()
-
-# Record which LoRAs ComfyUI knows about at startup
-known_loras = set(os.listdir(LORAS_DIR)) if os.path.exists(LORAS_DIR) else set()
-print(f"ComfyUI ready. Known LoRAs at startup: {known_loras}")
+print("ComfyUI ready.")
 
 runpod.serverless.start({"handler": handler})
@@ -0,0 +1,155 @@
+"""
+worker_common.comfyui.upload_outputs against fake R2 and fake ComfyUI.
+
+R2 is backend/pipeline/tests/fake_s3.py with --latency seconds added to every
+request; ComfyUI is tests/fake_comfyui.py serving /view from a temp dir.
+A job's --images outputs (--size-mb each) are uploaded:
+
+1. from disk (COMFYUI_DIR holds the files) — serially, one upload after the
+   other as the handlers used to, then concurrently on UPLOAD_WORKERS threads
+2. streamed from /view (the files are not on this disk) — the same two ways
+3. mixed: even outputs on disk, odd ones only behind /view, of different
+   sizes so they finish out of order; the sources must come back in input
+   order and every object must hold its own file's bytes
+4. one output whose PUT gets 503 SlowDown more times than botocore retries
+   on its own; upload_outputs must retry it and the upload succeed
+
+    cd microservices
+    python tests/bench_upload_outputs.py
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+FAKE_S3 = os.path.join(os.path.dirname(os.path.dirname(HERE)), "backend", "pipeline", "tests", "fake_s3.py")
+BUCKET = "bench"
+
+
+def _wait_for(url: str, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def _write(directory: str, name: str, size: int) -> bytes:
+    data = b"\x89PNG\r\n\x1a\n" + os.urandom(size - 8)
+    with open(os.path.join(directory, name), "wb") as f:
+        f.write(data)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=8, help="outputs per job")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="size of each output")
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds fake R2 adds to each request")
+    parser.add_argument("--s3-port", type=int, default=8404)
+    parser.add_argument("--comfy-port", type=int, default=8193)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="upload-bench-")
+    comfy_dir, view_dir = os.path.join(workdir, "comfyui"), os.path.join(workdir, "view")
+    os.makedirs(os.path.join(comfy_dir, "output"))
+    os.makedirs(os.path.join(view_dir, "output"))
+    os.environ.update({
+        "COMFYUI_URL": f"http://127.0.0.1:{args.comfy_port}",
+        "COMFYUI_DIR": comfy_dir,
+        "R2_ENDPOINT_URL": f"http://127.0.0.1:{args.s3_port}",
+        "R2_ACCESS_KEY_ID": "bench",
+        "R2_SECRET_ACCESS_KEY": "bench",
+    })
+    processes = [
+        subprocess.Popen([sys.executable, FAKE_S3, str(args.s3_port)]),
+        subprocess.Popen([
+            sys.executable, os.path.join(HERE, "fake_comfyui.py"), "--port", str(args.comfy_port),
+            "--loras", workdir, "--startup", "0", "--outputs", view_dir,
+        ]),
+    ]
+    try:
+        _wait_for(f"http://127.0.0.1:{args.s3_port}/_stats")
+        _wait_for(f"http://127.0.0.1:{args.comfy_port}/system_stats")
+        _run(args, comfy_dir, view_dir)
+    finally:
+        for process in processes:
+            process.kill()
+
+
+def _run(args, comfy_dir: str, view_dir: str):
+    from worker_common import comfyui, r2
+
+    s3 = os.environ["R2_ENDPOINT_URL"]
+    size = int(args.size_mb * (1 << 20))
+    concurrent_workers = comfyui.UPLOAD_WORKERS
+
+    def reset(latency: float = args.latency, fail: dict | None = None):
+        requests.post(f"{s3}/_reset", timeout=5).raise_for_status()
+        requests.post(f"{s3}/_config", json={"latency": latency, "fail": fail or {}}, timeout=5).raise_for_status()
+
+    def stored(key: str) -> bytes:
+        return r2.client().get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+    def upload(uploads: list, workers: int) -> tuple[list[str], float]:
+        comfyui.UPLOAD_WORKERS = workers
+        start = time.monotonic()
+        sources = comfyui.upload_outputs(uploads, BUCKET, "image/png")
+        return sources, time.monotonic() - start
+
+    disk = [_write(os.path.join(comfy_dir, "output"), f"disk_{i}.png", size) for i in range(args.images)]
+    view = [_write(os.path.join(view_dir, "output"), f"view_{i}.png", size) for i in range(args.images)]
+    item = lambda name: {"filename": name, "subfolder": "", "type": "output"}   # noqa: E731
+
+    print(f"{args.images} outputs of {args.size_mb:g} MB, fake R2 adds {args.latency * 1000:.0f} ms per request")
+    for label, prefix, source, blobs in (("disk", "disk", "disk", disk), ("/view", "view", "view", view)):
+        uploads = [(item(f"{prefix}_{i}.png"), f"out/{prefix}_{i}.png") for i in range(args.images)]
+        reset()
+        serial_sources, serial = upload(uploads, 1)
+        reset()
+        sources, concurrent = upload(uploads, concurrent_workers)
+        assert serial_sources == sources == [source] * args.images, (serial_sources, sources)
+        assert all(stored(key) == blob for (_, key), blob in zip(uploads, blobs))
+        print(f"  {label:<6} serial {serial:6.2f}s   concurrent ({concurrent_workers} workers) {concurrent:6.2f}s   "
+              f"{serial / concurrent:.1f}x")
+
+    # 3. Mixed sources and sizes: results in input order, each object its own file
+    mixed, expected_sources, expected_bytes = [], [], []
+    for i in range(args.images):
+        name = f"mixed_{i}.png"
+        blob = _write(os.path.join(comfy_dir if i % 2 == 0 else view_dir, "output"), name, size // (i + 1))
+        mixed.append((item(name), f"out/{name}"))
+        expected_sources.append("disk" if i % 2 == 0 else "view")
+        expected_bytes.append(blob)
+    reset()
+    sources, _ = upload(mixed, concurrent_workers)
+    assert sources == expected_sources, sources
+    assert [stored(key) for _, key in mixed] == expected_bytes
+    print(f"  mixed disk / /view outputs came back in input order: {sources}")
+
+    # 4. A 503 that outlasts botocore's own retries is retried by upload_outputs
+    botocore_attempts = r2.client().meta.config.retries["total_max_attempts"]
+    failing = mixed[1][1]
+    path = f"{BUCKET}/{failing}"   # fake_s3 keys objects by URL path
+    reset(fail={path: botocore_attempts})
+    sources, seconds = upload(mixed, concurrent_workers)
+    puts = requests.get(f"{s3}/_stats", timeout=5).json()["puts"]
+    assert sources == expected_sources, sources
+    assert stored(failing) == expected_bytes[1]
+    assert puts[path] == botocore_attempts + 1, puts
+    print(f"  {botocore_attempts} x 503 on {failing}: {puts[path]} PUTs, uploaded after an "
+          f"upload_outputs retry in {seconds:.2f}s")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
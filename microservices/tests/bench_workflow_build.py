@@ -0,0 +1,95 @@
+"""
+Benchmark: per-job workflow build time, old vs WorkflowTemplate.
+
+"old" is what every handler used to do per job — open and json.load the
+workflow file, copy.deepcopy it, drop display nodes and patch the inputs.
+"new" is worker_common.workflow.WorkflowTemplate.build on the template parsed
+once at import. Every worker with a workflow_params.json is measured, largest
+workflow first, with each parameter set to a value of its type; both builds
+must produce the same graph and the template must be left untouched.
+
+    cd microservices
+    python tests/bench_workflow_build.py
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from worker_common.workflow import WorkflowTemplate  # noqa: E402
+
+
+def _job_values(template: WorkflowTemplate) -> dict:
+    """A valid, non-default value for every parameter, as a job would send."""
+    values = {}
+    for name, param in template.params.items():
+        node_id, key = param.targets[0]
+        current = template.graph[node_id]["inputs"][key]
+        if param.choices:
+            value = param.choices[-1]
+        elif param.type == "bool":
+            value = not current if isinstance(current, bool) else True
+        elif param.type == "str":
+            value = f"{current} (job)" if isinstance(current, str) else "job"
+        else:
+            value = param.max if param.max is not None else (param.min or 0) + 1
+            if param.type == "int":
+                value = int(min(value, 2**32))
+        values[name] = value
+    return values
+
+
+def _old_build(template: WorkflowTemplate, strip_classes, values: dict) -> dict:
+    with open(template.path) as f:
+        workflow = copy.deepcopy(json.load(f))
+    for node_id in [nid for nid, node in workflow.items() if node.get("class_type") in strip_classes]:
+        del workflow[node_id]
+    for name, value in values.items():
+        for node_id, key in template.params[name].targets:
+            workflow[node_id]["inputs"][key] = value
+    return workflow
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000, help="builds per measurement")
+    args = parser.parse_args()
+
+    root = os.path.dirname(HERE)
+    workers = []
+    for name in sorted(os.listdir(root)):
+        manifest_path = os.path.join(root, name, "workflow_params.json")
+        if not os.path.isfile(manifest_path):
+            continue
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if not os.path.isfile(os.path.join(root, name, manifest["workflow"])):
+            print(f"skipping {name}: {manifest['workflow']} is not in the tree")
+            continue
+        strip_classes = frozenset(manifest.get("strip_classes", ()))
+        template = WorkflowTemplate.from_manifest(manifest_path)
+        workers.append((os.path.getsize(template.path), name, template, strip_classes))
+    workers.sort(reverse=True)
+
+    print(f"\n{'worker':<44} {'nodes':>5} {'KB':>6} {'old us':>8} {'new us':>7} {'speedup':>8}")
+    for size, name, template, strip_classes in workers:
+        values = _job_values(template)
+        pristine = json.dumps(template.graph, sort_keys=True)
+
+        new = template.build(**values)
+        old = _old_build(template, strip_classes, values)
+        assert json.dumps(new, sort_keys=True) == json.dumps(old, sort_keys=True), name
+        assert json.dumps(template.graph, sort_keys=True) == pristine, f"{name}: template mutated"
+
+        old_us = timeit.timeit(lambda: _old_build(template, strip_classes, values), number=args.number) / args.number * 1e6
+        new_us = timeit.timeit(lambda: template.build(**values), number=args.number) / args.number * 1e6
+        print(f"{name:<44} {len(template.graph):>5} {size / 1024:>6.1f} {old_us:>8.1f} {new_us:>7.1f} {old_us / new_us:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
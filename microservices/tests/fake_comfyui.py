@@ -0,0 +1,268 @@
+"""
+Local fake ComfyUI for the worker tests.
+
+Mimics the parts of ComfyUI the workers rely on:
+
+- start-up takes --startup seconds (imports, custom nodes) before the port opens
+- the LoraLoader choice list is cached like folder_paths.get_filename_list:
+  the loras dir is only re-scanned when its mtime changes
+- POST /prompt validates lora_name against that list (HTTP 400 otherwise) and
+  queues the prompt; prompts run one at a time, the first one after start-up
+  also paying --model-load seconds, each taking --gen seconds
+- GET /history/{id}, /object_info/LoraLoader, /system_stats, /view and
+  POST /queue {"delete": [...]} behave like ComfyUI's; /view serves files from
+  the --outputs dir (<type>/<subfolder>/<filename>) if one is given, random
+  PNG bytes otherwise
+- /ws?clientId=... is a websocket sending the prompt's execution events to the
+  client that queued it: execution_start, executing / progress per node,
+  executed, execution_success (execution_error on failure), with the history
+  entry filed just after, as ComfyUI does; --no-ws answers it with a 404
+
+A prompt can steer its own run with a node of class_type "FakeControl":
+{"seconds": 2.5} overrides --gen, {"error": "msg"} fails it with that
+exception message, {"drop_socket": true} closes the client's websocket half
+way through.
+
+    python tests/fake_comfyui.py --port 8188 --loras /tmp/loras
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+STEPS   = 10   # progress events per node
+
+
+def ws_frame(text: str) -> bytes:
+    """One unmasked server-to-client text frame."""
+    data = text.encode()
+    if len(data) < 126:
+        header = bytes([0x81, len(data)])
+    elif len(data) < 1 << 16:
+        header = bytes([0x81, 126]) + struct.pack(">H", len(data))
+    else:
+        header = bytes([0x81, 127]) + struct.pack(">Q", len(data))
+    return header + data
+
+
+class FakeComfyUI:
+    def __init__(self, loras_dir: str, model_load: float, gen: float):
+        self.loras_dir = loras_dir
+        self.model_load = model_load
+        self.gen = gen
+        self.clients: dict[str, socket.socket] = {}
+        self.send_lock = threading.Lock()
+        self.history: dict[str, dict] = {}
+        self.deleted: set[str] = set()
+        self.jobs: queue.Queue = queue.Queue()
+        self._models_loaded = False
+        self._lora_mtime = None
+        self._lora_names: list[str] = []
+        self._lock = threading.Lock()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def lora_names(self) -> list[str]:
+        """The LoraLoader list, re-scanned only when the folder's mtime changed."""
+        with self._lock:
+            mtime = os.path.getmtime(self.loras_dir)
+            if mtime != self._lora_mtime:
+                self._lora_names = sorted(f for f in os.listdir(self.loras_dir) if f.endswith(".safetensors"))
+                self._lora_mtime = mtime
+            return self._lora_names
+
+    def queue_prompt(self, workflow: dict, client_id: str | None) -> tuple[int, dict]:
+        names = self.lora_names()
+        for node_id, node in workflow.items():
+            if node.get("class_type") == "LoraLoader" and node["inputs"]["lora_name"] not in names:
+                return 400, {
+                    "error": {"type": "prompt_outputs_failed_validation", "message": "Prompt outputs failed validation"},
+                    "node_errors": {node_id: {"errors": [{"message": "Value not in list: lora_name"}]}},
+                }
+        prompt_id = str(uuid.uuid4())
+        self.jobs.put((prompt_id, client_id, workflow))
+        return 200, {"prompt_id": prompt_id, "number": self.jobs.qsize()}
+
+    def _worker(self):
+        while True:
+            prompt_id, client_id, workflow = self.jobs.get()
+            if prompt_id in self.deleted:
+                continue
+            self.execute(prompt_id, client_id, workflow)
+
+    def send(self, client_id: str | None, kind: str, data: dict):
+        conn = self.clients.get(client_id)
+        if conn is None:
+            return
+        try:
+            with self.send_lock:
+                conn.sendall(ws_frame(json.dumps({"type": kind, "data": data})))
+        except OSError:
+            self.clients.pop(client_id, None)
+
+    def drop(self, client_id: str | None):
+        conn = self.clients.pop(client_id, None)
+        if conn is not None:
+            conn.shutdown(socket.SHUT_RDWR)
+            conn.close()
+
+    def execute(self, prompt_id: str, client_id: str | None, workflow: dict):
+        control = next((n["inputs"] for n in workflow.values() if n.get("class_type") == "FakeControl"), {})
+        nodes = [node_id for node_id, node in workflow.items() if node.get("class_type") != "FakeControl"]
+        seconds = control.get("seconds", self.gen)
+
+        self.send(client_id, "execution_start", {"prompt_id": prompt_id})
+        if not self._models_loaded:
+            time.sleep(self.model_load)
+            self._models_loaded = True
+        for index, node_id in enumerate(nodes):
+            self.send(client_id, "executing", {"node": node_id, "prompt_id": prompt_id})
+            for step in range(STEPS):
+                time.sleep(seconds / len(nodes) / STEPS)
+                self.send(client_id, "progress", {"value": step + 1, "max": STEPS, "node": node_id, "prompt_id": prompt_id})
+            if control.get("drop_socket") and index == len(nodes) // 2:
+                self.drop(client_id)
+
+        if control.get("error"):
+            node_id = nodes[-1]
+            self.send(client_id, "execution_error", {
+                "prompt_id": prompt_id, "node_id": node_id, "node_type": workflow[node_id]["class_type"],
+                "exception_message": control["error"],
+            })
+            time.sleep(0.005)
+            self.history[prompt_id] = {"outputs": {}, "status": {"status_str": "error", "messages": [control["error"]]}}
+            return
+
+        images = [{"filename": f"{prompt_id}.png", "subfolder": "", "type": "output"}]
+        self.send(client_id, "executed", {"node": "9", "output": {"images": images}, "prompt_id": prompt_id})
+        self.send(client_id, "execution_success", {"prompt_id": prompt_id})
+        time.sleep(0.005)   # ComfyUI files the history entry just after execution_success
+        self.history[prompt_id] = {
+            "outputs": {"9": {"images": images}},
+            "status": {"status_str": "success", "completed": True},
+        }
+
+
+def make_handler(comfy: FakeComfyUI, websocket: bool = True, outputs_dir: str | None = None):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, payload, code: int = 200):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            path = url.path
+            if path == "/ws" and websocket:
+                return self._websocket(parse_qs(url.query).get("clientId", [uuid.uuid4().hex])[0])
+            if path == "/system_stats":
+                return self._json({"system": {"comfyui_version": "fake"}, "devices": []})
+            if path == "/object_info/LoraLoader":
+                spec = {"required": {"lora_name": [comfy.lora_names(), {}]}}
+                return self._json({"LoraLoader": {"input": spec}})
+            if path.startswith("/history/"):
+                prompt_id = path.rsplit("/", 1)[1]
+                entry = comfy.history.get(prompt_id)
+                return self._json({prompt_id: entry} if entry else {})
+            if path == "/view":
+                return self._view(parse_qs(url.query))
+            self._json({}, 404)
+
+        def _view(self, query: dict):
+            if outputs_dir is None:
+                body = b"\x89PNG\r\n\x1a\n" + os.urandom(1024)
+            else:
+                parts = [query.get(k, [""])[0] for k in ("type", "subfolder", "filename")]
+                file_path = os.path.join(outputs_dir, parts[0] or "output", *parts[1:])
+                if not os.path.isfile(file_path):
+                    return self._json({}, 404)
+                with open(file_path, "rb") as f:
+                    body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _websocket(self, client_id: str):
+            accept = base64.b64encode(
+                hashlib.sha1((self.headers["Sec-WebSocket-Key"] + WS_GUID).encode()).digest()
+            ).decode()
+            self.send_response(101)
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept)
+            self.end_headers()
+            self.wfile.flush()
+            comfy.clients[client_id] = self.connection
+            comfy.send(client_id, "status", {"status": {"exec_info": {"queue_remaining": 0}}, "sid": client_id})
+            try:
+                while True:
+                    frame = self.connection.recv(1024)
+                    if not frame:
+                        break
+                    if frame[0] & 0x0F == 0x8:   # close: answer it, like aiohttp
+                        with comfy.send_lock:
+                            self.connection.sendall(bytes([0x88, 2]) + struct.pack(">H", 1000))
+                        break
+            except OSError:
+                pass
+            if comfy.clients.get(client_id) is self.connection:
+                del comfy.clients[client_id]
+            self.close_connection = True
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if self.path == "/prompt":
+                code, payload = comfy.queue_prompt(body["prompt"], body.get("client_id"))
+                return self._json(payload, code)
+            if self.path == "/queue":
+                comfy.deleted.update(body.get("delete", []))
+                return self._json({})
+            self._json({}, 404)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--listen", default="127.0.0.1")
+    parser.add_argument("--loras", required=True, help="loras dir")
+    parser.add_argument("--startup", type=float, default=6.0, help="seconds before the port opens")
+    parser.add_argument("--model-load", type=float, default=3.0, help="extra seconds for the first prompt")
+    parser.add_argument("--gen", type=float, default=1.0, help="seconds per prompt")
+    parser.add_argument("--no-ws", action="store_true", help="no /ws endpoint (history polling only)")
+    parser.add_argument("--outputs", help="dir /view serves files from")
+    # Flags the workers pass to the real main.py
+    parser.add_argument("--disable-auto-launch", action="store_true")
+    parser.add_argument("--disable-metadata", action="store_true")
+    args = parser.parse_args()
+
+    time.sleep(args.startup)
+    comfy = FakeComfyUI(args.loras, args.model_load, args.gen)
+    comfy.lora_names()
+    server = ThreadingHTTPServer((args.listen, args.port), make_handler(comfy, websocket=not args.no_ws, outputs_dir=args.outputs))
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
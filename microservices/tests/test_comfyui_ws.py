@@ -0,0 +1,142 @@
+"""
+worker_common.comfyui against the websocket of tests/fake_comfyui.py.
+
+Checks that run():
+- returns as soon as execution_success arrives, and measures the completion
+  tail (wall time minus the job's run time) against the handlers' old
+  2-second /history polling loop
+- passes per-node progress to on_progress
+- falls back to /history when the socket drops mid-job, or when there is no
+  /ws endpoint at all (a second fake started with --no-ws)
+- raises at once on execution_error with ComfyUI's message and node
+- raises TimeoutError when the job outlives the timeout
+
+    cd microservices
+    python tests/test_comfyui_ws.py
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+def _launch(port: int, loras_dir: str, *flags: str) -> subprocess.Popen:
+    process = subprocess.Popen([
+        sys.executable, os.path.join(HERE, "fake_comfyui.py"), "--port", str(port), "--loras", loras_dir,
+        "--startup", "0", "--model-load", "0", *flags,
+    ])
+    while True:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/system_stats", timeout=1).raise_for_status()
+            return process
+        except requests.RequestException:
+            time.sleep(0.1)
+
+
+def _workflow(seconds: float, **control) -> dict:
+    return {
+        "3": {"class_type": "KSampler", "inputs": {"seed": 1}},
+        "8": {"class_type": "VAEDecode", "inputs": {"samples": ["3", 0]}},
+        "9": {"class_type": "SaveImage", "inputs": {"images": ["8", 0]}},
+        "99": {"class_type": "FakeControl", "inputs": {"seconds": seconds, **control}},
+    }
+
+
+def _old_wait(url: str, prompt_id: str, timeout: int = 300) -> dict:
+    # The loop every handler used before worker_common.comfyui
+    start = time.time()
+    while time.time() - start < timeout:
+        history = requests.get(f"{url}/history/{prompt_id}", timeout=10).json()
+        if prompt_id in history:
+            return history[prompt_id]
+        time.sleep(2)
+    raise TimeoutError(prompt_id)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=12, help="jobs per latency measurement")
+    parser.add_argument("--port", type=int, default=8192)
+    args = parser.parse_args()
+
+    from worker_common import comfyui
+
+    url = f"http://127.0.0.1:{args.port}"
+    comfyui.COMFYUI_URL = url
+    loras_dir = tempfile.mkdtemp(prefix="loras-")   # no LoraLoader in these workflows
+    processes = [_launch(args.port, loras_dir), _launch(args.port + 1, loras_dir, "--no-ws")]
+    try:
+        # 1. Completion tail: websocket vs 2 s polling
+        rng = random.Random(7)
+        durations = [rng.uniform(1.0, 3.0) for _ in range(args.jobs)]
+        polled, pushed = [], []
+        for seconds in durations:
+            start = time.monotonic()
+            _old_wait(url, comfyui.queue(_workflow(seconds)))
+            polled.append(time.monotonic() - start - seconds)
+        progress = []
+        for seconds in durations:
+            progress.clear()
+            start = time.monotonic()
+            history = comfyui.run(_workflow(seconds), timeout=30, on_progress=progress.append)
+            pushed.append(time.monotonic() - start - seconds)
+            assert history["outputs"]["9"]["images"], history
+        print(f"completion tail over {args.jobs} jobs (wall time minus run time):")
+        print(f"  /history every 2 s: p50 {statistics.median(polled) * 1000:6.0f} ms  max {max(polled) * 1000:6.0f} ms")
+        print(f"  websocket:          p50 {statistics.median(pushed) * 1000:6.1f} ms  max {max(pushed) * 1000:6.1f} ms")
+        assert max(pushed) < 0.5, pushed
+
+        # 2. Progress: every node reported, steps throttled to PROGRESS_INTERVAL
+        nodes = [p["node"] for p in progress if "value" not in p]
+        assert nodes == ["3", "8", "9"], nodes
+        assert any(p.get("max") == 10 for p in progress), progress
+        print(f"progress: {len(progress)} callbacks for the last job, e.g. {progress[:2]}")
+
+        # 3. Socket dropped mid-job: finish by polling /history
+        start = time.monotonic()
+        history = comfyui.run(_workflow(1.0, drop_socket=True), timeout=30)
+        assert history["outputs"]["9"]["images"]
+        print(f"socket dropped mid-job: completed via /history in {time.monotonic() - start:.2f}s")
+
+        # 4. No /ws endpoint: poll from the start
+        comfyui.COMFYUI_URL = f"http://127.0.0.1:{args.port + 1}"
+        start = time.monotonic()
+        history = comfyui.run(_workflow(1.0), timeout=30)
+        assert history["outputs"]["9"]["images"]
+        print(f"no websocket: completed via /history in {time.monotonic() - start:.2f}s")
+        comfyui.COMFYUI_URL = url
+
+        # 5. execution_error surfaces at once
+        start = time.monotonic()
+        try:
+            comfyui.run(_workflow(0.5, error="CUDA out of memory"), timeout=30)
+        except RuntimeError as e:
+            assert "CUDA out of memory" in str(e) and "node 9 SaveImage" in str(e), e
+            print(f"execution_error raised after {time.monotonic() - start:.2f}s: {e}")
+        else:
+            raise AssertionError("execution_error was not raised")
+
+        # 6. Timeout
+        try:
+            comfyui.run(_workflow(3.0), timeout=1)
+        except TimeoutError as e:
+            print(f"timeout raised: {e}")
+        else:
+            raise AssertionError("timeout was not raised")
+        print("OK")
+    finally:
+        for process in processes:
+            process.kill()
+
+
+if __name__ == "__main__":
+    main()
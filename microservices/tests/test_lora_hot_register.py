@@ -0,0 +1,150 @@
+"""
+Hot LoRA registration against tests/fake_comfyui.py.
+
+Drives worker_common.loras.LoraManager and worker_common.comfyui the way the
+image-generation handler does, with a restart callback that kills and
+relaunches the fake like start_comfyui() does. Checks that:
+
+- a LoRA dropped into the loras dir (hidden .part + os.replace, as
+  LoraManager._download does) is listed on the next /object_info call and a
+  job using it runs, without a restart
+- if the folder's mtime change is hidden (coarse-mtime filesystems), bumping
+  it is enough — still no restart
+- a LoRA ComfyUI never lists falls back to the restart callback, then fails
+
+and measures time-to-first-image for a new LoRA with hot registration vs the
+old kill-and-relaunch path. Downloading the LoRA costs the same on both paths
+and is left out.
+
+    cd microservices
+    python tests/test_lora_hot_register.py
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+def _port_open(port: int) -> bool:
+    with socket.socket() as s:
+        s.settimeout(0.2)
+        return s.connect_ex(("127.0.0.1", port)) == 0
+
+
+def _place(loras_dir: str, name: str):
+    tmp = os.path.join(loras_dir, f".{name}.part")
+    with open(tmp, "wb") as f:
+        f.write(os.urandom(1 << 20))
+    os.replace(tmp, os.path.join(loras_dir, name))
+
+
+def _workflow(lora_name: str) -> dict:
+    return {
+        "10": {"class_type": "LoraLoader", "inputs": {"lora_name": lora_name, "strength_model": 1.0}},
+        "9": {"class_type": "SaveImage", "inputs": {"images": ["10", 0]}},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8191)
+    parser.add_argument("--startup", type=float, default=6.0, help="fake ComfyUI start-up seconds")
+    parser.add_argument("--model-load", type=float, default=3.0)
+    parser.add_argument("--gen", type=float, default=1.0)
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}"
+    os.environ["COMFYUI_URL"] = url
+    from worker_common import comfyui
+    from worker_common.loras import LoraManager
+
+    loras_dir = tempfile.mkdtemp(prefix="loras-")
+    process = [None]
+    restarts = [0]
+
+    def launch():
+        process[0] = subprocess.Popen([
+            sys.executable, os.path.join(HERE, "fake_comfyui.py"),
+            "--port", str(args.port), "--loras", loras_dir, "--startup", str(args.startup),
+            "--model-load", str(args.model_load), "--gen", str(args.gen),
+        ])
+        while True:
+            try:
+                requests.get(f"{url}/system_stats", timeout=1).raise_for_status()
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+
+    def restart():
+        # What start_comfyui() does: kill, wait for the port, relaunch, wait for /system_stats
+        restarts[0] += 1
+        process[0].kill()
+        process[0].wait()
+        while _port_open(args.port):
+            time.sleep(0.1)
+        launch()
+
+    def first_image(manager: LoraManager, name: str) -> tuple[str, float]:
+        start = time.monotonic()
+        how = manager.register(name)
+        history = comfyui.run(_workflow(name), timeout=60)
+        assert history["outputs"]["9"]["images"], history
+        return how, time.monotonic() - start
+
+    try:
+        _place(loras_dir, "warm.safetensors")
+        launch()
+        manager = LoraManager(loras_dir, url, restart=restart)
+        first_image(manager, "warm.safetensors")   # models loaded, as on a warm worker
+        pid = process[0].pid
+
+        # 1. New LoRA, visible after the rename
+        _place(loras_dir, "new.safetensors")
+        how, hot_ttfi = first_image(manager, "new.safetensors")
+        assert how == "rescan", how
+        assert restarts[0] == 0 and process[0].pid == pid
+        print(f"new LoRA registered by {how}, no restart: time-to-first-image {hot_ttfi:.2f}s")
+
+        # 2. The rename didn't move the folder's mtime: register() bumps it itself
+        stat = os.stat(loras_dir)
+        _place(loras_dir, "coarse.safetensors")
+        os.utime(loras_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        how, touch_ttfi = first_image(manager, "coarse.safetensors")
+        assert how == "touch", how
+        assert restarts[0] == 0 and process[0].pid == pid
+        print(f"hidden mtime change registered by {how}, no restart: time-to-first-image {touch_ttfi:.2f}s")
+
+        # 3. Never listed: restart as a last resort, then give up
+        try:
+            manager.register("missing.safetensors")
+        except RuntimeError as e:
+            print(f"unlistable LoRA: {restarts[0]} restart, then {e}")
+        else:
+            raise AssertionError("register() accepted a LoRA ComfyUI never listed")
+        assert restarts[0] == 1
+
+        # 4. The old path for comparison: every unknown LoRA restarted ComfyUI
+        first_image(manager, "warm.safetensors")
+        _place(loras_dir, "old.safetensors")
+        start = time.monotonic()
+        restart()
+        comfyui.run(_workflow("old.safetensors"), timeout=60)
+        restart_ttfi = time.monotonic() - start
+        print(f"restart path (old handler): time-to-first-image {restart_ttfi:.2f}s")
+        print(f"hot registration is {restart_ttfi / hot_ttfi:.1f}x faster to the first image")
+        print("OK")
+    finally:
+        if process[0] is not None:
+            process[0].kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,15 @@
 import runpod
 import requests
 import os
-import json
-import copy
 import time
 import random
 import uuid
-import shutil
-import boto3
-from botocore.config import Config
 
-WORKFLOW_PATH = os.path.join(os.path.dirname(__file__), "workflow-api-C6gm9qJqfnksxkb0xKgFK.json")
+from worker_common import comfyui
+from worker_common.inputs import InputStager
+from worker_common.workflow import WorkflowTemplate
+
+MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "workflow_params.json")
 
 COMFYUI_URL = "http://127.0.0.1:8188"
 COMFYUI_INPUT_DIR = "/comfyui/input"
@@ -18,17 +17,8 @@ COMFYUI_INPUT_DIR = "/comfyui/input"
 R2_INPUT_BUCKET = os.environ.get("R2_INPUT_BUCKET", "objects-to-train")
 R2_OUTPUT_BUCKET = os.environ.get("R2_OUTPUT_BUCKET", "test-ftp")
 
-
-def _r2_client():
-    account_id = os.environ["R2_ACCOUNT_ID"].strip()
-    return boto3.client(
-        "s3",
-        endpoint_url=f"https://{account_id}.r2.cloudflarestorage.com",
-        aws_access_key_id=os.environ["R2_ACCESS_KEY_ID"].strip(),
-        aws_secret_access_key=os.environ["R2_SECRET_ACCESS_KEY"].strip(),
-        config=Config(signature_version="s3v4"),
-        region_name="auto",
-    )
+TEMPLATE = WorkflowTemplate.from_manifest(MANIFEST_PATH)
+INPUTS = InputStager(COMFYUI_INPUT_DIR)
 
 
 def wait_for_comfyui(timeout=300):
@@ -44,93 +34,43 @@ def wait_for_comfyui(timeout=300):
     raise TimeoutError("ComfyUI failed to start in time")
 
 
-def download_image(image_url: str) -> str:
-    """Download image from R2 into ComfyUI input dir as input.jpg."""
+def download_image(image_url: str) -> tuple[str, str]:
+    """Stage the input image from R2 in ComfyUI's input directory. Returns (filename to give LoadImage, "hit" | "miss")."""
     if image_url.startswith("r2://"):
         parts = image_url[5:].split("/", 1)
         bucket, key = parts[0], parts[1]
     else:
         bucket = R2_INPUT_BUCKET
         key = image_url
-
-    ext = os.path.splitext(key)[1] or ".jpg"
-    tmp_path = f"/tmp/input_image{ext}"
-    dest = os.path.join(COMFYUI_INPUT_DIR, "input.jpg")
-
-    print(f"Downloading image from R2: bucket={bucket} key={key}")
-    os.makedirs(COMFYUI_INPUT_DIR, exist_ok=True)
-    _r2_client().download_file(bucket, key, tmp_path)
-    shutil.copy(tmp_path, dest)
-    print(f"Image ready at {dest}")
-    return "input.jpg"
-
-
-def build_workflow(prompt: str, seed: int, width: int, height: int, length: int, steps: int) -> dict:
-    with open(WORKFLOW_PATH) as f:
-        workflow = copy.deepcopy(json.load(f))
-
-    # Inject positive prompt
-    workflow["6"]["inputs"]["text"] = prompt
-
-    # Inject resolution and frame count
-    workflow["63"]["inputs"]["width"] = width
-    workflow["63"]["inputs"]["height"] = height
-    workflow["63"]["inputs"]["length"] = length
-
-    # Inject steps into both samplers
-    workflow["57"]["inputs"]["steps"] = steps
-    workflow["57"]["inputs"]["end_at_step"] = steps // 2
-    workflow["58"]["inputs"]["steps"] = steps
-    workflow["58"]["inputs"]["start_at_step"] = steps // 2
-
-    # Inject seed into the high-noise sampler (node 57)
-    workflow["57"]["inputs"]["noise_seed"] = seed
-
-    return workflow
-
-
-def queue_workflow(workflow):
-    r = requests.post(f"{COMFYUI_URL}/prompt", json={"prompt": workflow})
-    r.raise_for_status()
-    return r.json()["prompt_id"]
-
-
-def wait_for_job(prompt_id):
-    while True:
-        r = requests.get(f"{COMFYUI_URL}/history/{prompt_id}")
-        history = r.json()
-        if prompt_id in history:
-            return history[prompt_id]
-        time.sleep(2)
+    return INPUTS.stage_r2(bucket, key)
+
+
+def build_workflow(image_filename: str, prompt: str, seed: int, width: int, height: int, length: int, steps: int) -> dict:
+    return TEMPLATE.build(
+        image=image_filename,
+        prompt=prompt,
+        width=width,
+        height=height,
+        length=length,
+        steps=steps,
+        half_steps=steps // 2,
+        seed=seed,
+    )
 
 
 def upload_video_to_r2(history) -> list:
     """Fetch generated video from ComfyUI, upload to R2, return list of r2_paths."""
-    client = _r2_client()
+    videos = [vid for node_output in history["outputs"].values() for vid in node_output.get("gifs", [])]
+    keys = [f"generated/{uuid.uuid4()}_{vid['filename']}" for vid in videos]
+    sources = comfyui.upload_outputs(list(zip(videos, keys)), R2_OUTPUT_BUCKET, "video/mp4")
+
     results = []
-    for node_output in history["outputs"].values():
-        for vid in node_output.get("gifs", []):
-            r = requests.get(
-                f"{COMFYUI_URL}/view",
-                params={
-                    "filename": vid["filename"],
-                    "subfolder": vid.get("subfolder", ""),
-                    "type": vid.get("type", "output"),
-                },
-            )
-            r.raise_for_status()
-            key = f"generated/{uuid.uuid4()}_{vid['filename']}"
-            client.put_object(
-                Bucket=R2_OUTPUT_BUCKET,
-                Key=key,
-                Body=r.content,
-                ContentType="video/mp4",
-            )
-            print(f"Uploaded video to R2: {key}")
-            results.append({
-                "r2_path": f"r2://{R2_OUTPUT_BUCKET}/{key}",
-                "filename": vid["filename"],
-            })
+    for vid, key, source in zip(videos, keys, sources):
+        print(f"Uploaded video to R2: {key} (from {source})")
+        results.append({
+            "r2_path": f"r2://{R2_OUTPUT_BUCKET}/{key}",
+            "filename": vid["filename"],
+        })
     return results
 
 
@@ -153,16 +93,23 @@ def handler(job):
 
     start_time = time.time()
 
-    download_image(image_url)
-    workflow = build_workflow(prompt, seed, width, height, length, steps)
+    image_filename, image_cache = download_image(image_url)
+    inputs_done = time.time()
 
-    prompt_id = queue_workflow(workflow)
-    print(f"Queued workflow: {prompt_id}")
+    try:
+        workflow = build_workflow(image_filename, prompt, seed, width, height, length, steps)
+    except ValueError as e:
+        return {"error": str(e)}
 
-    history = wait_for_job(prompt_id)
+    history = comfyui.run(
+        workflow, timeout=1800,
+        on_progress=lambda progress: runpod.serverless.progress_update(job, progress),
+    )
+    comfyui_done = time.time()
     videos = upload_video_to_r2(history)
 
-    duration = round(time.time() - start_time, 2)
+    end_time = time.time()
+    duration = round(end_time - start_time, 2)
 
     return {
         "videos": videos,
@@ -175,6 +122,12 @@ def handler(job):
             "steps": steps,
         },
         "duration_seconds": duration,
+        "duration_breakdown": {
+            "inputs_seconds": round(inputs_done - start_time, 2),
+            "comfyui_seconds": round(comfyui_done - inputs_done, 2),
+            "upload_seconds": round(end_time - comfyui_done, 2),
+            "input_cache": {"image_url": image_cache},
+        },
     }
 
 
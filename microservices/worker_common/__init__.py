@@ -0,0 +1,6 @@
+"""
+Code shared by the ComfyUI RunPod workers.
+
+Each worker image copies this package next to its handler.py via a named
+Docker build context (``--build-context worker_common=microservices/worker_common``).
+"""
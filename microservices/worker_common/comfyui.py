@@ -0,0 +1,279 @@
+"""
+ComfyUI client shared by the workers: queue a workflow and wait for it.
+
+Completion is event-driven. Before queueing, run() opens ComfyUI's /ws socket
+under this process's client_id and then blocks on its messages, returning as
+soon as execution_success (or the legacy `executing` with node=None) arrives
+for the prompt, instead of sleeping 1–2 s between GET /history calls. The
+history entry is then read once for the outputs.
+
+- execution_error raises at once with ComfyUI's message and the failing node
+- per-node progress (`executing` / `progress` events) is passed to on_progress,
+  at most once per PROGRESS_INTERVAL except when the node changes
+- if the socket can't be opened, drops, or goes quiet for IDLE_CHECK seconds,
+  /history is consulted; a dropped socket falls back to polling for the rest
+  of the job
+- run_many() queues several workflows at once and yields each result as it
+  completes, so ComfyUI moves on to the next one while the caller uploads
+
+Outputs are uploaded to R2 by upload_output() without holding the file in
+memory. The worker shares ComfyUI's filesystem, so the file is read straight
+from the output (or temp) dir with upload_file; only if it isn't there is the
+/view response streamed into upload_fileobj instead of read with r.content.
+Either way boto3 switches to a multipart upload above UPLOAD_PART_MB, with at
+most UPLOAD_CONCURRENCY parts in flight, so memory stays at a few part
+buffers whatever the size of the video.
+
+upload_outputs() uploads all of a job's outputs concurrently on a pool of
+UPLOAD_WORKERS threads. Each upload is retried up to UPLOAD_ATTEMPTS times
+with backoff, and the results come back in output order.
+"""
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import BotoCoreError, ClientError
+
+try:
+    import websocket  # websocket-client, bundled with runpod/worker-comfyui
+except ImportError:
+    websocket = None
+
+from worker_common import r2
+
+COMFYUI_URL       = os.environ.get("COMFYUI_URL", "http://127.0.0.1:8188")
+COMFYUI_DIR       = os.environ.get("COMFYUI_DIR", "/comfyui")
+CLIENT_ID         = uuid.uuid4().hex
+POLL_INTERVAL     = 1.0    # seconds between /history polls when the socket is unavailable
+IDLE_CHECK        = 10.0   # seconds of socket silence before double-checking /history
+PROGRESS_INTERVAL = 1.0    # minimum seconds between step-progress callbacks
+CLOSE_TIMEOUT     = 0.5    # seconds to wait for the server's close frame
+
+UPLOAD_PART_MB     = int(os.environ.get("R2_UPLOAD_PART_MB", "16"))
+UPLOAD_CONCURRENCY = int(os.environ.get("R2_UPLOAD_CONCURRENCY", "4"))
+UPLOAD_CONFIG = TransferConfig(
+    multipart_threshold=UPLOAD_PART_MB << 20,
+    multipart_chunksize=UPLOAD_PART_MB << 20,
+    max_concurrency=UPLOAD_CONCURRENCY,
+)
+# Parts read from a non-seekable /view stream are buffered; cap them to what's in flight
+UPLOAD_CONFIG.max_in_memory_upload_chunks = UPLOAD_CONCURRENCY
+
+UPLOAD_WORKERS  = int(os.environ.get("R2_UPLOAD_WORKERS", "4"))   # outputs uploaded at once
+UPLOAD_ATTEMPTS = 3
+UPLOAD_BACKOFF  = 0.5   # seconds before the first retry, doubled after each
+
+
+def queue(workflow: dict) -> str:
+    r = requests.post(f"{COMFYUI_URL}/prompt", json={"prompt": workflow, "client_id": CLIENT_ID}, timeout=30)
+    r.raise_for_status()
+    prompt_id = r.json()["prompt_id"]
+    print(f"Queued workflow prompt_id={prompt_id}")
+    return prompt_id
+
+
+def run(workflow: dict, timeout: float | None = 600, on_progress=None) -> dict:
+    """Queue `workflow` and block until it finishes. Returns its /history entry."""
+    runs = run_many([workflow], timeout, on_progress)
+    try:
+        return next(runs)
+    finally:
+        runs.close()
+
+
+def run_many(workflows: list[dict], timeout: float | None = 600, on_progress=None):
+    """
+    Queue all `workflows` at once and yield their /history entries in order.
+    ComfyUI runs them back to back with the models still loaded, while the
+    caller handles each result (e.g. uploads it) as it arrives. `timeout`
+    applies to each workflow. Prompts still queued when the caller stops
+    early are removed from ComfyUI's queue.
+    """
+    ws = _connect()
+    pending = []
+    try:
+        pending = [queue(workflow) for workflow in workflows]
+        for index, prompt_id in enumerate(list(pending)):
+            deadline = time.monotonic() + timeout if timeout else None
+            progress = on_progress
+            if on_progress and len(workflows) > 1:
+                progress = lambda p, index=index: on_progress({**p, "run": index + 1, "runs": len(workflows)})
+            history = None
+            if ws is not None:
+                try:
+                    _wait_ws(ws, prompt_id, deadline, progress)
+                    # execution_success is sent just before ComfyUI files the history entry
+                    history = _poll_history(prompt_id, deadline, interval=0.01)
+                except TimeoutError:
+                    raise
+                except (websocket.WebSocketException, OSError) as e:
+                    print(f"ComfyUI websocket dropped ({e}) — polling /history")
+                    ws.close(timeout=0)
+                    ws = None
+            if history is None:
+                history = _poll_history(prompt_id, deadline, interval=POLL_INTERVAL)
+            pending.remove(prompt_id)
+            yield history
+    finally:
+        if pending:
+            _dequeue(pending)
+        if ws is not None:
+            # The job is done; don't let a server that skips the close handshake hold it up
+            ws.close(timeout=CLOSE_TIMEOUT)
+
+
+def _dequeue(prompt_ids: list[str]):
+    """Drop prompts that haven't started from ComfyUI's queue (running ones are left to finish)."""
+    try:
+        requests.post(f"{COMFYUI_URL}/queue", json={"delete": prompt_ids}, timeout=10).raise_for_status()
+        print(f"Removed {len(prompt_ids)} queued prompt(s) from ComfyUI")
+    except requests.RequestException as e:
+        print(f"Could not remove queued prompts {prompt_ids}: {e}")
+
+
+def _connect():
+    if websocket is None:
+        return None
+    ws_url = COMFYUI_URL.replace("http", "ws", 1)
+    try:
+        return websocket.create_connection(f"{ws_url}/ws?clientId={CLIENT_ID}", timeout=5)
+    except (websocket.WebSocketException, OSError) as e:
+        print(f"ComfyUI websocket unavailable ({e}) — polling /history")
+        return None
+
+
+def _remaining(deadline: float | None, prompt_id: str) -> float | None:
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError(f"Job {prompt_id} timed out")
+    return remaining
+
+
+def _wait_ws(ws, prompt_id: str, deadline: float | None, on_progress):
+    node = None
+    last_progress = 0.0
+    while True:
+        remaining = _remaining(deadline, prompt_id)
+        ws.settimeout(IDLE_CHECK if remaining is None else min(IDLE_CHECK, remaining))
+        try:
+            message = ws.recv()
+        except websocket.WebSocketTimeoutException:
+            if _history(prompt_id) is not None:
+                return
+            continue
+        if not isinstance(message, str):
+            continue  # binary preview frames
+        event = json.loads(message)
+        data = event.get("data") or {}
+        if data.get("prompt_id") != prompt_id:
+            continue
+
+        kind = event.get("type")
+        if kind == "execution_success":
+            return
+        if kind == "executing":
+            if data.get("node") is None:
+                return  # older ComfyUI: executing(None) marks the end
+            node = data["node"]
+            if on_progress:
+                on_progress({"node": node})
+        elif kind == "progress":
+            now = time.monotonic()
+            if on_progress and (data.get("node") != node or now - last_progress >= PROGRESS_INTERVAL):
+                node = data.get("node", node)
+                last_progress = now
+                on_progress({"node": node, "value": data.get("value"), "max": data.get("max")})
+        elif kind in ("execution_error", "execution_interrupted"):
+            raise RuntimeError(
+                f"ComfyUI job failed: {data.get('exception_message') or kind} "
+                f"(node {data.get('node_id')} {data.get('node_type') or ''})".rstrip()
+            )
+
+
+def _history(prompt_id: str) -> dict | None:
+    r = requests.get(f"{COMFYUI_URL}/history/{prompt_id}", timeout=10)
+    r.raise_for_status()
+    job = r.json().get(prompt_id)
+    if job is None:
+        return None
+    status = job.get("status", {})
+    if status.get("status_str") == "error":
+        raise RuntimeError(f"ComfyUI job failed: {status.get('messages', [])}")
+    return job
+
+
+def _poll_history(prompt_id: str, deadline: float | None, interval: float) -> dict:
+    while True:
+        job = _history(prompt_id)
+        if job is not None:
+            return job
+        _remaining(deadline, prompt_id)
+        time.sleep(interval)
+        interval = min(interval * 2, POLL_INTERVAL)
+
+
+# ── Outputs ───────────────────────────────────────────────────────────────────
+
+def output_path(item: dict) -> str | None:
+    """Local path of a history output item ({filename, subfolder, type}), if the file is on this disk."""
+    base = os.path.join(COMFYUI_DIR, item.get("type") or "output")
+    path = os.path.normpath(os.path.join(base, item.get("subfolder") or "", item["filename"]))
+    # Same containment rule as ComfyUI's /view
+    if os.path.commonpath([base, path]) != base or not os.path.isfile(path):
+        return None
+    return path
+
+
+def upload_output(item: dict, bucket: str, key: str, content_type: str) -> str:
+    """
+    Upload one output file to R2 without buffering it. Returns where it was
+    read from: "disk" (ComfyUI's output dir) or "view" (streamed over HTTP).
+    """
+    client = r2.client()
+    extra = {"ContentType": content_type}
+    path = output_path(item)
+    if path is not None:
+        client.upload_file(path, bucket, key, ExtraArgs=extra, Config=UPLOAD_CONFIG)
+        return "disk"
+
+    params = {
+        "filename": item["filename"],
+        "subfolder": item.get("subfolder", ""),
+        "type": item.get("type", "output"),
+    }
+    with requests.get(f"{COMFYUI_URL}/view", params=params, stream=True, timeout=120) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+        client.upload_fileobj(r.raw, bucket, key, ExtraArgs=extra, Config=UPLOAD_CONFIG)
+    return "view"
+
+
+def upload_outputs(uploads: list[tuple[dict, str]], bucket: str, content_type: str) -> list[str]:
+    """
+    Upload (item, key) pairs concurrently, retrying each on failure. Returns
+    upload_output's source for each pair, in the same order.
+    """
+    if len(uploads) <= 1:
+        return [_upload_with_retry(item, bucket, key, content_type) for item, key in uploads]
+    with ThreadPoolExecutor(max_workers=min(UPLOAD_WORKERS, len(uploads))) as pool:
+        futures = [pool.submit(_upload_with_retry, item, bucket, key, content_type) for item, key in uploads]
+        return [f.result() for f in futures]
+
+
+def _upload_with_retry(item: dict, bucket: str, key: str, content_type: str) -> str:
+    delay = UPLOAD_BACKOFF
+    for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+        try:
+            return upload_output(item, bucket, key, content_type)
+        except (requests.RequestException, BotoCoreError, ClientError, OSError) as e:
+            if attempt == UPLOAD_ATTEMPTS:
+                raise
+            print(f"Upload of {item['filename']} failed ({e}) — retry {attempt}/{UPLOAD_ATTEMPTS - 1} in {delay:.1f}s")
+            time.sleep(delay)
+            delay *= 2
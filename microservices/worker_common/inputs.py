@@ -0,0 +1,132 @@
+"""
+Input staging for workers that feed downloaded images to ComfyUI.
+
+Inputs are downloaded straight into ComfyUI's input dir (no /tmp copy) under
+a content-addressed name, staged_<sha256><ext>:
+
+- the download streams into a hidden .part file in the input dir while it is
+  hashed, then is os.replace()d into place, so LoadImage never sees a
+  partial file and each input is written once
+- the name comes from the content, so concurrent jobs on one worker can't
+  overwrite each other's inputs, and identical inputs (the same product
+  reference on every retry) share one file; a duplicate's .part is dropped
+- staged files are kept under INPUT_CACHE_MAX_MB; the least recently used
+  are removed first, but never one used in the last IN_USE_SECONDS, so a
+  running job's inputs stay put
+
+R2 inputs are also cached by bucket/key: the stager remembers which staged
+file each object's ETag produced, so an agent retry that sends the same
+reference or scene to a warm worker costs one HEAD instead of a download.
+A changed ETag (object overwritten) or an evicted file is a miss.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+import requests
+
+from worker_common import r2
+
+COMFYUI_INPUT_DIR = os.environ.get("COMFYUI_INPUT_DIR", "/comfyui/input")
+CACHE_MAX_BYTES   = int(os.environ.get("INPUT_CACHE_MAX_MB", "2048")) << 20
+IN_USE_SECONDS    = 1800   # longer than any worker's job timeout
+PREFIX            = "staged_"
+CHUNK             = 1 << 20
+
+
+class InputStager:
+    def __init__(self, input_dir: str = COMFYUI_INPUT_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.input_dir = input_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._cached: dict[str, tuple[str, str]] = {}   # "bucket/key" → (ETag, staged filename)
+        self.stats = {"hits": 0, "misses": 0}
+
+    def stage_r2(self, bucket: str, key: str) -> tuple[str, str]:
+        """
+        Make s3://bucket/key available in the input dir. Returns (filename to
+        give LoadImage, "hit" | "miss").
+        """
+        etag = r2.client().head_object(Bucket=bucket, Key=key)["ETag"]
+        ref = f"{bucket}/{key}"
+        with self._lock:
+            cached = self._cached.get(ref)
+            if cached is not None and cached[0] == etag:
+                try:
+                    os.utime(os.path.join(self.input_dir, cached[1]))   # mark as used for eviction
+                except FileNotFoundError:
+                    del self._cached[ref]
+                else:
+                    self.stats["hits"] += 1
+                    print(f"Input cache hit: s3://{bucket}/{key} → {cached[1]}")
+                    return cached[1], "hit"
+            self.stats["misses"] += 1
+
+        print(f"Downloading s3://{bucket}/{key} from R2")
+        body = r2.client().get_object(Bucket=bucket, Key=key, IfMatch=etag)["Body"]
+        filename = self._stage(body.iter_chunks(CHUNK), _ext(key))
+        with self._lock:
+            self._cached[ref] = (etag, filename)
+        return filename, "miss"
+
+    def stage_url(self, url: str) -> tuple[str, str]:
+        """Download an https:// URL into the input dir. Returns (filename to give LoadImage, "miss")."""
+        with self._lock:
+            self.stats["misses"] += 1
+        print(f"Downloading {url} via HTTP")
+        with requests.get(url, stream=True, timeout=60) as r:
+            r.raise_for_status()
+            return self._stage(r.iter_content(CHUNK), _ext(url.split("?", 1)[0])), "miss"
+
+    def _stage(self, chunks, ext: str) -> str:
+        os.makedirs(self.input_dir, exist_ok=True)
+        tmp = os.path.join(self.input_dir, f".{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+            filename = f"{PREFIX}{digest.hexdigest()}{ext}"
+            dest = os.path.join(self.input_dir, filename)
+            with self._lock:
+                if os.path.exists(dest):
+                    os.utime(dest)   # mark as used for eviction
+                    print(f"Input already staged: {filename}")
+                else:
+                    os.replace(tmp, dest)
+                    print(f"Image ready at {dest}")
+                    self._evict(keep=filename)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return filename
+
+    def _evict(self, keep: str):
+        """Remove least recently used staged files until under budget. Caller holds self._lock."""
+        staged = []
+        for entry in os.scandir(self.input_dir):
+            if entry.name.startswith(PREFIX) and entry.is_file():
+                st = entry.stat()
+                staged.append((st.st_mtime, st.st_size, entry.name))
+        total = sum(size for _, size, _ in staged)
+        cutoff = time.time() - IN_USE_SECONDS
+        for mtime, size, name in sorted(staged):
+            if total <= self.max_bytes or mtime > cutoff:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.input_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+            for ref in [ref for ref, (_, filename) in self._cached.items() if filename == name]:
+                del self._cached[ref]
+            print(f"Evicted staged input (LRU): {name}")
+
+
+def _ext(path: str) -> str:
+    return os.path.splitext(path)[1].lower() or ".png"
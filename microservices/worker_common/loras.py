@@ -0,0 +1,273 @@
+"""
+LoRA cache and registration for workers that download LoRAs per job.
+
+Cache
+-----
+Downloaded LoRAs live in the ComfyUI loras dir, tracked by an index file
+(.lora_cache.json: filename → key, ETag, size, last use). The managed files
+are kept under LORA_CACHE_MAX_GB; installing a new one evicts the least
+recently used managed files first. Files the index doesn't know (baked into
+the image, copied by hand) are used as-is and never evicted.
+
+- a hit is revalidated with one HEAD: if the object's ETag changed (LoRA
+  re-trained under the same key) it is downloaded again
+- downloads go to a hidden .part file in the same dir and are os.replace()d
+  into place, so neither ComfyUI nor a crashed job ever sees a partial file
+- objects above LORA_MULTIPART_THRESHOLD_MB are fetched as parallel ranged
+  GETs (LORA_DOWNLOAD_PART_MB each, LORA_DOWNLOAD_WORKERS at a time), every
+  part pinned to the HEAD's ETag with If-Match so parts can't mix versions
+- the result is checked against the object's `sha256` metadata when the
+  uploader set it, otherwise against a plain (single-part) MD5 ETag, and
+  always against the expected size
+
+Registration
+------------
+ComfyUI does not need a restart to see a new LoRA: LoraLoader's choice list
+comes from folder_paths.get_filename_list("loras"), which is re-scanned
+whenever the folder's mtime changes — which the rename above does. Before
+queueing, the worker asks ComfyUI's /object_info/LoraLoader whether the name
+is listed; that request also triggers the re-scan.
+
+If the name still isn't listed (e.g. a filesystem with coarse mtimes hid the
+change), the folder mtime is bumped explicitly and the check repeated. Only if
+that fails too is ComfyUI restarted, via the restart callback the worker
+provides.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from worker_common import r2
+
+CACHE_MAX_BYTES     = int(float(os.environ.get("LORA_CACHE_MAX_GB", "40")) * (1 << 30))
+MULTIPART_THRESHOLD = int(os.environ.get("LORA_MULTIPART_THRESHOLD_MB", "64")) << 20
+PART_SIZE           = int(os.environ.get("LORA_DOWNLOAD_PART_MB", "32")) << 20
+DOWNLOAD_WORKERS    = int(os.environ.get("LORA_DOWNLOAD_WORKERS", "8"))
+INDEX_NAME          = ".lora_cache.json"
+HASH_CHUNK          = 8 << 20
+
+VISIBLE_RETRIES  = 5
+VISIBLE_INTERVAL = 0.2   # seconds between /object_info checks
+
+
+class LoraManager:
+    def __init__(self, loras_dir: str, comfyui_url: str, restart=None, max_bytes: int = CACHE_MAX_BYTES):
+        self.loras_dir = loras_dir
+        self.comfyui_url = comfyui_url
+        self.restart = restart
+        self.max_bytes = max_bytes
+        self.registered: set[str] = set()   # names ComfyUI has listed in this process
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(loras_dir, INDEX_NAME)
+        self._index = self._load_index()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes_downloaded": 0, "download_seconds": 0.0}
+
+    # ── Index ─────────────────────────────────────────────────────────────────
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Drop entries whose file is gone (volume wiped, manual cleanup)
+        return {name: e for name, e in index.items() if os.path.exists(os.path.join(self.loras_dir, name))}
+
+    def _save_index(self):
+        # Caller holds self._lock
+        os.makedirs(self.loras_dir, exist_ok=True)
+        tmp = f"{self._index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self._index_path)
+
+    def cached_bytes(self) -> int:
+        return sum(e["size"] for e in self._index.values())
+
+    def _evict_for(self, size: int, keep: str) -> list[str]:
+        """Evict least recently used managed LoRAs until `size` more bytes fit. Caller holds self._lock."""
+        evicted = []
+        # A stale copy of `keep` is about to be overwritten, so it doesn't count
+        total = self.cached_bytes() - self._index.get(keep, {}).get("size", 0)
+        for name, entry in sorted(self._index.items(), key=lambda item: item[1]["last_used"]):
+            if total + size <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.loras_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= entry["size"]
+            del self._index[name]
+            self.registered.discard(name)
+            evicted.append(name)
+        if evicted:
+            self.stats["evictions"] += len(evicted)
+            print(f"Evicted LoRAs (LRU): {evicted}")
+        return evicted
+
+    # ── Install ───────────────────────────────────────────────────────────────
+
+    def install(self, bucket: str, key: str) -> tuple[str, dict]:
+        """
+        Make s3://bucket/key available in the loras dir. Returns (filename, info)
+        where info describes the cache outcome for the job output.
+        """
+        filename = os.path.basename(key)
+        dest = os.path.join(self.loras_dir, filename)
+        entry = self._index.get(filename)
+
+        if entry is None and os.path.exists(dest):
+            self.stats["hits"] += 1
+            return filename, self._info("unmanaged")
+
+        head = r2.client().head_object(Bucket=bucket, Key=key)
+        etag = head["ETag"].strip('"')
+        if entry is not None and entry["key"] == f"{bucket}/{key}" and entry["etag"] == etag:
+            with self._lock:
+                entry["last_used"] = time.time()
+                self._save_index()
+            self.stats["hits"] += 1
+            return filename, self._info("hit")
+
+        size = head["ContentLength"]
+        with self._lock:
+            evicted = self._evict_for(size, keep=filename)
+            self._save_index()
+
+        self.stats["misses"] += 1
+        start = time.time()
+        self._download(bucket, key, dest, size, etag, head.get("Metadata", {}).get("sha256"))
+        elapsed = time.time() - start
+        self.stats["bytes_downloaded"] += size
+        self.stats["download_seconds"] += elapsed
+
+        with self._lock:
+            self._index[filename] = {"key": f"{bucket}/{key}", "etag": etag, "size": size, "last_used": time.time()}
+            self._save_index()
+
+        mb_s = round(size / (1 << 20) / elapsed, 1) if elapsed > 0 else None
+        print(f"Downloaded: {filename} ({size / (1 << 20):.1f} MB in {elapsed:.2f}s, {mb_s} MB/s)")
+        info = self._info("miss")
+        info.update({"download_mb": round(size / (1 << 20), 1), "download_seconds": round(elapsed, 2),
+                     "download_mb_s": mb_s, "evicted": evicted})
+        return filename, info
+
+    def _info(self, outcome: str) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        seconds = self.stats["download_seconds"]
+        return {
+            "cache": outcome,
+            "cache_hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+            "cache_mb": round(self.cached_bytes() / (1 << 20), 1),
+            "cache_evictions": self.stats["evictions"],
+            "avg_download_mb_s": round(self.stats["bytes_downloaded"] / (1 << 20) / seconds, 1) if seconds else None,
+        }
+
+    def _download(self, bucket: str, key: str, dest: str, size: int, etag: str, sha256: str | None):
+        print(f"Downloading LoRA from R2: bucket={bucket} key={key}")
+        os.makedirs(self.loras_dir, exist_ok=True)
+        # Hidden temp name in the same dir: not a .safetensors, so ComfyUI never lists it
+        tmp = os.path.join(self.loras_dir, f".{os.path.basename(dest)}.{uuid.uuid4().hex}.part")
+        try:
+            if size > MULTIPART_THRESHOLD:
+                self._ranged_download(bucket, key, tmp, size, etag)
+            else:
+                body = r2.client().get_object(Bucket=bucket, Key=key, IfMatch=etag)["Body"]
+                with open(tmp, "wb") as f:
+                    for chunk in body.iter_chunks(HASH_CHUNK):
+                        f.write(chunk)
+            self._verify(tmp, size, etag, sha256)
+            os.replace(tmp, dest)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _ranged_download(self, bucket: str, key: str, tmp: str, size: int, etag: str):
+        client = r2.client()
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+
+            def _part(offset: int):
+                end = min(offset + PART_SIZE, size) - 1
+                body = client.get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-{end}", IfMatch=etag)["Body"]
+                position = offset
+                for chunk in body.iter_chunks(1 << 20):
+                    os.pwrite(fd, chunk, position)
+                    position += len(chunk)
+                if position != end + 1:
+                    raise IOError(f"Short read for bytes {offset}-{end}: got {position - offset}")
+
+            with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+                list(pool.map(_part, range(0, size, PART_SIZE)))
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _verify(path: str, size: int, etag: str, sha256: str | None):
+        actual = os.path.getsize(path)
+        if actual != size:
+            raise IOError(f"LoRA size mismatch: expected {size} bytes, got {actual}")
+        # Multipart ETags ("<md5>-<parts>") aren't a digest of the content
+        md5_etag = etag if "-" not in etag else None
+        if not sha256 and not md5_etag:
+            return
+        digest = hashlib.sha256() if sha256 else hashlib.md5()
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK):
+                digest.update(chunk)
+        expected = sha256 or md5_etag
+        if digest.hexdigest() != expected.lower():
+            raise IOError(f"LoRA checksum mismatch: expected {expected}, got {digest.hexdigest()}")
+
+    # ── Registration ──────────────────────────────────────────────────────────
+
+    def listed(self) -> set[str]:
+        """LoRA names ComfyUI's LoraLoader currently offers (forces its folder re-scan)."""
+        r = requests.get(f"{self.comfyui_url}/object_info/LoraLoader", timeout=10)
+        r.raise_for_status()
+        spec = r.json()["LoraLoader"]["input"]["required"]["lora_name"]
+        # Older ComfyUI: [[names...], {...}]; newer: ["COMBO", {"options": [names...]}]
+        if isinstance(spec[0], list):
+            return set(spec[0])
+        return set(spec[1].get("options", []))
+
+    def _wait_listed(self, filename: str) -> bool:
+        for _ in range(VISIBLE_RETRIES):
+            if filename in self.listed():
+                return True
+            time.sleep(VISIBLE_INTERVAL)
+        return False
+
+    def register(self, filename: str) -> str:
+        """
+        Make sure ComfyUI can load `filename`. Returns how it got there:
+        "known", "rescan", "touch" or "restart".
+        """
+        if filename in self.registered:
+            return "known"
+
+        how = "rescan"
+        if not self._wait_listed(filename):
+            print(f"LoRA {filename} not listed yet — bumping {self.loras_dir} mtime")
+            os.utime(self.loras_dir)
+            how = "touch"
+            if not self._wait_listed(filename):
+                if self.restart is None:
+                    raise RuntimeError(f"ComfyUI does not list LoRA {filename}")
+                print(f"LoRA {filename} still not listed — restarting ComfyUI")
+                self.restart()
+                how = "restart"
+                if filename not in self.listed():
+                    raise RuntimeError(f"ComfyUI does not list LoRA {filename} after restart")
+
+        self.registered.add(filename)
+        return how
@@ -0,0 +1,48 @@
+"""
+Process-wide R2 client for the workers.
+
+Built once per worker process and reused across jobs, so warm workers skip
+credential resolution, endpoint setup and the TLS handshake on every job.
+boto3 clients are thread-safe; the connection pool is sized for concurrent
+uploads. R2_ENDPOINT_URL, if set, replaces the endpoint derived from
+R2_ACCOUNT_ID (e.g. to point a test at a local S3 stand-in).
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+MAX_POOL_CONNECTIONS = int(os.environ.get("R2_MAX_POOL_CONNECTIONS", "32"))
+
+_CONFIG = Config(
+    signature_version="s3v4",
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    retries={"max_attempts": 5, "mode": "adaptive"},
+    connect_timeout=5,
+    read_timeout=120,
+    tcp_keepalive=True,
+)
+
+_client = None
+_lock = threading.Lock()
+
+
+def client():
+    """Return the shared boto3 S3 client for the R2 account, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                endpoint_url = os.environ.get("R2_ENDPOINT_URL") or (
+                    f"https://{os.environ['R2_ACCOUNT_ID'].strip()}.r2.cloudflarestorage.com"
+                )
+                _client = boto3.session.Session().client(
+                    "s3",
+                    endpoint_url=endpoint_url,
+                    aws_access_key_id=os.environ["R2_ACCESS_KEY_ID"].strip(),
+                    aws_secret_access_key=os.environ["R2_SECRET_ACCESS_KEY"].strip(),
+                    config=_CONFIG,
+                    region_name="auto",
+                )
+    return _client
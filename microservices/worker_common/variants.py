@@ -0,0 +1,46 @@
+"""
+Seed / prompt variants for the image-generation workers.
+
+A job can carry `variants`, a list of per-variant overrides; each variant runs
+as its own ComfyUI prompt, and everything not overridden is shared by the
+whole job. Without `variants` the job is one variant made of its top-level
+fields. The worker decides which keys a variant may override (the keys of
+its defaults) and which of them are floats.
+"""
+import random
+
+MAX_VARIANTS = 16
+MAX_IMAGES   = 16   # variants × batch_size per job
+
+
+def resolve_variants(job_input: dict, defaults: dict, float_keys: tuple = ()) -> list[dict]:
+    """
+    The job's variants. `defaults` holds the job-level value of every key a
+    variant may override (it must include prompt and seed); `float_keys` are
+    coerced to float. Missing seeds are drawn per variant. Raises ValueError.
+    """
+    overrides = job_input.get("variants") or [{}]
+    if not isinstance(overrides, list) or not all(isinstance(v, dict) for v in overrides):
+        raise ValueError("variants must be a list of objects")
+    if len(overrides) > MAX_VARIANTS:
+        raise ValueError(f"at most {MAX_VARIANTS} variants per job, got {len(overrides)}")
+
+    variants = []
+    for override in overrides:
+        unknown = set(override) - set(defaults)
+        if unknown:
+            raise ValueError(f"unknown variant keys {sorted(unknown)}; allowed: {sorted(defaults)}")
+        variant = {**defaults, **{k: v for k, v in override.items() if v is not None}}
+        if not variant["prompt"]:
+            raise ValueError("prompt is required")
+        variant["seed"] = random.randint(0, 2**32 - 1) if variant["seed"] is None else int(variant["seed"])
+        for key in float_keys:
+            variant[key] = float(variant[key])
+        variants.append(variant)
+    return variants
+
+
+def check_image_count(variants: list, batch_size: int):
+    """Raise ValueError if the job would produce more than MAX_IMAGES images."""
+    if len(variants) * batch_size > MAX_IMAGES:
+        raise ValueError(f"at most {MAX_IMAGES} images per job, got {len(variants)} variants x batch_size {batch_size}")
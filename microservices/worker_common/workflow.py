@@ -0,0 +1,126 @@
+"""
+ComfyUI API-format workflow templates.
+
+Each worker ships a parameter manifest (workflow_params.json) next to its
+workflow JSON:
+
+    {
+      "workflow": "FlorenceSegmentationMaskingAPI.json",
+      "strip_classes": ["PreviewImage"],
+      "params": {
+        "seed": {"type": "int", "min": 0, "max": 18446744073709551615,
+                 "targets": [["87", "seed"]]},
+        ...
+      }
+    }
+
+Each parameter maps to one or more (node_id, input_key) targets, with a type
+("int", "float", "str", "bool") and optional min / max / choices. The manifest
+and workflow are loaded once at import and every target is checked against the
+graph, so a renamed node fails the worker at start instead of on the first job.
+
+build() validates the values, then returns a new top-level dict that shares
+every untouched node with the template and copies only the nodes it patches
+(node dict + its inputs dict). The template graph is never mutated, so it is
+safe to reuse across jobs.
+"""
+import json
+import os
+
+TYPES = {
+    "int": (int,),
+    "float": (int, float),
+    "str": (str,),
+    "bool": (bool,),
+}
+
+
+class Param:
+    def __init__(self, name: str, spec: dict):
+        self.name = name
+        self.type = spec.get("type", "str")
+        if self.type not in TYPES:
+            raise ValueError(f"Parameter '{name}': unknown type '{self.type}'")
+        self.min = spec.get("min")
+        self.max = spec.get("max")
+        self.choices = spec.get("choices")
+        self.targets = [(str(node_id), key) for node_id, key in spec["targets"]]
+
+    def check(self, value) -> str | None:
+        """Return an error message for an invalid value, or None."""
+        # bool is an int subclass — don't let True pass as a seed
+        if not isinstance(value, TYPES[self.type]) or (self.type != "bool" and isinstance(value, bool)):
+            return f"{self.name} must be {self.type}, got {type(value).__name__}"
+        if self.min is not None and value < self.min:
+            return f"{self.name} must be >= {self.min}, got {value}"
+        if self.max is not None and value > self.max:
+            return f"{self.name} must be <= {self.max}, got {value}"
+        if self.choices is not None and value not in self.choices:
+            return f"{self.name} must be one of {self.choices}, got {value!r}"
+        return None
+
+
+class WorkflowTemplate:
+    def __init__(self, path: str, params: dict[str, Param], strip_classes=frozenset()):
+        with open(path) as f:
+            graph = json.load(f)
+
+        # Display-only nodes are removed once here rather than on every job
+        for node_id in [nid for nid, node in graph.items() if node.get("class_type") in strip_classes]:
+            print(f"Stripping display node {node_id} ({graph[node_id]['class_type']})")
+            del graph[node_id]
+
+        self.path = path
+        self.graph = graph
+        self.params = params
+        self._check_targets()
+
+    @classmethod
+    def from_manifest(cls, manifest_path: str) -> "WorkflowTemplate":
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        workflow_path = os.path.join(os.path.dirname(os.path.abspath(manifest_path)), manifest["workflow"])
+        params = {name: Param(name, spec) for name, spec in manifest["params"].items()}
+        return cls(workflow_path, params, frozenset(manifest.get("strip_classes", ())))
+
+    def _check_targets(self):
+        for name, param in self.params.items():
+            for node_id, key in param.targets:
+                node = self.graph.get(node_id)
+                if node is None:
+                    raise ValueError(f"{self.path}: parameter '{name}' targets missing node {node_id}")
+                if key not in node.get("inputs", {}):
+                    raise ValueError(
+                        f"{self.path}: parameter '{name}' targets unknown input '{key}' "
+                        f"on node {node_id} ({node.get('class_type')})"
+                    )
+
+    def validate(self, **values) -> list[str]:
+        """Error messages for unknown parameters or out-of-spec values. None values are skipped."""
+        errors = [f"unknown parameter '{name}'" for name in values if name not in self.params]
+        for name, value in values.items():
+            if value is not None and name in self.params:
+                error = self.params[name].check(value)
+                if error:
+                    errors.append(error)
+        return errors
+
+    def build(self, **values) -> dict:
+        """Per-job workflow with the given parameters applied. None values keep the template's value."""
+        errors = self.validate(**values)
+        if errors:
+            raise ValueError("Invalid workflow parameters: " + "; ".join(errors))
+
+        workflow = dict(self.graph)
+        patched: dict[str, dict] = {}
+        for name, value in values.items():
+            if value is None:
+                continue
+            for node_id, key in self.params[name].targets:
+                node = patched.get(node_id)
+                if node is None:
+                    source = self.graph[node_id]
+                    node = {**source, "inputs": dict(source["inputs"])}
+                    patched[node_id] = workflow[node_id] = node
+                node["inputs"][key] = value
+        return workflow